@@ -0,0 +1,58 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app.database import get_read_db
+from app.models.movie import Movie
+from app.models.book import Book
+from app.schemas.movie import MovieResponse
+from app.schemas.book import BookResponse
+from app.services.recommendation_service import Recommender, book_recommender, movie_recommender
+
+router = APIRouter(prefix="/recommendations", tags=["recommendations"])
+
+MAX_RECOMMENDATIONS = 50
+
+
+async def similar_items(db: AsyncSession, recommender: Recommender, model, item_id: int, limit: int):
+    # Loading the index touches disk and the database, and scoring is a pass
+    # over every vector; keep both off the event loop.
+    ids = await asyncio.to_thread(recommender.similar, item_id, limit)
+    if ids is None:
+        if await db.get(model, item_id) is None:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+        # Inserted by another worker since the last catch-up.
+        recommender.rows_added([
+            dict(row) for row in (await db.execute(
+                select(*recommender.spec.columns()).where(model.id == item_id)
+            )).mappings()
+        ])
+        ids = await asyncio.to_thread(recommender.similar, item_id, limit) or []
+    rows = {row.id: row for row in (await db.scalars(select(model).where(model.id.in_(ids)))).all()}
+    return [rows[item] for item in ids if item in rows]
+
+
+@router.get("/movies/{movie_id}", response_model=List[MovieResponse])
+async def similar_movies(
+    movie_id: int,
+    limit: int = Query(10, ge=1, le=MAX_RECOMMENDATIONS, description="Number of recommendations"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Movies most similar to the given movie by summary, title, genre, language and rating.
+    """
+    return await similar_items(db, movie_recommender, Movie, movie_id, limit)
+
+
+@router.get("/books/{book_id}", response_model=List[BookResponse])
+async def similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=MAX_RECOMMENDATIONS, description="Number of recommendations"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Books most similar to the given book by summary, title, author, genre, language and rating.
+    """
+    return await similar_items(db, book_recommender, Book, book_id, limit)
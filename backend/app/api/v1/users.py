@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.database import get_db
+from app.models.user import User, WatchlistItem
+from app.schemas.book import BookResponse
+from app.schemas.movie import MovieResponse
+from app.schemas.user import UserCreate, UserResponse, WatchlistCatalog, WatchlistChange
+from app.services import watchlist_service
+from app.utils.pagination import MAX_PAGE_SIZE, InvalidCursor, SortKey, paginate
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+# Most recently saved first; item_id keeps items saved in the same instant in a stable order.
+WATCHLIST_SORT_KEYS = (SortKey(WatchlistItem.saved_at, descending=True), SortKey(WatchlistItem.item_id, descending=True))
+
+
+@router.post("", response_model=UserResponse, status_code=201)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Create a user to keep a watchlist for.
+    """
+    db_user = User(username=user.username)
+    db.add(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Username already taken")
+    return db_user
+
+
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+async def saved_items(db: AsyncSession, user_id: int, catalog: str, response: Response,
+                      limit: Optional[int], cursor: Optional[str]):
+    if await db.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    query = watchlist_service.saved_items_query(user_id, catalog)
+    try:
+        rows, next_cursor = await paginate(db, query, f"watchlist:{catalog}", WATCHLIST_SORT_KEYS, limit, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [row[0] for row in rows]
+
+
+@router.get("/{user_id}/watchlist/movies", response_model=List[MovieResponse])
+async def watchlist_movies(
+    user_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Movies on the user's watchlist, most recently saved first.
+    """
+    return await saved_items(db, user_id, WatchlistCatalog.MOVIES.value, response, limit, cursor)
+
+
+@router.get("/{user_id}/watchlist/books", response_model=List[BookResponse])
+async def watchlist_books(
+    user_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Books on the user's watchlist, most recently saved first.
+    """
+    return await saved_items(db, user_id, WatchlistCatalog.BOOKS.value, response, limit, cursor)
+
+
+@router.put("/{user_id}/watchlist/{catalog}/{item_id}", response_model=WatchlistChange)
+async def save_item(user_id: int, catalog: WatchlistCatalog, item_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Add a movie or book to the user's watchlist. ``changed`` is false if it was already there.
+    """
+    try:
+        changed = await watchlist_service.save(db, user_id, catalog.value, item_id)
+    except (watchlist_service.UnknownUser, watchlist_service.UnknownItem) as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return WatchlistChange(catalog=catalog, item_id=item_id, changed=changed)
+
+
+@router.delete("/{user_id}/watchlist/{catalog}/{item_id}", response_model=WatchlistChange)
+async def remove_item(user_id: int, catalog: WatchlistCatalog, item_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Remove a movie or book from the user's watchlist. ``changed`` is false if it was not there.
+    """
+    try:
+        changed = await watchlist_service.remove(db, user_id, catalog.value, item_id)
+    except watchlist_service.UnknownUser as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return WatchlistChange(catalog=catalog, item_id=item_id, changed=changed)
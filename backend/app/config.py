@@ -0,0 +1,93 @@
+"""
+Deployment settings, read once from the environment at import time.
+
+The primary database takes every write. ``DATABASE_READ_URLS`` optionally
+lists read-only copies of it (comma-separated) that catalog listings are
+spread over; each kind of engine has its own pool settings, falling back to
+the primary's::
+
+    DATABASE_URL=postgresql://primary/catalog
+    DATABASE_READ_URLS=postgresql://replica-1/catalog,postgresql://replica-2/catalog
+    DB_POOL_SIZE=5 DB_READ_POOL_SIZE=20 DB_READ_POOL_RECYCLE=600
+
+SQLite databases are tuned per connection with ``SQLITE_CACHE_SIZE``,
+``SQLITE_MMAP_SIZE`` and ``SQLITE_BUSY_TIMEOUT``.
+"""
+import os
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+DEFAULT_DATABASE_URL = "sqlite:///./movies.db"
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    size: int = 10
+    max_overflow: int = 20
+    timeout: int = 30
+    # Seconds before a pooled connection is replaced; not used for SQLite.
+    recycle: int = 1800
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str], prefix: str,
+                 defaults: Optional["PoolSettings"] = None) -> "PoolSettings":
+        defaults = defaults or cls()
+        return cls(
+            size=int(environ.get(f"{prefix}_POOL_SIZE", defaults.size)),
+            max_overflow=int(environ.get(f"{prefix}_MAX_OVERFLOW", defaults.max_overflow)),
+            timeout=int(environ.get(f"{prefix}_POOL_TIMEOUT", defaults.timeout)),
+            recycle=int(environ.get(f"{prefix}_POOL_RECYCLE", defaults.recycle)),
+        )
+
+
+@dataclass(frozen=True)
+class SqliteSettings:
+    # Page cache per connection; negative means KiB, so 64 MiB.
+    cache_size: int = -65536
+    # Bytes of the database file read through a memory map.
+    mmap_size: int = 256 * 1024 * 1024
+    # Milliseconds a connection waits on another's write lock before failing.
+    busy_timeout: int = 5000
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str]) -> "SqliteSettings":
+        defaults = cls()
+        return cls(
+            cache_size=int(environ.get("SQLITE_CACHE_SIZE", defaults.cache_size)),
+            mmap_size=int(environ.get("SQLITE_MMAP_SIZE", defaults.mmap_size)),
+            busy_timeout=int(environ.get("SQLITE_BUSY_TIMEOUT", defaults.busy_timeout)),
+        )
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: str = DEFAULT_DATABASE_URL
+    # Derived from ``database_url`` when not set.
+    async_database_url: Optional[str] = None
+    read_database_urls: Tuple[str, ...] = ()
+    pool: PoolSettings = PoolSettings()
+    read_pool: PoolSettings = PoolSettings()
+    sqlite: SqliteSettings = SqliteSettings()
+    # Bring an empty or outdated schema up to date on startup. Off by default:
+    # workers starting together would each migrate, so run
+    # ``python -m app.migrations`` once per deploy and workers refuse to start
+    # on an outdated schema. Only turn it on for a single-process server.
+    auto_migrate: bool = False
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        pool = PoolSettings.from_env(environ, "DB")
+        return cls(
+            database_url=environ.get("DATABASE_URL", DEFAULT_DATABASE_URL),
+            async_database_url=environ.get("ASYNC_DATABASE_URL"),
+            read_database_urls=tuple(
+                url.strip() for url in environ.get("DATABASE_READ_URLS", "").split(",") if url.strip()
+            ),
+            pool=pool,
+            read_pool=PoolSettings.from_env(environ, "DB_READ", defaults=pool),
+            sqlite=SqliteSettings.from_env(environ),
+            auto_migrate=environ.get("DB_AUTO_MIGRATE", "0").lower() in ("1", "true", "yes", "on"),
+        )
+
+
+settings = Settings.from_env()
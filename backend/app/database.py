@@ -1,23 +1,216 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Sequence, Tuple
+import itertools
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./movies.db")
+from app.config import PoolSettings, settings
+from app.services.metrics_service import instrument_engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
+SQLALCHEMY_DATABASE_URL = settings.database_url
+
+# Async drivers used by the request handlers for each sync URL scheme.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# SQLite tuning applied to every new connection. WAL lets readers proceed while
+# a writer commits; NORMAL sync is durable across application crashes in WAL mode.
+# SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to.
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": settings.sqlite.cache_size,
+    "mmap_size": settings.sqlite.mmap_size,
+    "temp_store": "MEMORY",
+    "busy_timeout": settings.sqlite.busy_timeout,
+}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    if "+" in parsed.drivername:
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = settings.async_database_url or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+
+def engine_options(url: str, pool_class, pool_settings: PoolSettings = settings.pool) -> dict:
+    pool = {
+        "pool_size": pool_settings.size,
+        "max_overflow": pool_settings.max_overflow,
+        "pool_timeout": pool_settings.timeout,
+    }
+    if "sqlite" not in url:
+        return {**pool, "pool_recycle": pool_settings.recycle, "pool_pre_ping": True}
+    options = {"connect_args": {"check_same_thread": False}}
+    if ":memory:" not in url and make_url(url).database:
+        # File databases get a real pool; aiosqlite would otherwise open a new
+        # connection (and rerun the pragmas) for every session.
+        options.update(pool, poolclass=pool_class)
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def sqlite_path(bind) -> Optional[str]:
+    """The database file behind a SQLite engine, or ``None``."""
+    if bind.dialect.name != "sqlite" or bind.url.database in (None, "", ":memory:"):
+        return None
+    return bind.url.database
+
+
+def set_sqlite_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL, QueuePool))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+# Per-request query counts, DB time and the slow-query log.
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# Sync sessions for scripts such as the seeders; request handlers use AsyncSessionLocal.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+def create_read_engine(url: str, pool_settings: PoolSettings = settings.read_pool) -> AsyncEngine:
+    """An async engine on a read-only copy of the database. SQLite connections also refuse writes."""
+    url = async_database_url(url)
+    read_engine = create_async_engine(url, **engine_options(url, AsyncAdaptedQueuePool, pool_settings))
+    if read_engine.dialect.name == "sqlite":
+        event.listen(read_engine.sync_engine, "connect", set_sqlite_pragmas)
+        event.listen(read_engine.sync_engine, "connect", set_sqlite_read_only)
+    instrument_engine(read_engine.sync_engine)
+    return read_engine
+
+
+# The router and engine index that ``ReadRouter.pinned`` chose for the current request.
+_pinned_read: ContextVar[Optional[Tuple["ReadRouter", int]]] = ContextVar("pinned_read", default=None)
+
+
+class ReadRouter:
+    """
+    Sessions for handlers that only read, taken from the read engines in turn.
+
+    With no read engines every session is on the primary. Replicas may lag
+    the primary, so handlers that must see their own writes use ``get_db``.
+    """
+
+    def __init__(self, engines: Sequence[AsyncEngine] = ()):
+        self.engines = list(engines)
+        self._sessionmakers = [
+            async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False) for read_engine in self.engines
+        ] or [AsyncSessionLocal]
+        self._turn = itertools.count()
+
+    @classmethod
+    def from_urls(cls, urls: Sequence[str], pool_settings: PoolSettings = settings.read_pool) -> "ReadRouter":
+        return cls([create_read_engine(url, pool_settings) for url in urls])
+
+    def session(self) -> AsyncSession:
+        pinned = _pinned_read.get()
+        if pinned is not None and pinned[0] is self:
+            return self._sessionmakers[pinned[1]]()
+        return self._sessionmakers[self._next()]()
+
+    @contextmanager
+    def pinned(self) -> Iterator[AsyncEngine]:
+        """
+        Send every read session of the current request to one engine, which is yielded.
+
+        The response cache reads the table versions from the same database,
+        so its ETags describe the data a lagging replica actually served.
+        """
+        choice = self._next()
+        token = _pinned_read.set((self, choice))
+        try:
+            yield self.engines[choice] if self.engines else async_engine
+        finally:
+            _pinned_read.reset(token)
+
+    def _next(self) -> int:
+        return next(self._turn) % len(self._sessionmakers)
+
+    async def dispose(self):
+        for read_engine in self.engines:
+            await read_engine.dispose()
+
+
+read_router = ReadRouter.from_urls(settings.read_database_urls)
+
+
+class SchemaOutOfDate(RuntimeError):
+    """Raised on startup when the schema is behind the code and may not be migrated automatically."""
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+async def get_read_db():
+    async with read_router.session() as db:
+        yield db
+
+def ensure_schema(auto_migrate: bool = settings.auto_migrate):
+    """
+    Check the schema version once on startup, creating or upgrading the schema if allowed.
+
+    A current schema costs a single query, so workers start without running
+    ``create_all`` against every table.
+    """
+    from app.migrations import current_version, is_known, latest_version
+
+    version, latest = current_version(engine), latest_version()
+    # An unknown revision is newer: workers of the previous release keep running during a deploy.
+    if version is not None and (version == latest or not is_known(version)):
+        return
+    if not auto_migrate:
+        if version is None and not inspect(engine).get_table_names():
+            raise SchemaOutOfDate(
+                "Database is empty; create the schema with `python -m app.migrations` before starting "
+                "the server, or set DB_AUTO_MIGRATE=1 for a single-process server"
+            )
+        raise SchemaOutOfDate(
+            f"Database schema is at revision {version}, expected {latest}; run `python -m app.migrations`"
+        )
+    create_tables()
+
+def create_tables(bind=None):
+    """Create the full schema on ``bind`` (the primary by default) and bring it to the latest revision."""
+    from app.migrations import run_migrations
+    from app.services.facet_service import create_facet_tables
+    from app.services.search_service import create_search_indexes
+
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    create_search_indexes(bind)
+    create_facet_tables(bind)
+    run_migrations(bind)
@@ -1,16 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+import asyncio
+
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.database import get_db, create_tables
+from app.api.v1 import recommendations, users
+from app.database import AsyncSessionLocal, ensure_schema, get_db, get_read_db, read_router
 from app.models.movie import Movie
 from app.models.book import Book
-from app.schemas.movie import MovieCreate, MovieResponse, MovieSort, Genre
-from app.schemas.book import BookCreate, BookResponse, BookSort, BookGenre
+from app.schemas.movie import MovieCreate, MovieListItem, MovieResponse, MovieSort, Genre
+from app.schemas.book import BookCreate, BookListItem, BookResponse, BookSort, BookGenre
+from app.schemas.bulk import BulkMode, BulkResult
+from app.schemas.facet import BookFacets, MovieFacets
+from app.schemas.suggest import Suggestion
+from app.services import (
+    bulk_service, catalog_events, facet_service, metrics_service, query_service, search_service, suggest_service,
+    tmdb_service, watchlist_service,
+)
+from app.services.cache_service import ResponseCacheMiddleware
+from app.utils.pagination import MAX_PAGE_SIZE, InvalidCursor, paginate, seek, stream_ndjson
+from app.utils.serialization import IdFlag, InvalidFields, Projection, dumps, encode_rows
 
 app = FastAPI(title="Movie Website API", version="1.0.0")
 
+# Serve repeated catalog reads from the response cache. Added before CORS so
+# CORS stays the outermost middleware and also decorates cached responses.
+app.add_middleware(ResponseCacheMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -18,129 +37,396 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Create database tables on startup
+# Time every request, including CORS and cache hits, and label it by route and
+# the sort/filter parameters. Only enum values become labels to bound cardinality.
+app.add_middleware(
+    metrics_service.MetricsMiddleware,
+    labels={
+        "sort_by": [sort.value for sort in (*MovieSort, *BookSort)],
+        "genre": [genre.value for genre in (*Genre, *BookGenre)],
+    },
+)
+
+app.include_router(recommendations.router)
+app.include_router(users.router)
+
+# Selectable response fields, in the order the response schemas declare them.
+MOVIE_FIELDS = Projection(Movie, MovieResponse)
+BOOK_FIELDS = Projection(Book, BookResponse)
+
+def projected(projection: Projection, fields: Optional[str]):
+    try:
+        return projection.parse(fields)
+    except InvalidFields as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+async def watchlist_flag(user_id: Optional[int], catalog: str) -> Optional[IdFlag]:
+    """
+    The ``in_watchlist`` field for listings requested with ``user_id``.
+
+    Read on the primary: a replica may not have the user's latest saves yet.
+    """
+    if user_id is None:
+        return None
+    try:
+        async with AsyncSessionLocal() as db:
+            return IdFlag("in_watchlist", await watchlist_service.saved_ids(db, user_id, catalog))
+    except watchlist_service.UnknownUser as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+async def list_response(db: AsyncSession, query, catalog: query_service.CatalogQuery, sort_by: List[str],
+                        filters: query_service.ListFilters, projection: Projection,
+                        limit: Optional[int], cursor: Optional[str], stream: bool, fields: Optional[str],
+                        flag: Optional[IdFlag] = None):
+    """
+    Return a listing as a full list, a keyset page or an NDJSON stream.
+
+    ``filters`` are applied and rows ordered by each ``sort_by`` key in turn.
+    Only the requested ``fields`` are selected, and rows are encoded straight
+    to JSON bytes instead of going through the response schema, with ``flag``
+    appended when given. Pages carry the cursor for the next page in the
+    ``X-Next-Cursor`` header.
+    """
+    sort_name, keys = catalog.sort_keys(sort_by, filters)
+    names = projected(projection, fields)
+    extra = [key.column for key in keys]
+    if flag is not None and all(column.key != "id" for column in extra):
+        extra.append(catalog.model.id)
+    query = projection.select(catalog.filter(query, filters), names, extra=extra)
+    try:
+        if stream:
+            query = seek(query, sort_name, keys, cursor)
+            if limit is not None:
+                query = query.limit(limit)
+            return StreamingResponse(stream_ndjson(db, query, names, flag), media_type="application/x-ndjson")
+        rows, next_cursor = await paginate(db, query, sort_name, keys, limit, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(encode_rows(names, rows, flag), media_type="application/json", headers=headers)
+
+async def ranked_response(db: AsyncSession, query, projection: Projection, limit: int, fields: Optional[str],
+                          flag: Optional[IdFlag] = None):
+    """Return the first ``limit`` search hits in the query's own (relevance) order."""
+    names = projected(projection, fields)
+    extra = [projection.model.id] if flag is not None else ()
+    rows = (await db.execute(projection.select(query, names, extra=extra).limit(limit))).all()
+    metrics_service.record_rows(len(rows))
+    return Response(encode_rows(names, rows, flag), media_type="application/json")
+
+async def facet_response(db: AsyncSession, spec, filters):
+    try:
+        return await facet_service.facets(db, spec, filters)
+    except facet_service.InvalidFacetFilter as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+# Check the schema version on startup; see app/migrations
 @app.on_event("startup")
 async def startup_event():
-    create_tables()
+    ensure_schema()
+    suggest_service.suggester.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await tmdb_service.close_client()
+    await read_router.dispose()
 
 @app.post("/add", response_model=MovieResponse)
-async def add_movie(movie: MovieCreate, db: Session = Depends(get_db)):
+async def add_movie(movie: MovieCreate, db: AsyncSession = Depends(get_db)):
     """
     Add a new movie to the database.
     """
-    db_movie = Movie(**movie.dict())
+    db_movie = Movie(**movie.model_dump())
     db.add(db_movie)
-    db.commit()
-    db.refresh(db_movie)
+    await db.commit()
+    catalog_events.rows_added("movies", [catalog_events.as_row(db_movie)])
     return db_movie
 
-@app.get("/view", response_model=List[MovieResponse])
+@app.post("/add/bulk", response_model=BulkResult)
+async def add_movies_bulk(
+    request: Request,
+    mode: BulkMode = Query(
+        BulkMode.INSERT,
+        description="insert all rows, or skip/update rows whose title exists "
+                    "(update changes the earliest row with that title)",
+    ),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add many movies from a JSON array, NDJSON or CSV body (or multipart upload).
+    Invalid rows are reported in ``errors`` without aborting the import.
+    """
+    return await bulk_service.ingest_request(db, Movie, MovieCreate, request, mode)
+
+@app.get("/view", response_model=List[MovieListItem])
 async def view_movies(
     genre: Optional[Genre] = Query(None, description="Filter by genre"),
-    db: Session = Depends(get_db)
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(None, ge=0, le=10, description="Minimum IMDb rating"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream results as NDJSON"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    View all movies with optional genre filtering.
+    View all movies, newest first, with optional genre, language and rating filters.
+    Pass ``limit`` for cursor pagination or ``stream=true`` for NDJSON.
     """
-    query = db.query(Movie)
-    
-    if genre:
-        query = query.filter(Movie.genre == genre.value)
-    
-    movies = query.order_by(Movie.date_added.desc()).all()
-    return movies
+    filters = query_service.ListFilters(genre=genre.value if genre else None, language=language, min_rating=min_rating)
+    return await list_response(
+        db, select(Movie), query_service.MOVIES, [MovieSort.DATE_ADDED.value], filters,
+        MOVIE_FIELDS, limit, cursor, stream, fields, await watchlist_flag(user_id, "movies"),
+    )
 
-@app.get("/sort", response_model=List[MovieResponse])
+@app.get("/sort", response_model=List[MovieListItem])
 async def sort_movies(
-    sort_by: MovieSort = Query(..., description="Sort by field"),
+    sort_by: List[MovieSort] = Query(..., description="Sort by field; repeat for secondary sorts"),
     genre: Optional[Genre] = Query(None, description="Filter by genre"),
-    db: Session = Depends(get_db)
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(None, ge=0, le=10, description="Minimum IMDb rating"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream results as NDJSON"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Sort movies by specified field with optional genre filtering.
+    Sort movies by one or more fields with optional genre, language and rating filters.
+    Missing values sort last. Pass ``limit`` for cursor pagination or ``stream=true`` for NDJSON.
     """
-    query = db.query(Movie)
-    
-    if genre:
-        query = query.filter(Movie.genre == genre.value)
-    
-    if sort_by == MovieSort.DATE_ADDED:
-        query = query.order_by(Movie.date_added.desc())
-    elif sort_by == MovieSort.TITLE:
-        query = query.order_by(Movie.title.asc())
-    elif sort_by == MovieSort.IMDB_RATING:
-        query = query.order_by(Movie.imdb_rating.desc() if Movie.imdb_rating is not None else Movie.date_added.desc())
-    elif sort_by == MovieSort.GENRE:
-        query = query.order_by(Movie.genre.asc(), Movie.title.asc())
+    filters = query_service.ListFilters(genre=genre.value if genre else None, language=language, min_rating=min_rating)
+    return await list_response(
+        db, select(Movie), query_service.MOVIES, [sort.value for sort in sort_by], filters,
+        MOVIE_FIELDS, limit, cursor, stream, fields, await watchlist_flag(user_id, "movies"),
+    )
+
+@app.get("/search", response_model=List[MovieListItem])
+async def search_movies(
+    q: str = Query(..., min_length=1, description="Words to match in title or summary, as prefixes"),
+    genre: Optional[Genre] = Query(None, description="Filter by genre"),
+    sort_by: Optional[MovieSort] = Query(None, description="Sort by field instead of relevance"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Cursor for the next page when sort_by is given"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Full-text search over movie titles and summaries.
+    Results are ranked by relevance unless ``sort_by`` is given.
+    """
+    query, rank = search_service.search(db, select(Movie), Movie, q)
+    filters = query_service.ListFilters(genre=genre.value if genre else None)
+    flag = await watchlist_flag(user_id, "movies")
     
-    movies = query.all()
-    return movies
+    if sort_by is None:
+        query = query_service.MOVIES.filter(query, filters)
+        if rank is not None:
+            query = query.order_by(rank, Movie.id)
+        return await ranked_response(db, query, MOVIE_FIELDS, limit, fields, flag)
+    return await list_response(
+        db, query, query_service.MOVIES, [sort_by.value], filters, MOVIE_FIELDS, limit, cursor, False, fields, flag
+    )
+
+@app.get("/facets", response_model=MovieFacets)
+async def movie_facets(
+    genre: Optional[Genre] = Query(None, description="Filter by genre"),
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(
+        None, ge=0, le=10, multiple_of=0.5, description="Minimum IMDb rating, in steps of 0.5"
+    ),
+    max_rating: Optional[float] = Query(
+        None, ge=0, le=10, multiple_of=0.5, description="Only ratings below this, in steps of 0.5"
+    ),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Movie counts per genre, language and half-point rating bucket.
+    Each facet applies every filter except its own.
+    """
+    filters = facet_service.FacetFilters(
+        genre=genre.value if genre else None, language=language, min_rating=min_rating, max_rating=max_rating
+    )
+    return await facet_response(db, facet_service.MOVIES, filters)
+
+@app.post("/enrich", status_code=202)
+async def enrich_movies(background_tasks: BackgroundTasks):
+    """
+    Start a background job that fills missing TMDB ratings and trailer URLs from TMDB.
+    """
+    if not tmdb_service.TMDB_API_KEY:
+        raise HTTPException(status_code=503, detail="TMDB_API_KEY is not configured")
+    if tmdb_service.enrichment_running():
+        return {"status": "already running"}
+    background_tasks.add_task(tmdb_service.enrich_movies)
+    return {"status": "scheduled"}
 
 # Book endpoints
 @app.post("/books/add", response_model=BookResponse)
-async def add_book(book: BookCreate, db: Session = Depends(get_db)):
+async def add_book(book: BookCreate, db: AsyncSession = Depends(get_db)):
     """
     Add a new book to the database.
     """
-    db_book = Book(**book.dict())
+    db_book = Book(**book.model_dump())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    catalog_events.rows_added("books", [catalog_events.as_row(db_book)])
     return db_book
 
-@app.get("/books/view", response_model=List[BookResponse])
+@app.post("/books/bulk", response_model=BulkResult)
+async def add_books_bulk(
+    request: Request,
+    mode: BulkMode = Query(
+        BulkMode.INSERT,
+        description="insert all rows, or skip/update rows whose title exists "
+                    "(update changes the earliest row with that title)",
+    ),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Add many books from a JSON array, NDJSON or CSV body (or multipart upload).
+    Invalid rows are reported in ``errors`` without aborting the import.
+    """
+    return await bulk_service.ingest_request(db, Book, BookCreate, request, mode)
+
+@app.get("/books/view", response_model=List[BookListItem])
 async def view_books(
     genre: Optional[BookGenre] = Query(None, description="Filter by genre"),
-    author: Optional[str] = Query(None, description="Filter by author"),
-    db: Session = Depends(get_db)
+    author: Optional[str] = Query(None, description="Filter by author: words of the name, as prefixes"),
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum rating"),
+    year_from: Optional[int] = Query(None, description="Earliest publication year"),
+    year_to: Optional[int] = Query(None, description="Latest publication year"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream results as NDJSON"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    View all books with optional genre and author filtering.
+    View all books, newest first, with optional genre, author, language, rating and year filters.
+    Pass ``limit`` for cursor pagination or ``stream=true`` for NDJSON.
     """
-    query = db.query(Book)
-    
-    if genre:
-        query = query.filter(Book.genre == genre.value)
-    
-    if author:
-        query = query.filter(Book.author.ilike(f"%{author}%"))
-    
-    books = query.order_by(Book.date_added.desc()).all()
-    return books
+    filters = query_service.ListFilters(
+        genre=genre.value if genre else None, author=author, language=language,
+        min_rating=min_rating, year_from=year_from, year_to=year_to,
+    )
+    return await list_response(
+        db, select(Book), query_service.BOOKS, [BookSort.DATE_ADDED.value], filters,
+        BOOK_FIELDS, limit, cursor, stream, fields, await watchlist_flag(user_id, "books"),
+    )
 
-@app.get("/books/sort", response_model=List[BookResponse])
+@app.get("/books/sort", response_model=List[BookListItem])
 async def sort_books(
-    sort_by: BookSort = Query(..., description="Sort by field"),
+    sort_by: List[BookSort] = Query(..., description="Sort by field; repeat for secondary sorts"),
     genre: Optional[BookGenre] = Query(None, description="Filter by genre"),
-    author: Optional[str] = Query(None, description="Filter by author"),
-    db: Session = Depends(get_db)
+    author: Optional[str] = Query(None, description="Filter by author: words of the name, as prefixes"),
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(None, ge=0, le=5, description="Minimum rating"),
+    year_from: Optional[int] = Query(None, description="Earliest publication year"),
+    year_to: Optional[int] = Query(None, description="Latest publication year"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream results as NDJSON"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Sort books by specified field with optional genre and author filtering.
+    Sort books by one or more fields with optional genre, author, language, rating and year filters.
+    Missing values sort last. Pass ``limit`` for cursor pagination or ``stream=true`` for NDJSON.
     """
-    query = db.query(Book)
-    
-    if genre:
-        query = query.filter(Book.genre == genre.value)
-    
-    if author:
-        query = query.filter(Book.author.ilike(f"%{author}%"))
-    
-    if sort_by == BookSort.DATE_ADDED:
-        query = query.order_by(Book.date_added.desc())
-    elif sort_by == BookSort.TITLE:
-        query = query.order_by(Book.title.asc())
-    elif sort_by == BookSort.AUTHOR:
-        query = query.order_by(Book.author.asc(), Book.title.asc())
-    elif sort_by == BookSort.RATING:
-        query = query.order_by(Book.rating.desc() if Book.rating is not None else Book.date_added.desc())
-    elif sort_by == BookSort.PUBLICATION_YEAR:
-        query = query.order_by(Book.publication_year.desc() if Book.publication_year is not None else Book.date_added.desc())
+    filters = query_service.ListFilters(
+        genre=genre.value if genre else None, author=author, language=language,
+        min_rating=min_rating, year_from=year_from, year_to=year_to,
+    )
+    return await list_response(
+        db, select(Book), query_service.BOOKS, [sort.value for sort in sort_by], filters,
+        BOOK_FIELDS, limit, cursor, stream, fields, await watchlist_flag(user_id, "books"),
+    )
+
+@app.get("/books/search", response_model=List[BookListItem])
+async def search_books(
+    q: str = Query(..., min_length=1, description="Words to match in title, author or summary, as prefixes"),
+    genre: Optional[BookGenre] = Query(None, description="Filter by genre"),
+    sort_by: Optional[BookSort] = Query(None, description="Sort by field instead of relevance"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="Cursor for the next page when sort_by is given"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,genre"),
+    user_id: Optional[int] = Query(None, description="Mark each item with in_watchlist for this user"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Full-text search over book titles, authors and summaries.
+    Results are ranked by relevance unless ``sort_by`` is given.
+    """
+    query, rank = search_service.search(db, select(Book), Book, q)
+    filters = query_service.ListFilters(genre=genre.value if genre else None)
+    flag = await watchlist_flag(user_id, "books")
     
-    books = query.all()
-    return books
+    if sort_by is None:
+        query = query_service.BOOKS.filter(query, filters)
+        if rank is not None:
+            query = query.order_by(rank, Book.id)
+        return await ranked_response(db, query, BOOK_FIELDS, limit, fields, flag)
+    return await list_response(
+        db, query, query_service.BOOKS, [sort_by.value], filters, BOOK_FIELDS, limit, cursor, False, fields, flag
+    )
+
+@app.get("/books/facets", response_model=BookFacets)
+async def book_facets(
+    genre: Optional[BookGenre] = Query(None, description="Filter by genre"),
+    language: Optional[str] = Query(None, description="Filter by language"),
+    min_rating: Optional[float] = Query(
+        None, ge=0, le=5, multiple_of=0.5, description="Minimum rating, in steps of 0.5"
+    ),
+    max_rating: Optional[float] = Query(
+        None, ge=0, le=5, multiple_of=0.5, description="Only ratings below this, in steps of 0.5"
+    ),
+    decade: Optional[int] = Query(None, multiple_of=10, description="Publication decade, e.g. 1990"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Book counts per genre, language, half-point rating bucket and publication decade.
+    Each facet applies every filter except its own.
+    """
+    filters = facet_service.FacetFilters(
+        genre=genre.value if genre else None, language=language,
+        min_rating=min_rating, max_rating=max_rating, decade=decade,
+    )
+    return await facet_response(db, facet_service.BOOKS, filters)
+
+@app.get("/suggest", response_model=List[Suggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=200, description="What has been typed so far"),
+    limit: int = Query(8, ge=1, le=suggest_service.MAX_SUGGESTIONS, description="Maximum number of suggestions"),
+):
+    """
+    Movie titles, book titles and authors starting with ``q``, best rated first.
+    Misspelled words are corrected when the prefix alone finds too little.
+    Served from memory, for calling on every keystroke.
+    """
+    index = suggest_service.suggester.current()
+    if index is None:
+        # Only until the index built at startup is ready.
+        index = await asyncio.to_thread(suggest_service.suggester.get)
+    # Spelling correction compares candidates by edit distance; keep it off the event loop.
+    suggestions = await asyncio.to_thread(index.suggest, q, limit)
+    return Response(dumps(suggestions), media_type="application/json")
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Request latency and SQL statistics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics_service.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -0,0 +1,65 @@
+"""
+Alembic migrations for databases created by an earlier version.
+
+``Base.metadata.create_all`` only creates missing tables, so indexes and
+other changes to existing tables are applied by the revisions in
+``versions/``. Revisions must be safe on a freshly created schema too,
+which already has their changes.
+
+The applied revision is the schema version that workers check on startup.
+Run ``python -m app.migrations`` (or ``alembic upgrade head`` from
+``backend/``) once per deploy to bring the database up to date.
+"""
+import os
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    # env.py migrates this connection when given, the app's engine otherwise.
+    config.attributes["connection"] = connection
+    return config
+
+
+def latest_version() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def is_known(revision: str) -> bool:
+    """Whether ``revision`` is one of ours; an unknown one was made by a newer release."""
+    return revision in {script.revision for script in ScriptDirectory.from_config(alembic_config()).walk_revisions()}
+
+
+def current_version(bind: Engine) -> Optional[str]:
+    """The applied revision, or ``None`` if the database was never migrated."""
+    with bind.connect() as conn:
+        return MigrationContext.configure(conn).get_current_revision() or _legacy_revision(conn)
+
+
+def _legacy_revision(conn) -> Optional[str]:
+    # Databases migrated before alembic recorded integer versions in schema_migrations.
+    if not inspect(conn).has_table("schema_migrations"):
+        return None
+    version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return f"{version:04d}" if version else None
+
+
+def run_migrations(bind: Engine):
+    """Apply pending revisions in one transaction."""
+    with bind.begin() as conn:
+        config = alembic_config(conn)
+        if MigrationContext.configure(conn).get_current_revision() is None:
+            legacy = _legacy_revision(conn)
+            if legacy:
+                command.stamp(config, legacy)
+        command.upgrade(config, "head")
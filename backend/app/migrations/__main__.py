@@ -0,0 +1,13 @@
+"""Create or upgrade the schema of the configured database: ``python -m app.migrations``."""
+from app.database import create_tables, engine
+from app.migrations import current_version
+
+
+def main():
+    before = current_version(engine)
+    create_tables()
+    print(f"Schema at revision {current_version(engine)} (was {'unversioned' if before is None else before})")
+
+
+if __name__ == "__main__":
+    main()
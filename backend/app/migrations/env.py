@@ -0,0 +1,23 @@
+from alembic import context
+
+from app.database import Base, engine
+from app.models import book, movie, user  # noqa: F401 - register every table on Base.metadata
+
+target_metadata = Base.metadata
+
+
+def run(connection):
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    context.configure(url=engine.url, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+elif context.config.attributes.get("connection") is not None:
+    run(context.config.attributes["connection"])
+else:
+    with engine.begin() as connection:
+        run(connection)
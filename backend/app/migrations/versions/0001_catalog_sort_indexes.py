@@ -0,0 +1,49 @@
+"""
+Composite indexes for the listing filters and sorts (see app/services/query_service.py).
+
+Each ends in ``id`` like the keyset orderings it serves. The ``genre IS NULL``
+indexes match the NULLS LAST ordering of the genre sort.
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_movies_date_added_id ON movies (date_added, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_date_added_id ON movies (genre, date_added, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_imdb_rating_id ON movies (genre, imdb_rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_nulls_last_date_added_id ON movies (genre IS NULL, genre, date_added DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_nulls_last_imdb_rating_id ON movies (genre IS NULL, genre, imdb_rating DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_nulls_last_title_id ON movies (genre IS NULL, genre, title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_genre_title_id ON movies (genre, title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_movies_imdb_rating_id ON movies (imdb_rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_publication_year_id ON books (author, publication_year DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_title_id ON books (author, title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_date_added_id ON books (date_added, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_author_publication_year_id ON books (genre, author, publication_year DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_author_title_id ON books (genre, author, title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_date_added_id ON books (genre, date_added, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_publication_year_id ON books (genre, publication_year, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_publication_year_rating_id ON books (genre, publication_year, rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_rating_id ON books (genre, rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_title_id ON books (genre, title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_publication_year_id ON books (publication_year, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_publication_year_rating_id ON books (publication_year, rating, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_rating_id ON books (rating, id)",
+]
+
+
+def upgrade():
+    for statement in STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in STATEMENTS:
+        op.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
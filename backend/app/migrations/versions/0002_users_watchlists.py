@@ -0,0 +1,29 @@
+"""
+User and watchlist tables (see app/models/user.py).
+
+Databases migrated to revision 0001 before these models existed lack them,
+and the startup schema check no longer runs ``create_all`` on a current
+schema.
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from app.models.user import User, WatchlistItem
+
+    conn = op.get_bind()
+    User.__table__.create(conn, checkfirst=True)
+    WatchlistItem.__table__.create(conn, checkfirst=True)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS watchlist_items")
+    op.execute("DROP TABLE IF EXISTS users")
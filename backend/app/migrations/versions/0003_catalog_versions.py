@@ -0,0 +1,43 @@
+"""
+Per-table write counters for the response cache (see app/services/cache_service.py).
+
+Triggers bump a catalog's counter on every insert, update and delete, in
+the writing transaction, whichever process writes. Other databases get the
+table but no triggers, and the cache keeps counting writes in-process.
+
+Revision ID: 0003
+Revises: 0002
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+TABLES = ("movies", "books")
+EVENTS = {"ai": "INSERT", "au": "UPDATE", "ad": "DELETE"}
+
+
+def upgrade():
+    op.execute("CREATE TABLE IF NOT EXISTS catalog_versions (name VARCHAR PRIMARY KEY, version INTEGER NOT NULL)")
+    for table in TABLES:
+        op.execute(
+            f"INSERT INTO catalog_versions (name, version) SELECT '{table}', 0 "
+            f"WHERE NOT EXISTS (SELECT 1 FROM catalog_versions WHERE name = '{table}')"
+        )
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        for suffix, event in EVENTS.items():
+            op.execute(
+                f"CREATE TRIGGER IF NOT EXISTS catalog_versions_{table}_{suffix} AFTER {event} ON {table} "
+                f"BEGIN UPDATE catalog_versions SET version = version + 1 WHERE name = '{table}'; END"
+            )
+
+
+def downgrade():
+    for table in TABLES:
+        for suffix in EVENTS:
+            op.execute(f"DROP TRIGGER IF EXISTS catalog_versions_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS catalog_versions")
@@ -0,0 +1,27 @@
+"""
+Indexes for the language filter, ordered like the default newest-first listing.
+
+Revision ID: 0004
+Revises: 0003
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_movies_language_date_added_id ON movies (language, date_added, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_language_date_added_id ON books (language, date_added, id)",
+]
+
+
+def upgrade():
+    for statement in STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in STATEMENTS:
+        op.execute(f"DROP INDEX IF EXISTS {statement.split()[5]}")
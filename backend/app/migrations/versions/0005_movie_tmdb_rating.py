@@ -0,0 +1,24 @@
+"""
+A ``tmdb_rating`` column for the TMDB vote average, which the enrichment
+job used to write into ``imdb_rating``.
+
+Revision ID: 0005
+Revises: 0004
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("movies")}
+    if "tmdb_rating" not in columns:
+        op.add_column("movies", sa.Column("tmdb_rating", sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("movies", "tmdb_rating")
@@ -0,0 +1,27 @@
+"""
+A ``tags`` column on movies and books for the tags generated with summaries.
+
+Revision ID: 0006
+Revises: 0005
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+TABLES = ("movies", "books")
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if "tags" not in {column["name"] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column("tags", sa.String(), nullable=True))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, "tags")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index
 from datetime import datetime
 from app.database import Base
 
@@ -14,7 +14,30 @@ class Book(Base):
     genre = Column(String, nullable=True, index=True)
     rating = Column(Float, nullable=True)
     publication_year = Column(Integer, nullable=True)
+    # Comma-separated lowercase tags, generated with the summary (llm_service).
+    tags = Column(String, nullable=True)
     date_added = Column(DateTime, default=datetime.utcnow)
+
+    # One index per supported sort, alone and after the genre filter, ending
+    # in id like the keyset orderings. The language filter seeks on its own
+    # index, in order for the default sort; the author filter goes through
+    # the search index. Existing databases get these from app/migrations.
+    __table_args__ = (
+        Index("ix_books_date_added_id", date_added, id),
+        Index("ix_books_rating_id", rating, id),
+        Index("ix_books_publication_year_id", publication_year, id),
+        Index("ix_books_author_title_id", author, title, id),
+        Index("ix_books_genre_date_added_id", genre, date_added, id),
+        Index("ix_books_genre_title_id", genre, title, id),
+        Index("ix_books_genre_author_title_id", genre, author, title, id),
+        Index("ix_books_genre_rating_id", genre, rating, id),
+        Index("ix_books_genre_publication_year_id", genre, publication_year, id),
+        Index("ix_books_author_publication_year_id", author, publication_year.desc(), id.desc()),
+        Index("ix_books_genre_author_publication_year_id", genre, author, publication_year.desc(), id.desc()),
+        Index("ix_books_publication_year_rating_id", publication_year, rating, id),
+        Index("ix_books_genre_publication_year_rating_id", genre, publication_year, rating, id),
+        Index("ix_books_language_date_added_id", language, date_added, id),
+    )
     
     def __repr__(self):
         return f"<Book(id={self.id}, title='{self.title}', author='{self.author}')>"
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index
 from datetime import datetime
 from app.database import Base
 
@@ -13,7 +13,28 @@ class Movie(Base):
     trailer_url = Column(String, nullable=True)
     genre = Column(String, nullable=True, index=True)
     imdb_rating = Column(Float, nullable=True)
+    # TMDB's vote average, filled in by the enrichment job (tmdb_service).
+    tmdb_rating = Column(Float, nullable=True)
+    # Comma-separated lowercase tags, generated with the summary (llm_service).
+    tags = Column(String, nullable=True)
     date_added = Column(DateTime, default=datetime.utcnow)
+
+    # One index per supported sort, alone and after the genre filter, ending
+    # in id like the keyset orderings. Sorting by genre puts NULLs last, so
+    # those indexes lead with the same ``genre IS NULL`` expression. The
+    # language filter seeks on its own index, in order for the default sort.
+    # Existing databases get these from app/migrations.
+    __table_args__ = (
+        Index("ix_movies_date_added_id", date_added, id),
+        Index("ix_movies_imdb_rating_id", imdb_rating, id),
+        Index("ix_movies_genre_date_added_id", genre, date_added, id),
+        Index("ix_movies_genre_imdb_rating_id", genre, imdb_rating, id),
+        Index("ix_movies_genre_title_id", genre, title, id),
+        Index("ix_movies_genre_nulls_last_title_id", genre.is_(None), genre, title, id),
+        Index("ix_movies_genre_nulls_last_imdb_rating_id", genre.is_(None), genre, imdb_rating.desc(), id.desc()),
+        Index("ix_movies_genre_nulls_last_date_added_id", genre.is_(None), genre, date_added.desc(), id.desc()),
+        Index("ix_movies_language_date_added_id", language, date_added, id),
+    )
     
     def __repr__(self):
         return f"<Movie(id={self.id}, title='{self.title}', genre='{self.genre}')>"
\ No newline at end of file
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.database import Base
+
+
+class User(Base):
+    __tablename__ = "users"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, nullable=False, unique=True, index=True)
+    # Bumped with every watchlist change, in the same transaction, so cached
+    # watchlist ID sets can tell whether they are current.
+    watchlist_version = Column(Integer, nullable=False, default=0)
+    date_added = Column(DateTime, default=datetime.utcnow)
+
+
+class WatchlistItem(Base):
+    __tablename__ = "watchlist_items"
+    
+    # The primary key is the whole lookup path: no rowid and no separate
+    # index, and a user's items for one catalog are stored together.
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    catalog = Column(String, primary_key=True)  # "movies" or "books"
+    item_id = Column(Integer, primary_key=True)
+    saved_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_watchlist_items_user_id_catalog_saved_at", user_id, catalog, saved_at, item_id),
+        {"sqlite_with_rowid": False},
+    )
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 
 
@@ -34,11 +34,17 @@ class BookCreate(BookBase):
 class BookResponse(BookBase):
     id: int
     date_added: datetime
+    tags: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class BookListItem(BookResponse):
+    """A book in a listing: only the requested ``fields`` are present."""
+    in_watchlist: Optional[bool] = Field(None, description="Whether the book is in the user's watchlist; only with user_id")
+
+
 class BookSort(str, Enum):
     DATE_ADDED = "date_added"
     TITLE = "title"
@@ -0,0 +1,22 @@
+from typing import List
+from pydantic import BaseModel
+from enum import Enum
+
+
+class BulkMode(str, Enum):
+    INSERT = "insert"
+    SKIP = "skip"
+    UPDATE = "update"
+
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[BulkRowError] = []
@@ -0,0 +1,19 @@
+from typing import List, Optional, Union
+from pydantic import BaseModel
+
+
+class FacetCount(BaseModel):
+    # ``None`` counts rows where the column is empty.
+    value: Optional[Union[int, float, str]] = None
+    count: int
+
+
+class MovieFacets(BaseModel):
+    total: int
+    genre: List[FacetCount]
+    language: List[FacetCount]
+    rating: List[FacetCount]
+
+
+class BookFacets(MovieFacets):
+    decade: List[FacetCount]
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 
 
@@ -33,11 +33,18 @@ class MovieCreate(MovieBase):
 class MovieResponse(MovieBase):
     id: int
     date_added: datetime
+    tmdb_rating: Optional[float] = None
+    tags: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class MovieListItem(MovieResponse):
+    """A movie in a listing: only the requested ``fields`` are present."""
+    in_watchlist: Optional[bool] = Field(None, description="Whether the movie is in the user's watchlist; only with user_id")
+
+
 class MovieSort(str, Enum):
     DATE_ADDED = "date_added"
     TITLE = "title"
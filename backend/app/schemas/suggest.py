@@ -0,0 +1,16 @@
+from typing import Optional
+from pydantic import BaseModel
+from enum import Enum
+
+
+class SuggestionType(str, Enum):
+    MOVIE = "movie"
+    BOOK = "book"
+    AUTHOR = "author"
+
+
+class Suggestion(BaseModel):
+    type: SuggestionType
+    id: Optional[int] = None  # None for authors
+    text: str
+    rating: Optional[float] = None
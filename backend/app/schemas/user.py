@@ -0,0 +1,27 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from enum import Enum
+
+
+class WatchlistCatalog(str, Enum):
+    MOVIES = "movies"
+    BOOKS = "books"
+
+
+class UserCreate(BaseModel):
+    username: str = Field(..., min_length=1, max_length=64)
+
+
+class UserResponse(BaseModel):
+    id: int
+    username: str
+    date_added: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class WatchlistChange(BaseModel):
+    catalog: WatchlistCatalog
+    item_id: int
+    changed: bool
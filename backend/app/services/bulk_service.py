@@ -0,0 +1,402 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.schemas.bulk import BulkMode, BulkResult, BulkRowError
+from app.services import catalog_events
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+READ_CHUNK_SIZE = 64 * 1024
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+class ParseError(ValueError):
+    """A single record in the upload could not be parsed."""
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+class BulkIngest:
+    """
+    Validate records and write them in batched transactions.
+
+    Each batch is one executemany INSERT (plus one title lookup and one bulk
+    UPDATE when deduplicating) followed by a commit. Invalid rows are
+    recorded in the result instead of aborting the import.
+
+    Titles are not unique. When several stored rows share an uploaded title,
+    skip mode skips it and update mode updates only the earliest-added of
+    them (the lowest id); the others are left as they are.
+
+    Writes take a sync ``Session`` so async callers can hand whole batches to
+    ``AsyncSession.run_sync`` instead of awaiting every statement.
+    """
+
+    def __init__(self, model, schema, mode: BulkMode = BulkMode.INSERT,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.model = model
+        self.schema = schema
+        self.mode = mode
+        self.batch_size = batch_size
+        self.result = BulkResult()
+        # (row number, values with defaults, names of the fields the record set)
+        self._batch: List[Tuple[int, Dict[str, Any], Set[str]]] = []
+        self._added: List[Dict[str, Any]] = []
+        self._changed = False
+
+    def add(self, row: int, record: Any) -> bool:
+        """Validate one record and queue it. Returns True once the batch is full."""
+        try:
+            validated = self.schema.model_validate(record)
+        except ValidationError as exc:
+            self.fail(row, _format_validation_error(exc))
+            return False
+        self._batch.append((row, validated.model_dump(mode="json"), validated.model_fields_set))
+        return len(self._batch) >= self.batch_size
+
+    def fail(self, row: int, error: str):
+        self.result.failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(BulkRowError(row=row, error=error))
+
+    def flush(self, db: Session):
+        """Write and commit the queued batch."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        checkpoint = self._checkpoint()
+        try:
+            self._write(db, batch)
+            db.commit()
+        except SQLAlchemyError:
+            self._rollback(db, checkpoint)
+            self._write_one_by_one(db, batch)
+        self._publish()
+
+    def _publish(self):
+        table = self.model.__tablename__
+        added, self._added = self._added, []
+        catalog_events.rows_added(table, added)
+        if self._changed:
+            self._changed = False
+            catalog_events.rows_changed(table)
+
+    def _checkpoint(self) -> Tuple[int, int, int, int, bool]:
+        return (self.result.inserted, self.result.updated, self.result.skipped, len(self._added), self._changed)
+
+    def _rollback(self, db: Session, checkpoint: Tuple[int, int, int, int, bool]):
+        """Roll back and forget everything recorded since ``checkpoint``."""
+        db.rollback()
+        self.result.inserted, self.result.updated, self.result.skipped, added, self._changed = checkpoint
+        del self._added[added:]
+
+    def _write(self, db: Session, batch: List[Tuple[int, Dict[str, Any], Set[str]]]):
+        if self.mode == BulkMode.INSERT:
+            self._insert(db, [values for _, values, _ in batch])
+            return
+
+        # Later rows for the same title win in update mode, earlier rows in
+        # skip mode; the rows they win over are counted as skipped.
+        by_title: Dict[str, Tuple[Dict[str, Any], Set[str]]] = {}
+        duplicates = 0
+        for _, values, fields_set in batch:
+            if values["title"] in by_title:
+                duplicates += 1
+                if self.mode == BulkMode.SKIP:
+                    continue
+            by_title[values["title"]] = (values, fields_set)
+
+        existing = dict(
+            db.execute(
+                select(self.model.title, func.min(self.model.id))
+                .where(self.model.title.in_(list(by_title)))
+                .group_by(self.model.title)
+            ).all()
+        )
+        new_rows = [values for title, (values, _) in by_title.items() if title not in existing]
+        self._insert(db, new_rows)
+
+        self.result.skipped += duplicates
+        if self.mode == BulkMode.SKIP:
+            self.result.skipped += len(by_title) - len(new_rows)
+        else:
+            # Only the fields the upload set: omitted ones keep their stored values.
+            changed = [
+                {"id": existing[title], **{name: values[name] for name in fields_set}}
+                for title, (values, fields_set) in by_title.items() if title in existing
+            ]
+            if changed:
+                db.execute(update(self.model), changed)
+                self._changed = True
+            self.result.updated += len(changed)
+
+    def _insert(self, db: Session, rows: List[Dict[str, Any]]):
+        if rows:
+            returning = insert(self.model).returning(*self.model.__table__.columns)
+            self._added.extend(dict(row) for row in db.execute(returning, rows).mappings())
+            self.result.inserted += len(rows)
+
+    def _write_one_by_one(self, db: Session, batch: List[Tuple[int, Dict[str, Any], Set[str]]]):
+        """Retry a failed batch row by row so the error lands on the offending rows."""
+        for row, values, fields_set in batch:
+            checkpoint = self._checkpoint()
+            try:
+                self._write(db, [(row, values, fields_set)])
+                db.commit()
+            except SQLAlchemyError as exc:
+                self._rollback(db, checkpoint)
+                self.fail(row, str(exc.orig) if getattr(exc, "orig", None) else str(exc))
+
+
+def ingest(db: Session, model, schema, records: Iterable[Any], mode: BulkMode = BulkMode.INSERT,
+           batch_size: int = DEFAULT_BATCH_SIZE) -> BulkResult:
+    """Ingest an in-memory iterable of dicts or ``schema`` instances."""
+    bulk = BulkIngest(model, schema, mode, batch_size)
+    for row, record in enumerate(records, start=1):
+        if bulk.add(row, record):
+            bulk.flush(db)
+    bulk.flush(db)
+    return bulk.result
+
+
+async def _ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    row = 0
+
+    def parse(line: str):
+        try:
+            return json.loads(line)
+        except ValueError as exc:
+            return ParseError(f"Invalid JSON: {exc}")
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, parse(line)
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield row + 1, parse(buffer)
+
+
+def _element_end(buffer: str, position: int) -> Optional[int]:
+    """
+    Find the end of a malformed array element starting at ``position``.
+
+    Returns the index of the ``,`` or ``]`` that follows it outside any
+    brackets or strings, or ``None`` if that is not in ``buffer`` yet. A
+    closing bracket also closes any left open inside it, and a raw newline
+    ends a string, since JSON strings cannot contain one.
+    """
+    openers: List[str] = []
+    in_string = escaped = False
+    for index in range(position, len(buffer)):
+        char = buffer[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char in '"\n':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            openers.append(char)
+        elif char in "]}":
+            opener = "[" if char == "]" else "{"
+            if opener in openers:
+                # Brackets left open inside this one are closed along with it.
+                del openers[len(openers) - 1 - openers[::-1].index(opener):]
+            elif char == "]" and not openers:
+                return index
+        elif char == "," and not openers:
+            return index
+    return None
+
+
+async def _json_array_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Decode the elements of a top-level JSON array one at a time.
+
+    A malformed element is reported as a ``ParseError`` and skipped up to the
+    next top-level comma, so the elements after it are still read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    row = 0
+    started = finished = done = False
+
+    while not done:
+        try:
+            chunk = await chunks.__anext__()
+            buffer = buffer[position:] + decoder.decode(chunk)
+        except StopAsyncIteration:
+            buffer = buffer[position:] + decoder.decode(b"", final=True)
+            done = True
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer) or finished:
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise HTTPException(status_code=400, detail="Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                position += 1
+                continue
+            try:
+                record, end = json_decoder.raw_decode(buffer, position)
+            except ValueError as exc:
+                end = _element_end(buffer, position)
+                if end is None and not done:
+                    break
+                row += 1
+                # The error's own line and column count from the current chunk, not the upload.
+                yield row, ParseError(f"Invalid JSON: {exc.msg}")
+                if end is None:
+                    return
+                position = end
+                continue
+            if end == len(buffer) and not done:
+                # A bare number at the end of the buffer may continue in the next chunk.
+                break
+            row += 1
+            position = end
+            yield row, record
+
+    if not started:
+        raise HTTPException(status_code=400, detail="Expected a JSON array")
+    if not finished:
+        yield row + 1, ParseError("Unterminated JSON array")
+
+
+async def _csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yield CSV rows as dicts keyed by the header row.
+
+    Physical lines are joined until their quotes balance, so quoted fields
+    may contain newlines. Empty cells are dropped so schema defaults apply.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    pending = ""
+    header = None
+    row = 0
+
+    def records(final: bool):
+        nonlocal buffer, pending, header, row
+        *lines, buffer = buffer.split("\n")
+        if final and buffer:
+            lines.append(buffer)
+            buffer = ""
+        for line in lines:
+            pending += line + "\n"
+            if pending.count('"') % 2:
+                continue
+            record, pending = pending, ""
+            if not record.strip():
+                continue
+            values = next(csv.reader([record]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if len(values) != len(header):
+                yield row, ParseError(f"Expected {len(header)} columns, got {len(values)}")
+            else:
+                yield row, {name: value for name, value in zip(header, values) if value != ""}
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        for item in records(final=False):
+            yield item
+    buffer += decoder.decode(b"", final=True)
+    for item in records(final=True):
+        yield item
+    if pending.strip():
+        yield row + 1, ParseError("Unterminated quoted field")
+
+
+PARSERS = (
+    (JSON_TYPES, (".json",), _json_array_records),
+    (NDJSON_TYPES, (".ndjson", ".jsonl"), _ndjson_records),
+    (CSV_TYPES, (".csv",), _csv_records),
+)
+
+
+def _parser_for(content_type: str, filename: str = ""):
+    media_type = content_type.split(";")[0].strip().lower()
+    for media_types, extensions, parser in PARSERS:
+        if media_type in media_types or filename.lower().endswith(extensions):
+            return parser
+    raise HTTPException(
+        status_code=415,
+        detail="Send a JSON array, NDJSON or CSV body, or upload one as multipart 'file'",
+    )
+
+
+async def _upload_chunks(upload) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def ingest_request(db: AsyncSession, model, schema, request: Request, mode: BulkMode,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> BulkResult:
+    """
+    Stream-parse a bulk upload from ``request`` and ingest it.
+
+    The body may be a JSON array, NDJSON or CSV (chosen by Content-Type), or
+    a multipart form whose ``file`` field holds one of those.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart uploads need a 'file' field")
+        parser = _parser_for(upload.content_type or "", upload.filename or "")
+        chunks = _upload_chunks(upload)
+    else:
+        parser = _parser_for(content_type)
+        chunks = request.stream()
+
+    bulk = BulkIngest(model, schema, mode, batch_size)
+    async for row, record in parser(chunks):
+        if isinstance(record, ParseError):
+            bulk.fail(row, str(record))
+        elif bulk.add(row, record):
+            await db.run_sync(bulk.flush)
+    await db.run_sync(bulk.flush)
+    return bulk.result
@@ -0,0 +1,404 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from app.services import catalog_events
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+# Optional SQLite file shared by all workers on the host for bodies, and for
+# versions when the catalog is not a SQLite database (see CatalogVersions).
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")
+RESPONSE_CACHE_SHARED_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_SHARED_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Oldest entries read per round while evicting from the shared store.
+SHARED_EVICTION_BATCH = 32
+
+# Cached GET routes and the tables whose writes invalidate them.
+CACHED_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "/view": ("movies",),
+    "/sort": ("movies",),
+    "/search": ("movies",),
+    "/facets": ("movies",),
+    "/books/view": ("books",),
+    "/books/sort": ("books",),
+    "/books/search": ("books",),
+    "/books/facets": ("books",),
+}
+
+CATALOG_TABLES = ("movies", "books")
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: Headers
+    body: bytes
+
+
+class SharedStore:
+    """
+    Table versions and response bodies in a local SQLite file.
+
+    Every worker on the host opens the same file, so a write in one worker
+    bumps the version that all of them use to build ETags and cache keys.
+    The total body size is kept in ``response_bytes`` so a put does not have
+    to sum the table, and each put and its evictions are one transaction.
+    Calls block; async callers run them in a thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int = RESPONSE_CACHE_SHARED_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._path = path
+        conn = self._conn()
+        with _immediate(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(etag TEXT PRIMARY KEY, status INTEGER, headers BLOB, body BLOB, size INTEGER, stored REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_stored ON responses (stored)")
+            conn.execute("CREATE TABLE IF NOT EXISTS response_bytes (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO response_bytes (id, total) SELECT 1, COALESCE(SUM(size), 0) FROM responses")
+            conn.execute(
+                "INSERT OR IGNORE INTO table_versions (name, version) VALUES ('__epoch__', ?)",
+                (uuid.uuid4().int >> 96,),
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def epoch(self) -> str:
+        return str(self.version("__epoch__"))
+
+    def version(self, table: str) -> int:
+        row = self._conn().execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, table: str):
+        self._conn().execute(
+            "INSERT INTO table_versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            (table,),
+        )
+
+    def get(self, etag: str) -> Optional[CachedResponse]:
+        row = self._conn().execute("SELECT status, headers, body FROM responses WHERE etag = ?", (etag,)).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(row[0], _unpack_headers(row[1]), row[2])
+
+    def put(self, etag: str, response: CachedResponse):
+        conn = self._conn()
+        with _immediate(conn):
+            replaced = conn.execute("SELECT size FROM responses WHERE etag = ?", (etag,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (etag, status, headers, body, size, stored) VALUES (?, ?, ?, ?, ?, ?)",
+                (etag, response.status, _pack_headers(response.headers), response.body, len(response.body), time.time()),
+            )
+            total = self._add_bytes(conn, len(response.body) - (replaced[0] if replaced else 0))
+            # Evict the oldest entries until the store fits again.
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT etag, size FROM responses ORDER BY stored LIMIT ?", (SHARED_EVICTION_BATCH,)
+                ).fetchall()
+                if not oldest:
+                    break
+                evicted, freed = [], 0
+                for old_etag, size in oldest:
+                    if total - freed <= self.max_bytes:
+                        break
+                    evicted.append((old_etag,))
+                    freed += size
+                conn.executemany("DELETE FROM responses WHERE etag = ?", evicted)
+                total = self._add_bytes(conn, -freed)
+
+    @staticmethod
+    def _add_bytes(conn: sqlite3.Connection, delta: int) -> int:
+        return conn.execute(
+            "UPDATE response_bytes SET total = total + ? WHERE id = 1 RETURNING total", (delta,)
+        ).fetchall()[0][0]
+
+
+@contextmanager
+def _immediate(conn: sqlite3.Connection):
+    """
+    ``BEGIN IMMEDIATE`` ... ``COMMIT`` on an autocommit connection, so the
+    statements inside hold the write lock together.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class CatalogVersions:
+    """
+    Table versions kept in the ``catalog_versions`` table of a SQLite catalog.
+
+    Triggers bump a table's version inside every transaction that writes it
+    (see migration 0003), so writes from any process -- other workers, the
+    enrichment jobs, the seeders -- invalidate every worker's cache. Each
+    thread keeps a read-only connection per database file, and a lookup is
+    a read of two rows.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def read(self, path: str) -> Dict[str, int]:
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(path)
+        if conn is None:
+            conn = connections[path] = sqlite3.connect(
+                f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, timeout=5, isolation_level=None
+            )
+        return dict(conn.execute("SELECT name, version FROM catalog_versions"))
+
+
+def _pack_headers(headers: Headers) -> bytes:
+    return b"\n".join(name + b":" + value for name, value in headers)
+
+
+def _unpack_headers(packed: bytes) -> Headers:
+    return [tuple(line.split(b":", 1)) for line in packed.split(b"\n") if line]
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU of serialized responses keyed by ETag.
+
+    ETags hash the normalized request together with the versions of the
+    tables the route reads, so bumping a table version on write makes every
+    dependent entry unreachable; stale entries simply age out of the LRU.
+
+    Versions normally come from the catalog database (``CatalogVersions``).
+    For other databases they are counted here, from the writes this process
+    publishes, or in the ``shared`` store; with more than one writing
+    process, a non-SQLite catalog therefore needs ``RESPONSE_CACHE_PATH``.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES,
+                 shared: Optional[SharedStore] = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.shared = shared
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._versions: Dict[str, int] = {}
+        self._epoch = shared.epoch() if shared else uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+    def version(self, table: str) -> int:
+        if self.shared:
+            return self.shared.version(table)
+        return self._versions.get(table, 0)
+
+    def bump(self, table: str):
+        """Invalidate every cached response that depends on ``table``."""
+        if self.shared:
+            self.shared.bump(table)
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+    def etag(self, key: str, tables: Sequence[str], versions: Optional[Mapping[str, int]] = None) -> str:
+        """The ETag of ``key`` given table ``versions``, or the versions counted here."""
+        versions = ",".join(
+            f"{table}={versions.get(table, 0) if versions is not None else self.version(table)}" for table in tables
+        )
+        digest = hashlib.blake2b(f"{self._epoch}|{versions}|{key}".encode(), digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    def get(self, etag: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+                return entry
+        if self.shared:
+            entry = self.shared.get(etag)
+            if entry is not None:
+                self._store(etag, entry)
+            return entry
+        return None
+
+    def put(self, etag: str, response: CachedResponse):
+        if len(response.body) > self.max_entry_bytes:
+            return
+        self._store(etag, response)
+        if self.shared:
+            self.shared.put(etag, response)
+
+    async def aget(self, etag: str) -> Optional[CachedResponse]:
+        """``get`` that reads the shared store in a thread; local hits do not leave the event loop."""
+        if self.shared is None:
+            return self.get(etag)
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+                return entry
+        return await asyncio.to_thread(self.get, etag)
+
+    async def aput(self, etag: str, response: CachedResponse):
+        """``put`` that writes the shared store in a thread."""
+        if self.shared is None:
+            self.put(etag, response)
+        else:
+            await asyncio.to_thread(self.put, etag, response)
+
+    def _store(self, etag: str, response: CachedResponse):
+        with self._lock:
+            previous = self._entries.pop(etag, None)
+            if previous is not None:
+                self._size -= len(previous.body)
+            self._entries[etag] = response
+            self._size += len(response.body)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def cache_key(path: str, query_string: bytes) -> str:
+    # Sorted by name only: the order of repeated parameters such as
+    # ``sort_by`` is significant and must stay part of the key.
+    params = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True), key=lambda item: item[0])
+    return f"{path}?{urlencode(params)}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCacheMiddleware:
+    """
+    Serve cached catalog listings and answer revalidations with 304.
+
+    A request whose ``If-None-Match`` matches the current ETag is answered
+    with a single read of the table versions. Streaming (``stream=true``)
+    and per-user (``user_id``) requests are passed through untouched.
+
+    Reads behind a cached route are pinned to one database of
+    ``read_router`` (see ``ReadRouter.pinned``) and the ETag is built from
+    that database's ``catalog_versions``, so a body from a lagging replica is
+    cached under the replica's versions rather than the primary's. Replicas
+    that do not report versions (anything but SQLite) are not cached.
+    """
+
+    def __init__(self, app, cache: Optional[ResponseCache] = None, routes: Dict[str, Tuple[str, ...]] = CACHED_ROUTES,
+                 read_router=None):
+        self.app = app
+        self.cache = cache or response_cache
+        self.routes = routes
+        self.read_router = read_router
+
+    async def __call__(self, scope, receive, send):
+        tables = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if tables is None or scope["method"] != "GET" or _bypasses_cache(scope["query_string"]):
+            await self.app(scope, receive, send)
+            return
+
+        from app.database import read_router, sqlite_path
+
+        router = self.read_router or read_router
+        with router.pinned() as read_engine:
+            path = sqlite_path(read_engine)
+            if path is None and router.engines:
+                await self.app(scope, receive, send)
+            else:
+                versions = await asyncio.to_thread(catalog_versions.read, path) if path else None
+                await self._respond(scope, receive, send, tables, versions)
+
+    async def _respond(self, scope, receive, send, tables: Sequence[str], versions: Optional[Mapping[str, int]]):
+        key = cache_key(scope["path"], scope["query_string"])
+        if versions is None and self.cache.shared:
+            etag = await asyncio.to_thread(self.cache.etag, key, tables)
+        else:
+            etag = self.cache.etag(key, tables, versions)
+        validator_headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+        if if_none_match and _etag_matches(if_none_match.decode("latin-1"), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validator_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cached = await self.cache.aget(etag)
+        if cached is not None:
+            headers = cached.headers + [(b"content-length", str(len(cached.body)).encode())]
+            await send({"type": "http.response.start", "status": cached.status, "headers": headers})
+            await send({"type": "http.response.body", "body": cached.body})
+            return
+
+        start = {}
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture(message):
+            nonlocal size
+            complete = None
+            if message["type"] == "http.response.start":
+                start.update(message)
+                if message["status"] == 200:
+                    message = {**message, "headers": list(message.get("headers", [])) + validator_headers}
+                    start["headers"] = [
+                        (name, value) for name, value in message["headers"] if name.lower() != b"content-length"
+                    ]
+            elif message["type"] == "http.response.body" and start.get("status") == 200 and size is not None:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > self.cache.max_entry_bytes:
+                    size = None
+                elif not message.get("more_body", False):
+                    complete = CachedResponse(200, start["headers"], b"".join(chunks))
+            await send(message)
+            if complete is not None:
+                await self.cache.aput(etag, complete)
+
+        await self.app(scope, receive, capture)
+
+
+def _bypasses_cache(query_string: bytes) -> bool:
+    # Watchlist flags change with every save, which the table versions do not track.
+    return any(
+        (name == "stream" and value.lower() in ("1", "true", "yes", "on")) or name == "user_id"
+        for name, value in parse_qsl(query_string.decode("latin-1"))
+    )
+
+
+catalog_versions = CatalogVersions()
+response_cache = ResponseCache(shared=SharedStore(RESPONSE_CACHE_PATH) if RESPONSE_CACHE_PATH else None)
+
+for _table in CATALOG_TABLES:
+    catalog_events.on_rows_added(_table, lambda rows, table=_table: response_cache.bump(table))
+    catalog_events.on_rows_changed(_table, lambda table=_table: response_cache.bump(table))
@@ -0,0 +1,51 @@
+"""
+In-process notifications for committed writes to the catalog tables.
+
+Write paths publish here after their transaction commits; caches and
+in-memory indexes subscribe to keep themselves current without each write
+path having to know about every consumer.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Mapping, Sequence
+
+logger = logging.getLogger(__name__)
+
+RowsAddedListener = Callable[[Sequence[Mapping[str, Any]]], None]
+RowsChangedListener = Callable[[], None]
+
+_added_listeners: Dict[str, List[RowsAddedListener]] = defaultdict(list)
+_changed_listeners: Dict[str, List[RowsChangedListener]] = defaultdict(list)
+
+
+def on_rows_added(table: str, listener: RowsAddedListener):
+    """Call ``listener`` with the column values of rows inserted into ``table``."""
+    _added_listeners[table].append(listener)
+
+
+def on_rows_changed(table: str, listener: RowsChangedListener):
+    """Call ``listener`` after existing rows of ``table`` were updated or deleted."""
+    _changed_listeners[table].append(listener)
+
+
+def as_row(instance) -> Dict[str, Any]:
+    """Column values of an ORM instance, in the shape ``rows_added`` listeners get."""
+    return {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
+
+
+def rows_added(table: str, rows: Sequence[Mapping[str, Any]]):
+    if not rows:
+        return
+    for listener in _added_listeners[table]:
+        try:
+            listener(rows)
+        except Exception:
+            logger.exception("rows_added listener failed for %s", table)
+
+
+def rows_changed(table: str):
+    for listener in _changed_listeners[table]:
+        try:
+            listener()
+        except Exception:
+            logger.exception("rows_changed listener failed for %s", table)
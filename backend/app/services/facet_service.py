@@ -0,0 +1,233 @@
+"""
+Facet counts for the catalog filters, maintained incrementally.
+
+Each catalog has a summary table with one row ("cell") per combination of
+genre, language, half-point rating bucket and, for books, publication decade,
+holding the number of catalog rows with those values. Triggers adjust the
+counts on every insert, update and delete, so single adds, bulk imports and
+the enrichment jobs all keep it exact inside their own transactions.
+
+A facets request reads the cells and sums them per facet in one pass. The
+number of cells depends on how many distinct facet values exist, not on
+the catalog size. Other databases get the same cells from a GROUP BY over
+the catalog table.
+"""
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, cast, func, literal, select, text
+from sqlalchemy.engine import Engine
+
+from app.models.book import Book
+from app.models.movie import Movie
+
+# Ratings are keyed by half-point bucket (rating * 2, rounded down), which
+# keeps the cell count small. Rating filters must therefore be multiples of
+# 0.5: ``min_rating`` is inclusive and ``max_rating`` exclusive.
+RATING_SCALE = 2
+# Absorbs float error in rating * RATING_SCALE.
+EPSILON = 1e-6
+# Stand-ins for NULL in the summary key, which cannot hold NULLs.
+NULL_TEXT = ""
+NULL_NUMBER = -1
+
+
+@dataclass(frozen=True)
+class FacetSpec:
+    """Which columns of a catalog table are counted."""
+    table: str
+    model: type
+    rating_column: str
+    year_column: Optional[str] = None
+
+    @property
+    def summary_table(self) -> str:
+        return f"{self.table}_facets"
+
+    @property
+    def source_columns(self) -> Tuple[str, ...]:
+        return ("genre", "language", self.rating_column) + ((self.year_column,) if self.year_column else ())
+
+    def key_sql(self, row: str) -> Tuple[str, str, str, str]:
+        """SQL for the cell key of ``row`` (``new``, ``old`` or the table name)."""
+        rating = f"{row}.{self.rating_column}"
+        decade = (
+            f"coalesce({row}.{self.year_column} - {row}.{self.year_column} % 10, {NULL_NUMBER})"
+            if self.year_column else str(NULL_NUMBER)
+        )
+        return (
+            f"coalesce({row}.genre, '{NULL_TEXT}')",
+            f"coalesce({row}.language, '{NULL_TEXT}')",
+            f"coalesce(CAST({rating} * {RATING_SCALE} + {EPSILON} AS INTEGER), {NULL_NUMBER})",
+            decade,
+        )
+
+    def key_columns(self):
+        """The cell key as SQLAlchemy expressions, for databases without the summary table."""
+        rating = getattr(self.model, self.rating_column)
+        year = getattr(self.model, self.year_column) if self.year_column else None
+        return (
+            func.coalesce(self.model.genre, NULL_TEXT),
+            func.coalesce(self.model.language, NULL_TEXT),
+            func.coalesce(cast(rating * RATING_SCALE + EPSILON, Integer), NULL_NUMBER),
+            func.coalesce(year - year % 10, NULL_NUMBER) if year is not None else literal(NULL_NUMBER),
+        )
+
+
+MOVIES = FacetSpec("movies", Movie, "imdb_rating")
+BOOKS = FacetSpec("books", Book, "rating", "publication_year")
+
+SPECS = (MOVIES, BOOKS)
+
+KEY_NAMES = ("genre", "language", "rating", "decade")
+
+
+def _summary_ddl(spec: FacetSpec) -> List[str]:
+    summary = spec.summary_table
+    keys = ", ".join(KEY_NAMES)
+    new_key = spec.key_sql("new")
+    old_key = spec.key_sql("old")
+    increment = (
+        f"INSERT INTO {summary} ({keys}, count) VALUES ({', '.join(new_key)}, 1) "
+        f"ON CONFLICT ({keys}) DO UPDATE SET count = count + 1;"
+    )
+    decrement = (
+        f"UPDATE {summary} SET count = count - 1 WHERE "
+        + " AND ".join(f"{name} = {value}" for name, value in zip(KEY_NAMES, old_key)) + ";"
+    )
+    key_changed = " OR ".join(f"{old} IS NOT {new}" for old, new in zip(old_key, new_key))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {summary}_ai AFTER INSERT ON {spec.table} BEGIN {increment} END",
+        f"CREATE TRIGGER IF NOT EXISTS {summary}_ad AFTER DELETE ON {spec.table} BEGIN {decrement} END",
+        f"CREATE TRIGGER IF NOT EXISTS {summary}_au AFTER UPDATE OF {', '.join(spec.source_columns)} "
+        f"ON {spec.table} WHEN {key_changed} BEGIN {decrement} {increment} END",
+    ]
+
+
+def create_facet_tables(bind: Engine):
+    """
+    Create the summary tables and the triggers that maintain them.
+
+    A summary table created for an existing catalog is filled from its
+    current rows in the same transaction.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        for spec in SPECS:
+            summary = spec.summary_table
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": summary},
+            ).first()
+            if not exists:
+                conn.exec_driver_sql(
+                    f"CREATE TABLE {summary} (genre TEXT NOT NULL, language TEXT NOT NULL, "
+                    f"rating INTEGER NOT NULL, decade INTEGER NOT NULL, count INTEGER NOT NULL, "
+                    f"PRIMARY KEY ({', '.join(KEY_NAMES)})) WITHOUT ROWID"
+                )
+                conn.exec_driver_sql(
+                    f"INSERT INTO {summary} ({', '.join(KEY_NAMES)}, count) "
+                    f"SELECT {', '.join(spec.key_sql(spec.table))}, COUNT(*) FROM {spec.table} GROUP BY 1, 2, 3, 4"
+                )
+            for statement in _summary_ddl(spec):
+                conn.exec_driver_sql(statement)
+
+
+class InvalidFacetFilter(ValueError):
+    """Raised for filters the summary tables cannot answer exactly."""
+
+
+def _rating_key(rating: float) -> int:
+    key = rating * RATING_SCALE
+    if abs(key - round(key)) > EPSILON:
+        raise InvalidFacetFilter(f"Rating filters must be multiples of {1 / RATING_SCALE}")
+    return round(key)
+
+
+@dataclass
+class FacetFilters:
+    genre: Optional[str] = None
+    language: Optional[str] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
+    decade: Optional[int] = None
+
+
+def count_facets(cells: Iterable[Sequence], filters: FacetFilters) -> Tuple[int, List[Counter]]:
+    """
+    Sum ``(genre, language, rating, decade, count)`` cells per facet value.
+
+    Each facet is counted with every filter applied except its own, so the
+    counts show what selecting another value of that facet would return.
+    A cell missing exactly one filter therefore still counts for that facet.
+    """
+    genre, language, decade = filters.genre, filters.language, filters.decade
+    rating_filtered = filters.min_rating is not None or filters.max_rating is not None
+    low = _rating_key(filters.min_rating) if filters.min_rating is not None else 0
+    high = _rating_key(filters.max_rating) if filters.max_rating is not None else math.inf
+
+    total = 0
+    counters = [Counter() for _ in KEY_NAMES]
+    genres, languages, ratings, decades = counters
+    for key in cells:
+        misses, missed = 0, -1
+        if genre is not None and key[0] != genre:
+            misses, missed = misses + 1, 0
+        if language is not None and key[1] != language:
+            misses, missed = misses + 1, 1
+        if rating_filtered and not (key[2] != NULL_NUMBER and low <= key[2] < high):
+            misses, missed = misses + 1, 2
+        if decade is not None and key[3] != decade:
+            misses, missed = misses + 1, 3
+        if misses == 0:
+            count = key[4]
+            total += count
+            genres[key[0]] += count
+            languages[key[1]] += count
+            ratings[key[2]] += count
+            decades[key[3]] += count
+        elif misses == 1:
+            counters[missed][key[missed]] += key[4]
+    return total, counters
+
+
+def _text_counts(counter: Counter) -> List[Dict]:
+    items = sorted(
+        ((value, count) for value, count in counter.items() if count > 0),
+        key=lambda item: (item[0] == NULL_TEXT, -item[1], item[0]),
+    )
+    return [{"value": value if value != NULL_TEXT else None, "count": count} for value, count in items]
+
+
+def _number_counts(counter: Counter, bucket=lambda value: value) -> List[Dict]:
+    buckets = Counter()
+    for value, count in counter.items():
+        buckets[None if value == NULL_NUMBER else bucket(value)] += count
+    items = sorted(
+        ((value, count) for value, count in buckets.items() if count > 0),
+        key=lambda item: (item[0] is None, item[0] or 0),
+    )
+    return [{"value": value, "count": count} for value, count in items]
+
+
+async def facets(db, spec: FacetSpec, filters: FacetFilters) -> Dict:
+    """Counts per genre, language, rating bucket and (books) decade under ``filters``."""
+    if db.get_bind().dialect.name == "sqlite":
+        query = text(f"SELECT {', '.join(KEY_NAMES)}, count FROM {spec.summary_table} WHERE count > 0")
+    else:
+        keys = spec.key_columns()
+        query = select(*keys, func.count()).group_by(*(keys if spec.year_column else keys[:3]))
+    cells = (await db.execute(query)).all()
+    total, (genres, languages, ratings, decades) = count_facets(cells, filters)
+    result = {
+        "total": total,
+        "genre": _text_counts(genres),
+        "language": _text_counts(languages),
+        "rating": _number_counts(ratings, lambda key: key / RATING_SCALE),
+    }
+    if spec.year_column:
+        result["decade"] = _number_counts(decades)
+    return result
@@ -0,0 +1,383 @@
+"""
+Batched, cached LLM generation of summaries and tags for catalog titles.
+
+Prompts submitted within ``max_wait`` seconds of each other are grouped
+into one backend call of up to ``max_batch_size`` prompts. Results are
+cached on disk by a hash of backend, model and prompt, so identical prompts
+are never generated twice, and identical prompts already in flight share
+one result. At most ``max_concurrency`` backend calls run at once; when
+they are all busy the bounded queue fills and ``generate`` callers wait,
+which pushes back on whoever is producing prompts. Closing the service
+fails every prompt that has not been handed to the backend yet.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import bindparam, func, select, update
+
+from app.database import AsyncSessionLocal
+from app.models.book import Book
+from app.models.movie import Movie
+from app.services import catalog_events
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND")  # "openai" or "fake"
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo-instruct")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "16"))
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", "0.05"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+
+SUMMARY_BATCH_SIZE = 100
+
+PROMPT_TEMPLATE = (
+    "Write a two-sentence summary and up to five lowercase genre or theme tags for the {kind} "
+    "\"{title}\"{extra}. Answer with JSON only, in the form "
+    "{{\"summary\": \"...\", \"tags\": [\"...\"]}}.\n"
+)
+
+
+class LLMServiceClosed(RuntimeError):
+    """Raised for prompts still waiting for a backend call when the service closes."""
+
+
+class LLMBackend(ABC):
+    """Turns a batch of prompts into completions, one per prompt, in order."""
+
+    name = "backend"
+    model = ""
+
+    @abstractmethod
+    async def generate(self, prompts: List[str]) -> List[str]:
+        ...
+
+    async def aclose(self):
+        pass
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic offline backend for tests and local development.
+
+    Completions depend only on the prompt, and every call's batch size is
+    recorded in ``batches``.
+    """
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches: List[int] = []
+
+    async def generate(self, prompts: List[str]) -> List[str]:
+        self.batches.append(len(prompts))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [self._complete(prompt) for prompt in prompts]
+
+    @staticmethod
+    def _complete(prompt: str) -> str:
+        match = re.search(r'"([^"]+)"', prompt)
+        title = match.group(1) if match else prompt[:40]
+        words = sorted({word.lower() for word in re.findall(r"[A-Za-z]{4,}", title)})
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        return json.dumps({
+            "summary": f"A story called {title}. Reference {digest[:8]}.",
+            "tags": words[:5] or [digest[:6]],
+        })
+
+
+class OpenAICompletionsBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI ``/completions`` API.
+
+    That endpoint accepts a list of prompts, so a whole batch is one HTTP
+    request.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_API_URL, api_key: Optional[str] = LLM_API_KEY,
+                 model: str = LLM_MODEL, max_tokens: int = 200, timeout: float = 60.0):
+        self.model = model
+        self.max_tokens = max_tokens
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._http = httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout)
+
+    async def generate(self, prompts: List[str]) -> List[str]:
+        response = await self._http.post("/completions", json={
+            "model": self.model,
+            "prompt": prompts,
+            "max_tokens": self.max_tokens,
+            "temperature": 0,
+        })
+        response.raise_for_status()
+        choices = sorted(response.json()["choices"], key=lambda choice: choice["index"])
+        return [choice["text"] for choice in choices]
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class PromptCache:
+    """Completions in a SQLite file keyed by a content hash of the request."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, completion TEXT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT completion FROM completions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items: List[Tuple[str, str]]):
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO completions (key, completion) VALUES (?, ?)", items)
+
+
+@dataclass
+class Generated:
+    summary: str
+    tags: List[str] = field(default_factory=list)
+
+
+class LLMService:
+    def __init__(self, backend: LLMBackend, cache: Optional[PromptCache] = None,
+                 max_batch_size: int = LLM_MAX_BATCH_SIZE, max_wait: float = LLM_MAX_WAIT,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE):
+        self.backend = backend
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._calls: set = set()
+        self._closed = False
+
+    def key(self, prompt: str) -> str:
+        payload = f"{self.backend.name}\0{self.backend.model}\0{prompt}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def generate(self, prompt: str) -> str:
+        if self._closed:
+            raise LLMServiceClosed("LLM service is closed")
+        key = self.key(prompt)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.get_running_loop().create_future()
+            self._inflight[key] = pending
+            self._start()
+            try:
+                await self._queue.put((key, prompt, pending))
+            except BaseException:
+                self._inflight.pop(key, None)
+                pending.cancel()
+                raise
+        return await asyncio.shield(pending)
+
+    async def generate_summary(self, kind: str, title: str, extra: str = "") -> Generated:
+        completion = await self.generate(PROMPT_TEMPLATE.format(kind=kind, title=title, extra=extra))
+        return parse_generated(completion)
+
+    async def aclose(self):
+        """Let running backend calls finish and fail every prompt still waiting for one."""
+        self._closed = True
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._calls:
+            await asyncio.gather(*self._calls, return_exceptions=True)
+        # Queued prompts, and those the collector was batching, are all still in flight.
+        for future in self._inflight.values():
+            if not future.done():
+                future.set_exception(LLMServiceClosed("LLM service closed before the prompt was generated"))
+        self._inflight.clear()
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait()
+        await self.backend.aclose()
+
+    def _start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue(self._max_queue)
+            self._worker = asyncio.get_running_loop().create_task(self._collect())
+
+    async def _collect(self):
+        """Group queued prompts into batches and hand each to a free backend slot."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Waiting for a slot here stops draining the queue, so producers block once it fills.
+            await self._slots.acquire()
+            call = loop.create_task(self._run(batch))
+            self._calls.add(call)
+            call.add_done_callback(self._calls.discard)
+
+    async def _run(self, batch):
+        try:
+            completions = await self.backend.generate([prompt for _, prompt, _ in batch])
+            if len(completions) != len(batch):
+                raise ValueError(f"Backend returned {len(completions)} completions for {len(batch)} prompts")
+            if self.cache:
+                self.cache.put_many([(key, completion) for (key, _, _), completion in zip(batch, completions)])
+            for (key, _, future), completion in zip(batch, completions):
+                if not future.done():
+                    future.set_result(completion)
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            for key, _, _ in batch:
+                self._inflight.pop(key, None)
+            self._slots.release()
+
+
+def parse_generated(completion: str) -> Generated:
+    """Read the JSON answer, falling back to the raw text as the summary."""
+    match = re.search(r"\{.*\}", completion, re.DOTALL)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            # Stored comma-separated, so commas inside a tag become spaces.
+            tags = [" ".join(str(tag).replace(",", " ").split()).lower() for tag in data.get("tags") or []]
+            tags = [tag for tag in tags if tag]
+            return Generated(summary=str(data.get("summary", "")).strip(), tags=tags)
+        except (ValueError, AttributeError):
+            pass
+    return Generated(summary=completion.strip())
+
+
+def create_service() -> LLMService:
+    if LLM_BACKEND == "openai":
+        backend = OpenAICompletionsBackend()
+    elif LLM_BACKEND == "fake":
+        backend = FakeLLMBackend()
+    else:
+        raise RuntimeError("Set LLM_BACKEND to 'openai' or 'fake'")
+    return LLMService(backend, cache=PromptCache(LLM_CACHE_PATH))
+
+
+@dataclass
+class SummaryResult:
+    scanned: int = 0
+    updated: int = 0
+    failed: int = 0
+
+
+def _book_extra(row) -> str:
+    return f" by {row.author}"
+
+
+CATALOGS = (
+    ("movies", Movie, "movie", (Movie.id, Movie.title), lambda row: ""),
+    ("books", Book, "book", (Book.id, Book.title, Book.author), _book_extra),
+)
+
+
+def _fill_summary(model):
+    # Summaries written while the batch was generated are kept, and so are their tags.
+    table = model.__table__
+    return (
+        update(table)
+        .where(table.c.id == bindparam("row_id"), table.c.summary.is_(None))
+        .values(summary=bindparam("generated"), tags=func.coalesce(table.c.tags, bindparam("generated_tags")))
+    )
+
+
+async def generate_missing_summaries(service: LLMService, batch_size: int = SUMMARY_BATCH_SIZE) -> SummaryResult:
+    """
+    Fill ``summary``, and ``tags`` where missing, for every movie and book without a summary.
+
+    Rows are read in id-ordered batches; a batch's prompts are submitted
+    together, with no session open, so the service can pack them into few
+    backend calls, and the results are written back with one bulk UPDATE
+    per batch in a new session.
+    """
+    result = SummaryResult()
+    for table, model, kind, columns, extra in CATALOGS:
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(*columns).where(model.id > last_id, model.summary.is_(None))
+                    .order_by(model.id).limit(batch_size)
+                )).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            result.scanned += len(rows)
+            # No session is open while the batch is generated, which can take minutes.
+            generated = await asyncio.gather(
+                *(service.generate_summary(kind, row.title, extra(row)) for row in rows),
+                return_exceptions=True,
+            )
+            changes = []
+            for row, item in zip(rows, generated):
+                if isinstance(item, Exception) or not item.summary:
+                    logger.warning("No summary generated for %s %s: %s", kind, row.id, item)
+                    result.failed += 1
+                else:
+                    changes.append({
+                        "row_id": row.id, "generated": item.summary, "generated_tags": ",".join(item.tags) or None,
+                    })
+            if changes:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(_fill_summary(model), changes)
+                    await db.commit()
+                result.updated += len(changes)
+                catalog_events.rows_changed(table)
+    return result
+
+
+if __name__ == "__main__":
+    async def main():
+        service = create_service()
+        try:
+            print(await generate_missing_summaries(service))
+        finally:
+            await service.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+"""
+Request and SQL instrumentation, exported in the Prometheus text format.
+
+``MetricsMiddleware`` times every request and labels it with its route
+template and the configured query parameters (``sort_by``, ``genre``...).
+Engine events count the statements each request issues, the time spent in
+the driver and the rows writes affected; handlers report the rows they read
+through ``record_rows``. All of it lands in per-process histograms that
+``render()`` serialises for ``/metrics``. With several workers, each
+process exports its own series.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged to ``app.sql.slow``
+together with their query plan.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))  # negative disables the log
+# Distinct statements whose plan is remembered, so a repeatedly slow query is explained once.
+SLOW_QUERY_PLAN_CACHE = 256
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+# Label used for requests that matched no route, so scanners cannot inflate cardinality.
+UNMATCHED = "unmatched"
+OTHER = "other"
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    rows: int = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def record_rows(count: int):
+    """Count rows a handler read for the current request."""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.rows += count
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed label set."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{prefix}le="{_format(bound)}"}} {cumulative}'
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}'
+            suffix = f"{{{label_text}}}" if label_text else ""
+            yield f"{self.name}_sum{suffix} {_format(total)}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUEST_LABELS = ("method", "route", "status", "sort_by", "genre")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    REQUEST_LABELS, LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", REQUEST_LABELS, COUNT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per request.", REQUEST_LABELS, LATENCY_BUCKETS,
+)
+request_rows = Histogram(
+    "http_request_db_rows", "Rows read or written per request.", REQUEST_LABELS, ROW_BUCKETS,
+)
+query_duration = Histogram(
+    "db_query_duration_seconds", "Execution time of individual SQL statements.", ("statement",), LATENCY_BUCKETS,
+)
+
+HISTOGRAMS = (request_duration, request_queries, request_db_duration, request_rows, query_duration)
+
+
+def render() -> str:
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+class MetricsMiddleware:
+    """
+    Time each request and record its SQL statistics.
+
+    ``labels`` maps query parameter names to the values allowed as label
+    values; anything else is reported as ``other``. Timing stops when the
+    last body chunk is sent, so streamed responses are measured in full.
+    """
+
+    def __init__(self, app, labels: Optional[Dict[str, Iterable[str]]] = None):
+        self.app = app
+        self.labels: Dict[str, FrozenSet[str]] = {
+            name: frozenset(values) for name, values in (labels or {}).items()
+        }
+        self._routes: Optional[Dict] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            recorded = True
+            labels = (scope["method"], self._route(scope), f"{status // 100}xx", *self._params(scope))
+            request_duration.observe(time.perf_counter() - started, *labels)
+            request_queries.observe(stats.queries, *labels)
+            request_db_duration.observe(stats.db_seconds, *labels)
+            request_rows.observe(stats.rows, *labels)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not recorded:
+                record()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not recorded:
+                record()
+            _request_stats.reset(token)
+
+    def _route(self, scope) -> str:
+        if self._routes is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._routes = {
+                "endpoints": {route.endpoint: route.path for route in routes if hasattr(route, "endpoint")},
+                "paths": {route.path for route in routes if hasattr(route, "path") and "{" not in route.path},
+            }
+        endpoint = scope.get("endpoint")
+        if endpoint is not None and endpoint in self._routes["endpoints"]:
+            return self._routes["endpoints"][endpoint]
+        # Responses served by middleware (such as cache hits) never reach the router.
+        return scope["path"] if scope["path"] in self._routes["paths"] else UNMATCHED
+
+    def _params(self, scope) -> Tuple[str, ...]:
+        if not self.labels:
+            return ()
+        values = dict.fromkeys(self.labels, "")
+        if scope["query_string"]:
+            for name, value in parse_qsl(scope["query_string"].decode("latin-1")):
+                allowed = self.labels.get(name)
+                if allowed is not None:
+                    values[name] = value if value in allowed else OTHER
+        return tuple(values.values())
+
+
+class _PlanCache:
+    def __init__(self, size: int):
+        self.size = size
+        self._plans: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, statement: str) -> Optional[str]:
+        with self._lock:
+            plan = self._plans.get(statement)
+            if plan is not None:
+                self._plans.move_to_end(statement)
+            return plan
+
+    def put(self, statement: str, plan: str):
+        with self._lock:
+            self._plans[statement] = plan
+            while len(self._plans) > self.size:
+                self._plans.popitem(last=False)
+
+
+_plans = _PlanCache(SLOW_QUERY_PLAN_CACHE)
+
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else OTHER
+    return kind if kind in ("select", "insert", "update", "delete", "with") else OTHER
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail): indent each step under its parent.
+        depth = {0: 0}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[node] - 1) + detail)
+        return "\n".join(lines)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def log_slow_query(conn, statement: str, parameters, elapsed: float, executemany: bool):
+    plan = None
+    if not executemany and _statement_kind(statement) in ("select", "with"):
+        plan = _plans.get(statement)
+        if plan is None:
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as exc:  # the plan is diagnostic only
+                plan = f"(EXPLAIN failed: {exc})"
+            _plans.put(statement, plan)
+    if executemany:
+        parameters = f"{len(parameters)} parameter sets, first {parameters[0]!r}" if parameters else parameters
+    slow_query_logger.warning(
+        "Slow query (%.1f ms): %s\nParameters: %.1000s%s",
+        elapsed * 1000, statement, parameters if isinstance(parameters, str) else repr(parameters),
+        f"\nPlan:\n{plan}" if plan else "",
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    query_duration.observe(elapsed, _statement_kind(statement))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if cursor.description is None and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+    if SLOW_QUERY_MS >= 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        log_slow_query(conn, statement, parameters, elapsed, executemany)
+
+
+def instrument_engine(engine):
+    """Attach the statement timers to a sync ``Engine`` (use ``sync_engine`` for async engines)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,462 @@
+"""
+Content-based "more like this" recommendations.
+
+Every movie and book is embedded as a fixed-size float32 vector built from
+signed feature hashing of TF-IDF weighted title/summary words, a one-hot
+genre block, a hashed language block and the normalized rating. Vectors are
+L2-normalized, so cosine similarity is a single matrix-vector product over
+the whole catalog followed by ``argpartition`` for the top k.
+
+The index persists as ``.npy`` files that workers memory-map on startup, so
+the pages are shared between processes instead of being recomputed. Each
+snapshot is written to its own directory and published by atomically
+replacing a ``CURRENT`` pointer file, so concurrent writers never share a
+file and readers never mix arrays from two snapshots. Rows inserted after
+the snapshot are folded into an in-memory delta.
+"""
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.book import Book
+from app.models.movie import Movie
+from app.schemas.book import BookGenre
+from app.schemas.movie import Genre
+from app.services import catalog_events
+
+RECOMMENDATION_INDEX_DIR = os.getenv("RECOMMENDATION_INDEX_DIR", "./recommendation_index")
+TEXT_DIMENSIONS = int(os.getenv("RECOMMENDATION_TEXT_DIMENSIONS", "64"))
+# Seconds between checks for rows inserted by other workers.
+CATCH_UP_INTERVAL = float(os.getenv("RECOMMENDATION_CATCH_UP_SECONDS", "30"))
+# Seconds to wait after an update before rebuilding, so a burst of updates
+# costs one rebuild.
+REBUILD_DELAY = float(os.getenv("RECOMMENDATION_REBUILD_DELAY_SECONDS", "5"))
+# Superseded snapshots are deleted once they are this old; a worker that read
+# the pointer just before it moved can still open the one it named.
+STALE_SNAPSHOT_SECONDS = 60
+CURRENT_SNAPSHOT = "CURRENT"
+
+DF_BUCKETS = 1 << 20
+LANGUAGE_BUCKETS = 8
+SCORE_CHUNK_ROWS = 1 << 18
+BUILD_CHUNK_ROWS = 5000
+
+# Relative weight of each feature block in the final unit vector.
+TEXT_WEIGHT = 1.0
+GENRE_WEIGHT = 0.6
+LANGUAGE_WEIGHT = 0.3
+RATING_WEIGHT = 0.3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass(frozen=True)
+class CatalogSpec:
+    """Which columns of a catalog table feed its vectors."""
+    table: str
+    model: type
+    text_columns: Tuple[str, ...]
+    genres: Tuple[str, ...]
+    rating_column: str
+    rating_scale: float
+    text_dimensions: int = TEXT_DIMENSIONS
+
+    @property
+    def dimensions(self) -> int:
+        return self.text_dimensions + len(self.genres) + LANGUAGE_BUCKETS + 1
+
+    def signature(self) -> Dict:
+        signature = asdict(self)
+        signature["model"] = self.model.__tablename__
+        signature["df_buckets"] = DF_BUCKETS
+        signature["weights"] = [TEXT_WEIGHT, GENRE_WEIGHT, LANGUAGE_WEIGHT, RATING_WEIGHT]
+        return signature
+
+    def columns(self):
+        names = ("id",) + self.text_columns + ("genre", "language", self.rating_column)
+        return [getattr(self.model, name) for name in names]
+
+
+MOVIES = CatalogSpec(
+    table="movies",
+    model=Movie,
+    text_columns=("title", "summary"),
+    genres=tuple(genre.value for genre in Genre),
+    rating_column="imdb_rating",
+    rating_scale=10.0,
+)
+
+BOOKS = CatalogSpec(
+    table="books",
+    model=Book,
+    text_columns=("title", "author", "summary"),
+    genres=tuple(genre.value for genre in BookGenre),
+    rating_column="rating",
+    rating_scale=5.0,
+)
+
+
+def _hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _term_hashes(spec: CatalogSpec, row: Mapping) -> Counter:
+    """Hashed term frequencies; the first text column (the title) counts double."""
+    counts: Counter = Counter()
+    for position, name in enumerate(spec.text_columns):
+        words = _WORD_RE.findall((row.get(name) or "").lower())
+        weight = 2 if position == 0 else 1
+        for word in words:
+            counts[_hash(word)] += weight
+        if position == 0:
+            for first, second in zip(words, words[1:]):
+                counts[_hash(f"{first} {second}")] += weight
+    return counts
+
+
+class VectorIndex:
+    """
+    Unit vectors for one catalog with incremental inserts.
+
+    ``vectors``/``ids`` hold the persisted snapshot (usually memory-mapped and
+    sorted by id); rows added later live in a growable in-memory delta.
+    """
+
+    def __init__(self, spec: CatalogSpec, ids: np.ndarray, vectors: np.ndarray, df: np.ndarray, doc_count: int):
+        self.spec = spec
+        self.ids = ids
+        self.vectors = vectors
+        self.df = df
+        self.doc_count = doc_count
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_vectors = np.empty((0, spec.dimensions), dtype=np.float32)
+        self._delta_size = 0
+        self._delta_positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids) + self._delta_size
+
+    @property
+    def max_id(self) -> int:
+        snapshot_max = int(self.ids[-1]) if len(self.ids) else 0
+        delta_max = int(self._delta_ids[:self._delta_size].max()) if self._delta_size else 0
+        return max(snapshot_max, delta_max)
+
+    def embed(self, row: Mapping) -> np.ndarray:
+        spec = self.spec
+        vector = np.zeros(spec.dimensions, dtype=np.float32)
+
+        text = vector[:spec.text_dimensions]
+        for term, count in _term_hashes(spec, row).items():
+            idf = math.log((1 + self.doc_count) / (1 + self.df[term % DF_BUCKETS])) + 1.0
+            sign = 1.0 if term & 0x80000000 else -1.0
+            text[term % spec.text_dimensions] += sign * (1.0 + math.log(count)) * idf
+        norm = np.linalg.norm(text)
+        if norm:
+            text *= TEXT_WEIGHT / norm
+
+        offset = spec.text_dimensions
+        genre = row.get("genre")
+        if genre in spec.genres:
+            vector[offset + spec.genres.index(genre)] = GENRE_WEIGHT
+        offset += len(spec.genres)
+        language = (row.get("language") or "").strip().lower()
+        if language:
+            vector[offset + _hash(language) % LANGUAGE_BUCKETS] = LANGUAGE_WEIGHT
+        offset += LANGUAGE_BUCKETS
+        rating = row.get(spec.rating_column)
+        if rating is not None:
+            vector[offset] = RATING_WEIGHT * min(max(rating / spec.rating_scale, 0.0), 1.0)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def contains(self, item_id: int) -> bool:
+        return self._position(item_id) is not None
+
+    def add(self, rows: Iterable[Mapping]):
+        """Fold new rows into the delta, updating document frequencies first."""
+        rows = [row for row in rows if not self.contains(row["id"])]
+        if not rows:
+            return
+        for row in rows:
+            buckets = np.fromiter({term % DF_BUCKETS for term in _term_hashes(self.spec, row)}, dtype=np.int64)
+            self.df[buckets] += 1
+        self.doc_count += len(rows)
+
+        needed = self._delta_size + len(rows)
+        if needed > len(self._delta_ids):
+            capacity = max(needed, 2 * len(self._delta_ids), 64)
+            ids = np.empty(capacity, dtype=np.int64)
+            vectors = np.empty((capacity, self.spec.dimensions), dtype=np.float32)
+            ids[:self._delta_size] = self._delta_ids[:self._delta_size]
+            vectors[:self._delta_size] = self._delta_vectors[:self._delta_size]
+            self._delta_ids, self._delta_vectors = ids, vectors
+        for row in rows:
+            self._delta_ids[self._delta_size] = row["id"]
+            self._delta_vectors[self._delta_size] = self.embed(row)
+            self._delta_positions[row["id"]] = self._delta_size
+            self._delta_size += 1
+
+    def _position(self, item_id: int) -> Optional[Tuple[bool, int]]:
+        position = int(np.searchsorted(self.ids, item_id))
+        if position < len(self.ids) and self.ids[position] == item_id:
+            return True, position
+        if item_id in self._delta_positions:
+            return False, self._delta_positions[item_id]
+        return None
+
+    def vector(self, item_id: int) -> Optional[np.ndarray]:
+        position = self._position(item_id)
+        if position is None:
+            return None
+        in_snapshot, index = position
+        return np.asarray(self.vectors[index] if in_snapshot else self._delta_vectors[index])
+
+    def similar(self, item_id: int, limit: int) -> Optional[List[int]]:
+        """Ids of the ``limit`` items most similar to ``item_id``, best first."""
+        query = self.vector(item_id)
+        if query is None:
+            return None
+        snapshot_size = len(self.ids)
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, snapshot_size, SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, snapshot_size)
+            np.dot(self.vectors[start:end], query, out=scores[start:end])
+        if self._delta_size:
+            np.dot(self._delta_vectors[:self._delta_size], query, out=scores[snapshot_size:])
+
+        in_snapshot, index = self._position(item_id)
+        scores[index if in_snapshot else snapshot_size + index] = -np.inf
+        limit = min(limit, len(scores) - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(scores, len(scores) - limit)[-limit:]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        all_ids = self.ids if not self._delta_size else np.concatenate(
+            (self.ids, self._delta_ids[:self._delta_size])
+        )
+        return [int(all_ids[position]) for position in top]
+
+    def save(self, directory: str):
+        """
+        Write snapshot plus delta as one sorted snapshot in a new directory,
+        then point ``CURRENT`` at it.
+        """
+        os.makedirs(directory, exist_ok=True)
+        snapshot = tempfile.mkdtemp(prefix="snapshot-", dir=directory)
+        ids = np.concatenate((np.asarray(self.ids), self._delta_ids[:self._delta_size]))
+        vectors = np.concatenate((np.asarray(self.vectors), self._delta_vectors[:self._delta_size]))
+        order = np.argsort(ids, kind="stable")
+        np.save(os.path.join(snapshot, "ids.npy"), ids[order])
+        np.save(os.path.join(snapshot, "vectors.npy"), vectors[order])
+        np.save(os.path.join(snapshot, "df.npy"), self.df)
+        with open(os.path.join(snapshot, "meta.json"), "w") as handle:
+            json.dump({"signature": self.spec.signature(), "doc_count": self.doc_count}, handle)
+
+        descriptor, pointer = tempfile.mkstemp(prefix=f"{CURRENT_SNAPSHOT}.", suffix=".tmp", dir=directory)
+        with os.fdopen(descriptor, "w") as handle:
+            handle.write(os.path.basename(snapshot))
+        os.replace(pointer, os.path.join(directory, CURRENT_SNAPSHOT))
+        _prune_snapshots(directory, keep=os.path.basename(snapshot))
+
+    @classmethod
+    def load(cls, spec: CatalogSpec, directory: str) -> Optional["VectorIndex"]:
+        try:
+            with open(os.path.join(directory, CURRENT_SNAPSHOT)) as handle:
+                snapshot = os.path.join(directory, handle.read().strip())
+            with open(os.path.join(snapshot, "meta.json")) as handle:
+                meta = json.load(handle)
+            if meta["signature"] != json.loads(json.dumps(spec.signature())):
+                return None
+            ids = np.load(os.path.join(snapshot, "ids.npy"), mmap_mode="r")
+            vectors = np.load(os.path.join(snapshot, "vectors.npy"), mmap_mode="r")
+            df = np.load(os.path.join(snapshot, "df.npy"))
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(ids) != len(vectors) or vectors.shape[1] != spec.dimensions:
+            return None
+        return cls(spec, ids, vectors, df, meta["doc_count"])
+
+    @classmethod
+    def build(cls, spec: CatalogSpec, db: Session) -> "VectorIndex":
+        """
+        Build from the database in two streaming passes: document frequencies
+        first, then vectors, so memory stays at one chunk of rows plus the arrays.
+        """
+        max_id = db.execute(select(func.max(spec.model.id))).scalar() or 0
+        query = select(*spec.columns()).where(spec.model.id <= max_id).order_by(spec.model.id)
+
+        df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        doc_count = 0
+        for row in db.execute(query.execution_options(yield_per=BUILD_CHUNK_ROWS)).mappings():
+            buckets = np.fromiter({term % DF_BUCKETS for term in _term_hashes(spec, row)}, dtype=np.int64)
+            df[buckets] += 1
+            doc_count += 1
+
+        index = cls(spec, np.empty(doc_count, dtype=np.int64),
+                    np.empty((doc_count, spec.dimensions), dtype=np.float32), df, doc_count)
+        position = 0
+        for row in db.execute(query.execution_options(yield_per=BUILD_CHUNK_ROWS)).mappings():
+            if position == doc_count:
+                break
+            index.ids[position] = row["id"]
+            index.vectors[position] = index.embed(row)
+            position += 1
+        index.ids, index.vectors = index.ids[:position], index.vectors[:position]
+        return index
+
+
+def _prune_snapshots(directory: str, keep: str):
+    """Delete superseded snapshots; mapped files stay readable until unmapped."""
+    try:
+        with open(os.path.join(directory, CURRENT_SNAPSHOT)) as handle:
+            current = handle.read().strip()
+    except OSError:
+        return
+    cutoff = time.time() - STALE_SNAPSHOT_SECONDS
+    for entry in os.scandir(directory):
+        if entry.name.startswith("snapshot-") and entry.name not in (current, keep):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+class Recommender:
+    """
+    Lazily loaded index for one catalog, kept current from catalog events.
+
+    Inserts published by this worker are queued and folded in on the next
+    query; rows from other workers are picked up by a periodic catch-up
+    query. Updates to existing rows schedule a rebuild ``REBUILD_DELAY``
+    seconds after the next query; it runs in a background thread without the
+    query lock, and the old index keeps answering until the new one is swapped in.
+    """
+
+    def __init__(self, spec: CatalogSpec, directory: str = RECOMMENDATION_INDEX_DIR):
+        self.spec = spec
+        self.directory = os.path.join(directory, spec.table)
+        self.index: Optional[VectorIndex] = None
+        self._lock = threading.Lock()
+        self._pending: List[Mapping] = []
+        self._pending_lock = threading.Lock()
+        # Updates seen, and how many of them the current index reflects.
+        self._changes = 0
+        self._indexed_changes = 0
+        self._rebuild: Optional[threading.Timer] = None
+        self._caught_up_at = 0.0
+
+    def rows_added(self, rows: Sequence[Mapping]):
+        with self._pending_lock:
+            self._pending.extend(rows)
+
+    def rows_changed(self):
+        with self._pending_lock:
+            self._changes += 1
+
+    def get(self) -> VectorIndex:
+        """Return the current index, loading or catching up as needed. Blocking."""
+        with self._lock:
+            return self._current()
+
+    def similar(self, item_id: int, limit: int) -> Optional[List[int]]:
+        """
+        ``VectorIndex.similar`` on the current index. Blocking, and serialized
+        with inserts so the delta cannot grow while it is being scored.
+        """
+        with self._lock:
+            return self._current().similar(item_id, limit)
+
+    def rebuild(self) -> VectorIndex:
+        """Build and save a fresh index without holding the query lock, then swap it in."""
+        changes = self._changes
+        index = self._build()
+        with self._lock:
+            self.index = index
+            self._indexed_changes = max(self._indexed_changes, changes)
+            self._catch_up()
+            return index
+
+    def _current(self) -> VectorIndex:
+        if self.index is None:
+            # Updated rows need new vectors, so after an update the index is
+            # rebuilt rather than loaded from the snapshot on disk.
+            changes = self._changes
+            self.index = self._build() if changes else self._load_or_build()
+            self._indexed_changes = changes
+            self._caught_up_at = time.monotonic()
+        elif self._changes != self._indexed_changes and self._rebuild is None:
+            self._rebuild = threading.Timer(REBUILD_DELAY, self._rebuild_in_background)
+            self._rebuild.daemon = True
+            self._rebuild.start()
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        self.index.add(pending)
+        if time.monotonic() - self._caught_up_at > CATCH_UP_INTERVAL:
+            self._catch_up()
+        return self.index
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            # Updates that arrived during the build schedule the next one.
+            with self._lock:
+                self._rebuild = None
+
+    def _load_or_build(self) -> VectorIndex:
+        index = VectorIndex.load(self.spec, self.directory)
+        if index is None:
+            return self._build()
+        self.index = index
+        self._catch_up()
+        return index
+
+    def _build(self) -> VectorIndex:
+        db = SessionLocal()
+        try:
+            index = VectorIndex.build(self.spec, db)
+        finally:
+            db.close()
+        index.save(self.directory)
+        return index
+
+    def _catch_up(self):
+        db = SessionLocal()
+        try:
+            query = select(*self.spec.columns()).where(self.spec.model.id > self.index.max_id).order_by(self.spec.model.id)
+            self.index.add(dict(row) for row in db.execute(query).mappings())
+        finally:
+            db.close()
+        self._caught_up_at = time.monotonic()
+
+
+movie_recommender = Recommender(MOVIES)
+book_recommender = Recommender(BOOKS)
+
+for _recommender in (movie_recommender, book_recommender):
+    catalog_events.on_rows_added(_recommender.spec.table, _recommender.rows_added)
+    catalog_events.on_rows_changed(_recommender.spec.table, _recommender.rows_changed)
+
+
+if __name__ == "__main__":
+    for recommender in (movie_recommender, book_recommender):
+        started = time.perf_counter()
+        index = recommender.rebuild()
+        print(f"Indexed {len(index)} {recommender.spec.table} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,140 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, column, false, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+# FTS5 table and indexed columns for each searchable catalog table. Column
+# weights feed bm25() so title matches outrank matches deep in a summary.
+SEARCH_INDEXES: Dict[str, Tuple[str, Tuple[Tuple[str, float], ...]]] = {
+    "movies": ("movies_fts", (("title", 10.0), ("summary", 1.0))),
+    "books": ("books_fts", (("title", 10.0), ("author", 5.0), ("summary", 1.0))),
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _index_ddl(source: str) -> List[str]:
+    fts, columns = SEARCH_INDEXES[source]
+    names = [name for name, _ in columns]
+    cols = ", ".join(names)
+    new_values = ", ".join(f"new.{name}" for name in names)
+    old_values = ", ".join(f"old.{name}" for name in names)
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_search_indexes(bind: Engine):
+    """
+    Create the FTS5 indexes and the triggers that keep them in sync.
+
+    Indexes created for an existing table are rebuilt from its current rows.
+    Other databases have no FTS5 and fall back to LIKE matching in ``search``.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        for source, (fts, columns) in SEARCH_INDEXES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts},
+            ).first()
+            if not exists:
+                cols = ", ".join(name for name, _ in columns)
+                weights = ", ".join(str(weight) for _, weight in columns)
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{source}', "
+                    f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25({weights})')")
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            for statement in _index_ddl(source):
+                conn.exec_driver_sql(statement)
+
+
+def match_expression(q: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query that requires every word as a prefix.
+
+    Words are quoted so FTS5 operators typed by users are matched literally.
+    """
+    tokens = _TOKEN_RE.findall(q.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class ColumnMatch(ColumnElement):
+    """
+    Rows whose ``name`` column contains every word of ``q`` as a word prefix.
+
+    On SQLite the words are looked up in the FTS5 index, restricted to that
+    column, so the filter is an index search rather than a table scan.
+    Other databases fall back to LIKE matching of each word.
+    """
+    inherit_cache = True
+    _traverse_internals = [
+        ("fts_match", InternalTraversal.dp_clauseelement),
+        ("like_match", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, model, name: str, q: str):
+        fts, _ = SEARCH_INDEXES[model.__tablename__]
+        tokens = _TOKEN_RE.findall(q.lower())
+        if not tokens:
+            self.fts_match = self.like_match = false()
+            return
+        index = table(fts, column("rowid"))
+        words = " ".join(f'"{token}"*' for token in tokens)
+        self.fts_match = model.id.in_(
+            select(index.c.rowid).where(literal_column(fts).op("MATCH")(f"{name} : ({words})"))
+        )
+        self.like_match = and_(*[getattr(model, name).ilike(f"%{token}%") for token in tokens])
+
+
+@compiles(ColumnMatch)
+def _compile_column_match(element, compiler, **kw):
+    return compiler.process(element.like_match, **kw)
+
+
+@compiles(ColumnMatch, "sqlite")
+def _compile_column_match_fts(element, compiler, **kw):
+    return compiler.process(element.fts_match, **kw)
+
+
+def search(db, query, model, q: str):
+    """
+    Restrict the select ``query`` over ``model`` to rows matching ``q``.
+
+    Returns ``(query, rank)`` where ``rank`` orders the best matches first,
+    or ``None`` when the backend has no relevance ranking.
+    """
+    fts, columns = SEARCH_INDEXES[model.__tablename__]
+    if db.get_bind().dialect.name != "sqlite":
+        tokens = _TOKEN_RE.findall(q)
+        if not tokens:
+            return query.filter(false()), None
+        conditions = [
+            or_(*[getattr(model, name).ilike(f"%{token}%") for name, _ in columns])
+            for token in tokens
+        ]
+        return query.filter(and_(*conditions)), None
+
+    expression = match_expression(q)
+    index = table(fts, column("rowid"), column("rank"))
+    query = query.join(index, index.c.rowid == model.id)
+    if expression is None:
+        return query.filter(false()), None
+    query = query.filter(literal_column(fts).op("MATCH")(expression))
+    return query, index.c.rank
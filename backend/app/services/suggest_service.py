@@ -0,0 +1,612 @@
+"""
+Typo-tolerant autocomplete over movie titles, book titles and authors.
+
+Every title and author is stored under a normalized key (lowercase, accents
+and punctuation removed, truncated to ``KEY_BYTES``) in a sorted numpy
+array, so the entries starting with a prefix are one ``searchsorted`` range.
+Titles are also keyed without a leading article and authors by surname, so
+"lord of" finds "The Lord of the Rings" and "tolkien" finds "J.R.R. Tolkien".
+The best-rated entries of a range are picked with ``argpartition``; for the
+large ranges of short prefixes the result is memoized.
+
+When a prefix finds too little, each query word missing from the title
+vocabulary is replaced by its closest vocabulary word: candidates come from
+a trigram index over the vocabulary and are checked by edit distance, and
+the corrected query is looked up like any other.
+
+The index is built in a background thread on startup. Rows added through
+this worker go to a small sorted delta that is merged into the arrays once
+it fills up; rows added by other workers are picked up periodically, and
+updates or deletes trigger a rebuild while the old index keeps serving.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.book import Book
+from app.models.movie import Movie
+from app.services import catalog_events
+
+logger = logging.getLogger(__name__)
+
+# Longer keys are truncated; queries are matched on the same number of bytes.
+KEY_BYTES = 24
+MAX_SUGGESTIONS = 20
+# Rows held in the delta before it is merged into the sorted arrays.
+DELTA_MAX = int(os.getenv("SUGGEST_DELTA_MAX", "2048"))
+# Prefix ranges longer than this have their best entries memoized.
+SCAN_LIMIT = 4096
+MEMO_SIZE = 4096
+# Seconds between checks for rows inserted by other workers, and the minimum
+# time between rebuilds after updates (see ``Suggester.current``).
+CATCH_UP_INTERVAL = float(os.getenv("SUGGEST_CATCH_UP_SECONDS", "30"))
+BUILD_CHUNK_ROWS = 5000
+# Vocabulary words compared by edit distance for each misspelled query word.
+CORRECTION_CANDIDATES = 8
+
+MOVIE, BOOK, AUTHOR = 0, 1, 2
+KINDS = ("movie", "book", "author")
+# Movies are rated out of 10 and books out of 5; entries are ranked by the
+# rating as a share of its scale so the two catalogs compare fairly.
+RATING_SCALES = (10.0, 5.0, 5.0)
+ARTICLES = ("the", "a", "an")
+MISSING_SCORE = -1.0
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Lowercase words without accents or punctuation, separated by single spaces."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return " ".join(_WORD_RE.findall("".join(char for char in text if not unicodedata.combining(char))))
+
+
+def _key(normalized: str) -> bytes:
+    return normalized.encode("utf-8")[:KEY_BYTES]
+
+
+def title_keys(normalized: str) -> List[bytes]:
+    keys = [_key(normalized)]
+    first, _, rest = normalized.partition(" ")
+    if first in ARTICLES and rest:
+        keys.append(_key(rest))
+    return keys
+
+
+def author_keys(normalized: str) -> List[bytes]:
+    keys = [_key(normalized)]
+    names = normalized.split(" ")
+    if len(names) > 1:
+        keys.append(_key(" ".join(names[-1:] + names[:-1])))
+    return keys
+
+
+def _prefix_end(prefix: bytes) -> bytes:
+    # UTF-8 never contains 0xff, so this sorts after every key starting with prefix.
+    return prefix + b"\xff"
+
+
+def _trigrams(word: str, partial: bool) -> List[str]:
+    padded = f"  {word}" if partial else f"  {word} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _max_edits(word: str) -> int:
+    return 1 if len(word) <= 5 else 2
+
+
+class TextStore:
+    """Append-only display strings, packed into one buffer."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def add(self, text: str) -> int:
+        self._data += text.encode("utf-8")
+        self._offsets.append(len(self._data))
+        return len(self._offsets) - 2
+
+    def get(self, ref: int) -> str:
+        return self._data[self._offsets[ref]:self._offsets[ref + 1]].decode("utf-8")
+
+
+class Vocabulary:
+    """
+    Words of every title and author, with a trigram index for spelling correction.
+
+    Postings grow in place as words are added, so lookups read copies made
+    under ``_lock`` rather than views of the growing arrays.
+    """
+
+    def __init__(self):
+        self.sorted_words: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self._words: List[str] = []
+        self._postings: Dict[str, array] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        # While building, new words are appended and sorted once at the end.
+        self._deferred = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, words: Iterable[str]):
+        for word in words:
+            count = self.counts.get(word)
+            if count is not None:
+                self.counts[word] = count + 1
+                continue
+            self.counts[word] = 1
+            word_id = len(self._words)
+            self._words.append(word)
+            if self._deferred:
+                self.sorted_words.append(word)
+            else:
+                bisect.insort(self.sorted_words, word)
+            with self._lock:
+                for gram in _trigrams(word, partial=False):
+                    postings = self._postings.get(gram)
+                    if postings is None:
+                        postings = self._postings[gram] = array("i")
+                    postings.append(word_id)
+                    self._arrays.pop(gram, None)
+
+    def defer_sorting(self):
+        self._deferred = True
+
+    def finish(self):
+        self._deferred = False
+        self.sorted_words.sort()
+
+    def has_prefix(self, prefix: str) -> bool:
+        position = bisect.bisect_left(self.sorted_words, prefix)
+        return position < len(self.sorted_words) and self.sorted_words[position].startswith(prefix)
+
+    def correct(self, word: str, partial: bool) -> Optional[str]:
+        """
+        The most frequent vocabulary word within the edit limit of ``word``.
+
+        A ``partial`` word (the one still being typed) is compared with the
+        start of each candidate instead, and that start is returned.
+        """
+        grams = [self._array(gram) for gram in _trigrams(word, partial)]
+        grams = [postings for postings in grams if postings is not None]
+        if not grams:
+            return None
+        ids, counts = np.unique(np.concatenate(grams), return_counts=True)
+        if len(ids) > CORRECTION_CANDIDATES:
+            ids = ids[np.argpartition(-counts, CORRECTION_CANDIDATES - 1)[:CORRECTION_CANDIDATES]]
+        limit = _max_edits(word)
+        best, best_rank = None, None
+        for word_id in ids.tolist():
+            candidate = self._words[word_id]
+            # A partial word may end anywhere in the candidate, give or take the typos.
+            targets = (
+                {candidate[:length] for length in range(max(1, len(word) - limit), len(word) + limit + 1)}
+                if partial else (candidate,)
+            )
+            for target in targets:
+                distance = edit_distance(word, target, limit)
+                rank = (distance, -self.counts[candidate], target)
+                if distance <= limit and (best_rank is None or rank < best_rank):
+                    best, best_rank = target, rank
+        return best
+
+    def _array(self, gram: str) -> Optional[np.ndarray]:
+        cached = self._arrays.get(gram)
+        if cached is None:
+            with self._lock:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    return None
+                cached = self._arrays[gram] = np.array(postings, dtype=np.int32)
+        return cached
+
+
+@dataclass
+class Entries:
+    """Sorted parallel arrays: one row per key, several keys per title or author."""
+    keys: np.ndarray
+    scores: np.ndarray
+    kinds: np.ndarray
+    ids: np.ndarray
+    refs: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "Entries":
+        return cls.from_rows([])
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple[bytes, float, int, int, int]]) -> "Entries":
+        """Build from unsorted ``(key, score, kind, id, ref)`` rows."""
+        keys = np.array([row[0] for row in rows], dtype=f"S{KEY_BYTES}")
+        order = np.argsort(keys, kind="stable")
+        return cls(
+            keys=keys[order],
+            scores=np.array([row[1] for row in rows], dtype=np.float32)[order],
+            kinds=np.array([row[2] for row in rows], dtype=np.int8)[order],
+            ids=np.array([row[3] for row in rows], dtype=np.int32)[order],
+            refs=np.array([row[4] for row in rows], dtype=np.int32)[order],
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def merge(self, rows: Sequence[Tuple[bytes, float, int, int, int]]) -> "Entries":
+        """A copy with sorted ``(key, -score, kind, id, ref)`` delta rows inserted in place."""
+        keys = np.array([row[0] for row in rows], dtype=f"S{KEY_BYTES}")
+        positions = np.searchsorted(self.keys, keys, side="right")
+        return Entries(
+            keys=np.insert(self.keys, positions, keys),
+            scores=np.insert(self.scores, positions, [-row[1] for row in rows]),
+            kinds=np.insert(self.kinds, positions, [row[2] for row in rows]),
+            ids=np.insert(self.ids, positions, [row[3] for row in rows]),
+            refs=np.insert(self.refs, positions, [row[4] for row in rows]),
+        )
+
+    def with_scores(self, kind: int, scores: Mapping[int, float]) -> "Entries":
+        """A copy with the score of each ``kind`` entry whose id is in ``scores`` replaced."""
+        positions = np.flatnonzero((self.kinds == kind) & np.isin(self.ids, list(scores)))
+        updated = self.scores.copy()
+        updated[positions] = [scores[item_id] for item_id in self.ids[positions].tolist()]
+        return Entries(self.keys, updated, self.kinds, self.ids, self.refs)
+
+    def range(self, prefix: bytes) -> Tuple[int, int]:
+        low = int(np.searchsorted(self.keys, prefix, side="left"))
+        if len(prefix) >= KEY_BYTES:
+            return low, int(np.searchsorted(self.keys, prefix, side="right"))
+        return low, int(np.searchsorted(self.keys, _prefix_end(prefix), side="left"))
+
+    def best(self, low: int, high: int, count: int) -> np.ndarray:
+        """Positions of the ``count`` best-scored entries in ``[low, high)``, best first."""
+        scores = self.scores[low:high]
+        if len(scores) > count:
+            top = np.argpartition(-scores, count - 1)[:count]
+        else:
+            top = np.arange(len(scores))
+        return low + top[np.argsort(-scores[top], kind="stable")]
+
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in (self.keys, self.scores, self.kinds, self.ids, self.refs))
+
+
+@dataclass
+class Snapshot:
+    """Sorted entries plus the delta of rows added since; replaced as a whole on merge."""
+    entries: Entries
+    delta: List[Tuple[bytes, float, int, int, int]] = field(default_factory=list)
+    memo: Dict[bytes, np.ndarray] = field(default_factory=dict)
+
+
+class SuggestIndex:
+    """
+    Autocomplete entries for both catalogs.
+
+    Lookups run on the caller's thread without locking; writers build new
+    arrays and swap the snapshot in one assignment.
+    """
+
+    def __init__(self):
+        self.texts = TextStore()
+        self.vocabulary = Vocabulary()
+        self.snapshot = Snapshot(Entries.empty())
+        self.max_ids = {"movies": 0, "books": 0}
+        # Normalized author name -> (text ref, best score of their books).
+        self.authors: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.snapshot.entries) + len(self.snapshot.delta)
+
+    @classmethod
+    def build(cls, movies: Iterable[Mapping], books: Iterable[Mapping]) -> "SuggestIndex":
+        """Index ``movies`` (id, title, imdb_rating) and ``books`` (id, title, author, rating) rows."""
+        index = cls()
+        index.vocabulary.defer_sorting()
+        rows: List[Tuple[bytes, float, int, int, int]] = []
+        for row in movies:
+            rows += index._title_rows("movies", MOVIE, row["id"], row["title"], row.get("imdb_rating"))
+        best_by_author: Dict[str, Tuple[str, float]] = {}
+        for row in books:
+            rows += index._title_rows("books", BOOK, row["id"], row["title"], row.get("rating"))
+            author, score = row.get("author"), _score(row.get("rating"), AUTHOR)
+            if author:
+                name = normalize(author)
+                if name and (name not in best_by_author or score > best_by_author[name][1]):
+                    best_by_author[name] = (best_by_author.get(name, (author,))[0], score)
+        for name, (author, score) in best_by_author.items():
+            ref = index.texts.add(author)
+            index.authors[name] = (ref, score)
+            index.vocabulary.add(name.split(" "))
+            rows += [(key, score, AUTHOR, ref, ref) for key in author_keys(name)]
+        index.vocabulary.finish()
+        index.snapshot = Snapshot(Entries.from_rows(rows))
+        return index
+
+    def _title_rows(self, table: str, kind: int, item_id: int, title: Optional[str], rating) -> List[Tuple]:
+        self.max_ids[table] = max(self.max_ids[table], item_id)
+        name = normalize(title or "")
+        if not name:
+            return []
+        ref = self.texts.add(title)
+        self.vocabulary.add(name.split(" "))
+        score = _score(rating, kind)
+        return [(key, score, kind, item_id, ref) for key in title_keys(name)]
+
+    def add(self, table: str, rows: Iterable[Mapping]):
+        """Add rows inserted into ``movies`` or ``books``; ids already indexed are skipped."""
+        kind = MOVIE if table == "movies" else BOOK
+        rating_column = "imdb_rating" if table == "movies" else "rating"
+        with self._lock:
+            snapshot = self.snapshot
+            added: List[Tuple] = []
+            raised: Dict[int, float] = {}
+            for row in rows:
+                if row["id"] <= self.max_ids[table]:
+                    continue
+                rating = row.get(rating_column)
+                added += [
+                    (key, -value, *rest)
+                    for key, value, *rest in self._title_rows(table, kind, row["id"], row.get("title"), rating)
+                ]
+                if table == "books" and row.get("author"):
+                    added += self._author_rows(row["author"], _score(rating, AUTHOR), raised)
+            if not added and not raised:
+                return
+            delta = sorted(snapshot.delta + added)
+            entries, memo = snapshot.entries, snapshot.memo
+            if raised:
+                delta = sorted((row[0], -raised[row[3]], *row[2:]) if row[2] == AUTHOR and row[3] in raised else row
+                               for row in delta)
+                entries, memo = entries.with_scores(AUTHOR, raised), {}
+            if len(delta) > DELTA_MAX:
+                self.snapshot = Snapshot(entries.merge(delta))
+            else:
+                # Delta rows are matched on every lookup, so memoized ranges stay valid.
+                self.snapshot = Snapshot(entries, delta, memo)
+
+    def _author_rows(self, author: str, score: float, raised: Dict[int, float]) -> List[Tuple]:
+        """Delta rows for a new author; a known author's better score is recorded in ``raised``."""
+        name = normalize(author)
+        if not name:
+            return []
+        known = self.authors.get(name)
+        if known is None:
+            ref = self.texts.add(author)
+            self.authors[name] = (ref, score)
+            self.vocabulary.add(name.split(" "))
+            return [(key, -score, AUTHOR, ref, ref) for key in author_keys(name)]
+        ref, best = known
+        if score > best:
+            self.authors[name] = (ref, score)
+            raised[ref] = score
+        return []
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        """Up to ``limit`` titles and authors starting with ``query``, best rated for their catalog first."""
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        snapshot = self.snapshot
+        found = self._lookup(snapshot, normalized, limit)
+        if len(found) < limit:
+            corrected = self.correct(normalized)
+            if corrected and corrected != normalized:
+                seen = {(kind, item_id) for _, kind, item_id, _ in found}
+                for hit in self._lookup(snapshot, corrected, limit):
+                    if len(found) == limit:
+                        break
+                    if (hit[1], hit[2]) not in seen:
+                        found.append(hit)
+        return [
+            {
+                "type": KINDS[kind], "id": item_id if kind != AUTHOR else None, "text": self.texts.get(ref),
+                "rating": round(score * RATING_SCALES[kind], 1) if score != MISSING_SCORE else None,
+            }
+            for score, kind, item_id, ref in found
+        ]
+
+    def correct(self, normalized: str) -> Optional[str]:
+        """``normalized`` with misspelled words replaced, or ``None`` if nothing could be corrected."""
+        words = normalized.split(" ")
+        changed = False
+        for position, word in enumerate(words):
+            partial = position == len(words) - 1
+            known = self.vocabulary.has_prefix(word) if partial else word in self.vocabulary.counts
+            if known or len(word) < 3:
+                continue
+            replacement = self.vocabulary.correct(word, partial)
+            if replacement is None:
+                return None
+            words[position] = replacement
+            changed = True
+        return " ".join(words) if changed else None
+
+    def _lookup(self, snapshot: Snapshot, normalized: str, limit: int) -> List[Tuple[float, int, int, int]]:
+        """``(score, kind, id, ref)`` of the best entries with the prefix, one per item."""
+        prefix = _key(normalized)
+        entries = snapshot.entries
+        low, high = entries.range(prefix)
+        # Twice the limit, since an item with two keys can match under both.
+        wanted = min(2 * limit, 2 * MAX_SUGGESTIONS)
+        if high - low > SCAN_LIMIT:
+            positions = snapshot.memo.get(prefix)
+            if positions is None:
+                positions = entries.best(low, high, 2 * MAX_SUGGESTIONS)
+                if len(snapshot.memo) >= MEMO_SIZE:
+                    snapshot.memo.clear()
+                snapshot.memo[prefix] = positions
+            positions = positions[:wanted]
+        else:
+            positions = entries.best(low, high, wanted)
+        hits = list(zip(
+            entries.scores[positions].tolist(), entries.kinds[positions].tolist(),
+            entries.ids[positions].tolist(), entries.refs[positions].tolist(),
+        ))
+        if snapshot.delta:
+            start = bisect.bisect_left(snapshot.delta, (prefix,))
+            end = (bisect.bisect_right(snapshot.delta, (prefix, float("inf"))) if len(prefix) >= KEY_BYTES
+                   else bisect.bisect_left(snapshot.delta, (_prefix_end(prefix),)))
+            hits += [(-row[1], row[2], row[3], row[4]) for row in snapshot.delta[start:end]]
+            hits.sort(key=lambda hit: -hit[0])
+        found, seen = [], set()
+        for hit in hits:
+            if (hit[1], hit[2]) not in seen:
+                seen.add((hit[1], hit[2]))
+                found.append(hit)
+                if len(found) == limit:
+                    break
+        return found
+
+
+def _score(rating, kind: int) -> float:
+    return MISSING_SCORE if rating is None else float(rating) / RATING_SCALES[kind]
+
+
+def _database_rows(db, columns, chunk: int = BUILD_CHUNK_ROWS):
+    for row in db.execute(select(*columns).execution_options(yield_per=chunk)).mappings():
+        yield row
+
+
+class Suggester:
+    """
+    The lazily built index, kept current from catalog events.
+
+    ``start`` builds the index in a background thread; lookups made before
+    it is ready wait for it. Updates to existing rows schedule a rebuild at
+    most once every ``CATCH_UP_INTERVAL`` seconds, and rows inserted by
+    other workers are caught up as often, both in the background while the
+    current index keeps serving.
+    """
+
+    def __init__(self):
+        self.index: Optional[SuggestIndex] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stale = False
+        self._started = False
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._refresh, name="suggest-index", daemon=True).start()
+
+    def get(self) -> SuggestIndex:
+        """The current index, waiting for the first build if needed. Blocking."""
+        self.start()
+        self._ready.wait()
+        return self.index
+
+    def current(self) -> Optional[SuggestIndex]:
+        """The current index if it has been built, scheduling any pending refresh."""
+        index = self.index
+        if index is not None and not self._refreshing and (
+            self._rebuild_due() or time.monotonic() - self._refreshed_at > CATCH_UP_INTERVAL
+        ):
+            self._schedule()
+        return index
+
+    def _rebuild_due(self) -> bool:
+        return self._stale and time.monotonic() - self._built_at > CATCH_UP_INTERVAL
+
+    def rows_added(self, table: str, rows: Sequence[Mapping]):
+        if self.index is not None:
+            self.index.add(table, rows)
+
+    def rows_changed(self):
+        self._stale = True
+
+    def _schedule(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="suggest-index", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            if self.index is None or self._rebuild_due():
+                self._stale = False
+                started = time.perf_counter()
+                self.index = self._build()
+                self._built_at = time.monotonic()
+                logger.info("Built suggestion index with %d entries in %.1fs",
+                            len(self.index), time.perf_counter() - started)
+            self._catch_up()
+        except Exception:
+            logger.exception("Refreshing the suggestion index failed")
+            if self.index is None:
+                self.index = SuggestIndex()
+        finally:
+            self._refreshed_at = time.monotonic()
+            self._refreshing = False
+            self._ready.set()
+
+    def _build(self) -> SuggestIndex:
+        db = SessionLocal()
+        try:
+            return SuggestIndex.build(
+                _database_rows(db, (Movie.id, Movie.title, Movie.imdb_rating)),
+                _database_rows(db, (Book.id, Book.title, Book.author, Book.rating)),
+            )
+        finally:
+            db.close()
+
+    def _catch_up(self):
+        index = self.index
+        db = SessionLocal()
+        try:
+            for table, model, columns in (
+                ("movies", Movie, (Movie.id, Movie.title, Movie.imdb_rating)),
+                ("books", Book, (Book.id, Book.title, Book.author, Book.rating)),
+            ):
+                query = select(*columns).where(model.id > index.max_ids[table]).order_by(model.id)
+                index.add(table, [dict(row) for row in db.execute(query).mappings()])
+        finally:
+            db.close()
+
+
+suggester = Suggester()
+
+for _table in ("movies", "books"):
+    catalog_events.on_rows_added(_table, lambda rows, table=_table: suggester.rows_added(table, rows))
+    catalog_events.on_rows_changed(_table, suggester.rows_changed)
@@ -0,0 +1,328 @@
+"""
+Async TMDB client and the enrichment job that backfills movie metadata.
+
+All lookups share one keep-alive connection pool. A semaphore bounds the
+number of in-flight requests and a token bucket keeps us under TMDB's rate
+limit. Transient failures are retried with jittered exponential backoff,
+and successful responses are cached on disk with a TTL. Concurrent lookups
+for the same URL are coalesced into one upstream call.
+
+Point ``TMDB_BASE_URL`` at a local stub server to exercise it offline.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+from sqlalchemy import bindparam, func, or_, select, update
+
+from app.database import AsyncSessionLocal
+from app.models.movie import Movie
+from app.services import catalog_events
+
+logger = logging.getLogger(__name__)
+
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+TMDB_CACHE_PATH = os.getenv("TMDB_CACHE_PATH", "./tmdb_cache.db")
+TMDB_CACHE_TTL = float(os.getenv("TMDB_CACHE_TTL", str(7 * 24 * 3600)))
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "20"))
+TMDB_MAX_CONCURRENCY = int(os.getenv("TMDB_MAX_CONCURRENCY", "10"))
+TMDB_RATE_PER_SECOND = float(os.getenv("TMDB_RATE_PER_SECOND", "40"))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "4"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "10"))
+
+ENRICH_BATCH_SIZE = 100
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TMDBError(Exception):
+    """TMDB answered with a non-retryable error or retries ran out."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DiskCache:
+    """JSON responses in a SQLite file, each valid for ``ttl`` seconds. Blocking; the client calls it in a thread."""
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT, expires REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute("SELECT body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl),
+            )
+
+    def purge_expired(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+
+
+@dataclass
+class MovieMetadata:
+    tmdb_id: int
+    rating: Optional[float]
+    trailer_url: Optional[str]
+
+
+class TMDBClient:
+    def __init__(self, api_key: Optional[str] = TMDB_API_KEY, base_url: str = TMDB_BASE_URL,
+                 cache: Optional[DiskCache] = None, max_connections: int = TMDB_MAX_CONNECTIONS,
+                 max_concurrency: int = TMDB_MAX_CONCURRENCY, rate_per_second: float = TMDB_RATE_PER_SECOND,
+                 max_retries: int = TMDB_MAX_RETRIES, timeout: float = TMDB_TIMEOUT,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.cache = cache
+        self.max_retries = max_retries
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_second)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def get(self, path: str, **params) -> Any:
+        """GET ``path`` as JSON, from the disk cache or a coalesced upstream call."""
+        key = path + "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(key, path, params))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the call others wait on.
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, key: str, path: str, params: Dict[str, Any]) -> Any:
+        body = await self._request(path, params)
+        if self.cache:
+            await asyncio.to_thread(self.cache.put, key, body)
+        return body
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> Any:
+        if self.api_key:
+            params = {**params, "api_key": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    await self._bucket.acquire()
+                    response = await self._http.get(path, params=params)
+            except httpx.TransportError as exc:
+                error = TMDBError(f"{path}: {exc!r}")
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                error = TMDBError(f"{path}: HTTP {response.status_code}", response.status_code)
+                if response.status_code not in RETRYABLE_STATUSES:
+                    raise error
+                retry_after = response.headers.get("retry-after")
+            if attempt == self.max_retries:
+                raise error
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.debug("Retrying %s in %.2fs after %s", path, delay, error)
+            await asyncio.sleep(delay)
+
+    async def search_movie(self, title: str) -> Optional[Dict[str, Any]]:
+        results = (await self.get("/search/movie", query=title)).get("results") or []
+        return results[0] if results else None
+
+    async def movie_details(self, tmdb_id: int) -> Dict[str, Any]:
+        return await self.get(f"/movie/{tmdb_id}", append_to_response="videos")
+
+    async def lookup(self, title: str) -> Optional[MovieMetadata]:
+        """Rating and trailer of the best TMDB match for ``title``, if any."""
+        match = await self.search_movie(title)
+        if match is None:
+            return None
+        details = await self.movie_details(match["id"])
+        return MovieMetadata(
+            tmdb_id=match["id"],
+            rating=details.get("vote_average") or None,
+            trailer_url=_trailer_url(details.get("videos", {}).get("results") or []),
+        )
+
+
+def _trailer_url(videos) -> Optional[str]:
+    trailers = [video for video in videos if video.get("site") == "YouTube" and video.get("type") == "Trailer"]
+    if not trailers:
+        return None
+    trailers.sort(key=lambda video: not video.get("official", False))
+    return f"https://www.youtube.com/watch?v={trailers[0]['key']}"
+
+
+_client: Optional[TMDBClient] = None
+
+
+def get_client() -> TMDBClient:
+    """The process-wide client, so every caller shares one connection pool and rate limit."""
+    global _client
+    if _client is None:
+        _client = TMDBClient(cache=DiskCache(TMDB_CACHE_PATH, TMDB_CACHE_TTL))
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@dataclass
+class EnrichmentResult:
+    scanned: int = 0
+    updated: int = 0
+    not_found: int = 0
+    failed: int = 0
+
+
+# Fill only values that are still missing: the row may have been edited while it was looked up.
+_movies = Movie.__table__
+FILL_MISSING = (
+    update(_movies)
+    .where(_movies.c.id == bindparam("movie_id"))
+    .values(
+        tmdb_rating=func.coalesce(_movies.c.tmdb_rating, bindparam("rating")),
+        trailer_url=func.coalesce(_movies.c.trailer_url, bindparam("trailer")),
+    )
+)
+
+_enrichment_lock = asyncio.Lock()
+
+
+def enrichment_running() -> bool:
+    return _enrichment_lock.locked()
+
+
+async def enrich_movies(client: Optional[TMDBClient] = None, batch_size: int = ENRICH_BATCH_SIZE) -> EnrichmentResult:
+    """
+    Backfill missing ``tmdb_rating`` and ``trailer_url`` values from TMDB.
+
+    Movies are walked in id order in batches. Each batch is read, looked up
+    concurrently (bounded by the client) with no session open, and written
+    back with one bulk UPDATE in a new session, so a failure only loses the
+    current batch. Listeners hear about the changes once, when the run ends.
+    """
+    client = client or get_client()
+    result = EnrichmentResult()
+    async with _enrichment_lock:
+        try:
+            await _enrich_batches(client, batch_size, result)
+        finally:
+            if result.updated:
+                catalog_events.rows_changed("movies")
+    return result
+
+
+async def _enrich_batches(client: TMDBClient, batch_size: int, result: EnrichmentResult):
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            movies = (await db.execute(
+                select(Movie.id, Movie.title, Movie.tmdb_rating, Movie.trailer_url)
+                .where(Movie.id > last_id, or_(Movie.tmdb_rating.is_(None), Movie.trailer_url.is_(None)))
+                .order_by(Movie.id)
+                .limit(batch_size)
+            )).all()
+        if not movies:
+            break
+        last_id = movies[-1].id
+        result.scanned += len(movies)
+
+        # No session is open during the lookups, which can take seconds of retries.
+        lookups = await asyncio.gather(*(client.lookup(movie.title) for movie in movies), return_exceptions=True)
+        changes = []
+        for movie, metadata in zip(movies, lookups):
+            if isinstance(metadata, Exception):
+                logger.warning("TMDB lookup failed for %r: %s", movie.title, metadata)
+                result.failed += 1
+                continue
+            if metadata is None:
+                result.not_found += 1
+                continue
+            rating = metadata.rating if movie.tmdb_rating is None else None
+            trailer_url = metadata.trailer_url if movie.trailer_url is None else None
+            if rating is not None or trailer_url is not None:
+                changes.append({"movie_id": movie.id, "rating": rating, "trailer": trailer_url})
+        if changes:
+            async with AsyncSessionLocal() as db:
+                await db.execute(FILL_MISSING, changes)
+                await db.commit()
+            result.updated += len(changes)
+
+
+if __name__ == "__main__":
+    async def main():
+        try:
+            print(await enrich_movies())
+        finally:
+            await close_client()
+
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""
+Per-user watchlists and the ID sets that mark listing rows ``in_watchlist``.
+
+A listing for a user checks each row against a set of the IDs that user
+saved in that catalog. The set is loaded with one query and cached, so a
+page costs a single lookup of the user's ``watchlist_version`` whatever its
+size, and each row is a set membership test. Every watchlist write bumps
+the version in the same transaction; a cached set is used only while its
+version matches, so changes made through another worker are picked up on
+the next request. Changes made here update the cached set in place.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import AbstractSet, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models.book import Book
+from app.models.movie import Movie
+from app.models.user import User, WatchlistItem
+
+# Saved IDs kept in memory across all cached sets, least recently used evicted first.
+WATCHLIST_CACHE_MAX_IDS = int(os.getenv("WATCHLIST_CACHE_MAX_IDS", "1000000"))
+
+CATALOGS = {"movies": Movie, "books": Book}
+
+
+class UnknownUser(LookupError):
+    """Raised for a ``user_id`` that does not exist."""
+
+
+class UnknownItem(LookupError):
+    """Raised when saving a catalog item that does not exist."""
+
+
+class WatchlistCache:
+    """LRU of ``(user_id, catalog) -> (version, ids)``, bounded by the total number of IDs."""
+
+    def __init__(self, max_ids: int = WATCHLIST_CACHE_MAX_IDS):
+        self.max_ids = max_ids
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, Set[int]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, catalog: str, version: int) -> Optional[Set[int]]:
+        with self._lock:
+            entry = self._entries.get((user_id, catalog))
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end((user_id, catalog))
+            return entry[1]
+
+    def put(self, user_id: int, catalog: str, version: int, ids: Set[int]):
+        with self._lock:
+            self._discard((user_id, catalog))
+            if len(ids) > self.max_ids:
+                return
+            self._entries[(user_id, catalog)] = (version, ids)
+            self._size += len(ids)
+            while self._size > self.max_ids:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def changed(self, user_id: int, catalog: str, version: int, item_id: int, saved: bool):
+        """
+        Apply a committed change that moved the user to ``version``.
+
+        Cached sets are carried over to the new version only if they were
+        current just before the change; otherwise they are dropped and
+        reloaded when needed.
+        """
+        with self._lock:
+            for key in [(user_id, name) for name in CATALOGS]:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] != version - 1:
+                    self._discard(key)
+                    continue
+                ids = entry[1]
+                if key[1] == catalog:
+                    before = len(ids)
+                    if saved:
+                        ids.add(item_id)
+                    else:
+                        ids.discard(item_id)
+                    self._size += len(ids) - before
+                self._entries[key] = (version, ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, key: Tuple[int, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+
+watchlist_cache = WatchlistCache()
+
+
+async def watchlist_version(db, user_id: int) -> int:
+    version = await db.scalar(select(User.watchlist_version).where(User.id == user_id))
+    if version is None:
+        raise UnknownUser(f"User {user_id} not found")
+    return version
+
+
+async def saved_ids(db, user_id: int, catalog: str) -> AbstractSet[int]:
+    """IDs of the ``catalog`` items the user saved, from the cache when it is current."""
+    version = await watchlist_version(db, user_id)
+    ids = watchlist_cache.get(user_id, catalog, version)
+    if ids is None:
+        ids = set((await db.scalars(
+            select(WatchlistItem.item_id).where(WatchlistItem.user_id == user_id, WatchlistItem.catalog == catalog)
+        )).all())
+        watchlist_cache.put(user_id, catalog, version, ids)
+    return ids
+
+
+async def _bump(db, user_id: int) -> int:
+    version = await db.scalar(
+        update(User).where(User.id == user_id)
+        .values(watchlist_version=User.watchlist_version + 1)
+        .returning(User.watchlist_version)
+    )
+    if version is None:
+        raise UnknownUser(f"User {user_id} not found")
+    return version
+
+
+async def save(db, user_id: int, catalog: str, item_id: int) -> bool:
+    """Add an item to the user's watchlist; ``False`` if it was already there."""
+    await watchlist_version(db, user_id)
+    if await db.get(WatchlistItem, (user_id, catalog, item_id)) is not None:
+        return False
+    if await db.get(CATALOGS[catalog], item_id) is None:
+        raise UnknownItem(f"{CATALOGS[catalog].__name__} {item_id} not found")
+    db.add(WatchlistItem(user_id=user_id, catalog=catalog, item_id=item_id))
+    version = await _bump(db, user_id)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Saved by a concurrent request in the meantime.
+        await db.rollback()
+        return False
+    watchlist_cache.changed(user_id, catalog, version, item_id, saved=True)
+    return True
+
+
+async def remove(db, user_id: int, catalog: str, item_id: int) -> bool:
+    """Remove an item from the user's watchlist; ``False`` if it was not there."""
+    await watchlist_version(db, user_id)
+    removed = (await db.execute(
+        delete(WatchlistItem).where(
+            WatchlistItem.user_id == user_id, WatchlistItem.catalog == catalog, WatchlistItem.item_id == item_id
+        )
+    )).rowcount
+    if not removed:
+        return False
+    version = await _bump(db, user_id)
+    await db.commit()
+    watchlist_cache.changed(user_id, catalog, version, item_id, saved=False)
+    return True
+
+
+def saved_items_query(user_id: int, catalog: str):
+    """The user's saved ``catalog`` items, with the ``saved_at`` and ``item_id`` keys to page them by."""
+    model = CATALOGS[catalog]
+    return (
+        select(model, WatchlistItem.saved_at, WatchlistItem.item_id)
+        .join(WatchlistItem, WatchlistItem.item_id == model.id)
+        .where(WatchlistItem.user_id == user_id, WatchlistItem.catalog == catalog)
+    )
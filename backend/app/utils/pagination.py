@@ -0,0 +1,184 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import DateTime, and_, false, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from app.services.metrics_service import record_rows
+from app.utils.serialization import IdFlag, encode_lines
+
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded or does not match the sort."""
+
+
+class NullsSmallest(ColumnElement):
+    """
+    Order by ``column`` with NULLs as the smallest value: first ascending,
+    last descending.
+
+    That is the native order of SQLite and MySQL, which get the bare term so
+    a plain index on the column still serves it. Other databases, such as
+    PostgreSQL, sort NULLs as the largest value and get an explicit
+    ``NULLS FIRST``/``NULLS LAST``.
+    """
+    inherit_cache = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("descending", InternalTraversal.dp_boolean),
+    ]
+
+    def __init__(self, column, descending: bool):
+        self.column = column
+        self.descending = descending
+
+    def bare(self):
+        return self.column.desc() if self.descending else self.column.asc()
+
+
+@compiles(NullsSmallest)
+def _compile_nulls_smallest(element, compiler, **kw):
+    order = element.bare()
+    return compiler.process(order.nulls_last() if element.descending else order.nulls_first(), **kw)
+
+
+@compiles(NullsSmallest, "sqlite")
+@compiles(NullsSmallest, "mysql")
+def _compile_native_nulls_smallest(element, compiler, **kw):
+    return compiler.process(element.bare(), **kw)
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """One column of a keyset ordering.
+
+    NULLs sort after every value by default, whichever the direction. Where
+    that differs from NULLs sorting as the smallest value (SQLite's order),
+    an ``IS NULL`` term is ordered first, and indexes on the same expression
+    still serve the ordering; otherwise the column is ordered with
+    ``NullsSmallest``. Either way every database returns the same order,
+    which the keyset conditions below rely on.
+    """
+    column: Any
+    descending: bool = False
+    nulls_last: bool = True
+
+    @property
+    def nullable(self) -> bool:
+        return getattr(self.column, "nullable", True)
+
+    def order_by(self) -> List[Any]:
+        if not self.nullable:
+            return [self.column.desc() if self.descending else self.column.asc()]
+        if self.nulls_last == self.descending:
+            return [NullsSmallest(self.column, self.descending)]
+        is_null = self.column.is_(None)
+        return [is_null.asc() if self.nulls_last else is_null.desc(),
+                self.column.desc() if self.descending else self.column.asc()]
+
+    def after(self, value):
+        """Condition selecting rows that sort strictly after ``value`` on this key."""
+        if value is None:
+            return self.column.isnot(None) if not self.nulls_last else None
+        condition = self.column < value if self.descending else self.column > value
+        if self.nulls_last and self.nullable:
+            condition = or_(condition, self.column.is_(None))
+        return condition
+
+    def equals(self, value):
+        return self.column.is_(None) if value is None else self.column == value
+
+
+def apply_ordering(query, keys: Sequence[SortKey]):
+    return query.order_by(*[clause for key in keys for clause in key.order_by()])
+
+
+def apply_keyset(query, keys: Sequence[SortKey], values: Sequence[Any]):
+    """Restrict ``query`` to rows positioned after ``values`` in the ``keys`` ordering.
+
+    Builds the expanded row-value comparison
+    ``(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...`` so the sort indexes can be
+    used to seek straight to the page instead of skipping rows with OFFSET.
+    """
+    clauses = []
+    for position, key in enumerate(keys):
+        after = key.after(values[position])
+        if after is None:
+            continue
+        prefix = [keys[i].equals(values[i]) for i in range(position)]
+        clauses.append(and_(*prefix, after) if prefix else after)
+    if not clauses:
+        return query.filter(false())
+    return query.filter(or_(*clauses))
+
+
+def encode_cursor(sort_name: str, keys: Sequence[SortKey], row) -> str:
+    values = []
+    for key in keys:
+        value = getattr(row, key.column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    payload = json.dumps({"s": sort_name, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_name: str, keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+        if payload["s"] != sort_name or len(values) != len(keys):
+            raise InvalidCursor("Cursor does not match the requested sort")
+        return [
+            datetime.fromisoformat(value)
+            if value is not None and isinstance(key.column.type, DateTime) else value
+            for key, value in zip(keys, values)
+        ]
+    except InvalidCursor:
+        raise
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+
+def seek(query, sort_name: str, keys: Sequence[SortKey], cursor: Optional[str]):
+    """Order ``query`` by ``keys`` and position it after ``cursor``, if given."""
+    if cursor:
+        query = apply_keyset(query, keys, decode_cursor(cursor, sort_name, keys))
+    return apply_ordering(query, keys)
+
+
+async def paginate(db, query, sort_name: str, keys: Sequence[SortKey], limit: Optional[int], cursor: Optional[str]):
+    """Run a keyset-paginated query of plain columns.
+
+    Returns ``(rows, next_cursor)``. The selected columns must include every
+    sort key so the cursor can be built from the last row. Without ``limit``
+    every remaining row is returned and ``next_cursor`` is ``None``.
+    """
+    query = seek(query, sort_name, keys, cursor)
+    if limit is None:
+        rows = (await db.execute(query)).all()
+        record_rows(len(rows))
+        return rows, None
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    record_rows(len(rows))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(sort_name, keys, rows[-1])
+
+
+async def stream_ndjson(db, query, names: Sequence[str], flag: Optional[IdFlag] = None):
+    """Yield NDJSON for each chunk of rows fetched from a server-side cursor."""
+    result = await db.stream(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    async for rows in result.partitions():
+        record_rows(len(rows))
+        yield encode_lines(names, rows, flag)
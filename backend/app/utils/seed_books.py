@@ -1,7 +1,8 @@
-from sqlalchemy.orm import Session
 from app.database import SessionLocal, create_tables
 from app.models.book import Book
 from app.schemas.book import BookCreate
+from app.schemas.bulk import BulkMode
+from app.services.bulk_service import ingest
 
 def create_sample_books():
     """Create sample books for testing"""
@@ -83,14 +84,8 @@ def create_sample_books():
             )
         ]
         
-        for book_data in sample_books:
-            existing_book = db.query(Book).filter(Book.title == book_data.title).first()
-            if not existing_book:
-                db_book = Book(**book_data.dict())
-                db.add(db_book)
-        
-        db.commit()
-        print(f"Created {len(sample_books)} sample books")
+        result = ingest(db, Book, BookCreate, sample_books, mode=BulkMode.SKIP)
+        print(f"Created {result.inserted} sample books ({result.skipped} already present)")
         
     except Exception as e:
         print(f"Error creating sample books: {e}")
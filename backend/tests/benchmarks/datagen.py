@@ -0,0 +1,144 @@
+"""
+Reproducible synthetic catalogs for benchmarking.
+
+Genres, languages and authors follow skewed distributions and ratings are
+roughly normal, so filters and sorts see realistic selectivity rather than
+uniform data.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from app.models.book import Book
+from app.models.movie import Movie
+from app.models.user import User, WatchlistItem
+from app.schemas.book import BookGenre
+from app.schemas.movie import Genre
+
+CHUNK_ROWS = 10_000
+
+# The user whose watchlist holds every other movie, for the in_watchlist scenarios.
+WATCHLIST_USER_ID = 1
+
+MOVIE_GENRE_WEIGHTS = {
+    Genre.DRAMA: 24, Genre.COMEDY: 20, Genre.ACTION: 14, Genre.THRILLER: 10, Genre.HORROR: 8,
+    Genre.ROMANCE: 7, Genre.DOCUMENTARY: 6, Genre.SCIFI: 5, Genre.ANIMATION: 4, Genre.FANTASY: 2,
+}
+BOOK_GENRE_WEIGHTS = {
+    BookGenre.FICTION: 25, BookGenre.MYSTERY: 12, BookGenre.ROMANCE: 12, BookGenre.NONFICTION: 11,
+    BookGenre.THRILLER: 9, BookGenre.FANTASY: 8, BookGenre.SCIFI: 7, BookGenre.BIOGRAPHY: 6,
+    BookGenre.HISTORY: 6, BookGenre.SELFHELP: 4,
+}
+LANGUAGE_WEIGHTS = {
+    "English": 70, "Spanish": 8, "French": 6, "German": 4, "Japanese": 4, "Korean": 3, "Hindi": 3, "Italian": 2,
+}
+
+WORDS = (
+    "shadow river night empire star heart silent city last dark garden winter storm secret kingdom "
+    "journey fire ocean glass memory broken crown road summer light edge stone wild golden lost "
+    "paper iron queen promise island mirror dream north house forest blood echo moon letter"
+).split()
+FIRST_NAMES = "Ada Ben Clara David Elena Frank Grace Hugo Iris Jonas Kate Leo Maya Noah Olga Paul Rosa Sam Tara Victor".split()
+LAST_NAMES = "Adams Brooks Chen Diaz Evans Fischer Garcia Hughes Ito Jensen Kim Lopez Moreau Novak Okafor Patel Quinn Rossi Silva Tanaka".split()
+
+NULL_RATING_SHARE = 0.1
+NULL_GENRE_SHARE = 0.03
+SUMMARY_WORDS = (12, 40)
+EPOCH = datetime(2015, 1, 1)
+
+
+def _weighted(rng: random.Random, weights: Dict) -> list:
+    return rng.choices(list(weights), weights=list(weights.values()), k=CHUNK_ROWS)
+
+
+def _title(rng: random.Random) -> str:
+    words = rng.sample(WORDS, rng.randint(1, 4))
+    return " ".join(word.capitalize() for word in words)
+
+
+def _summary(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(*SUMMARY_WORDS))).capitalize() + "."
+
+
+def _rating(rng: random.Random, mean: float, spread: float, low: float, high: float):
+    if rng.random() < NULL_RATING_SHARE:
+        return None
+    return round(min(high, max(low, rng.gauss(mean, spread))), 1)
+
+
+def _authors(rng: random.Random, count: int) -> List[str]:
+    return [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" for _ in range(count)]
+
+
+def movie_rows(count: int, seed: int = 1) -> Iterator[List[dict]]:
+    rng = random.Random(seed)
+    produced = 0
+    while produced < count:
+        size = min(CHUNK_ROWS, count - produced)
+        genres = _weighted(rng, MOVIE_GENRE_WEIGHTS)
+        languages = _weighted(rng, LANGUAGE_WEIGHTS)
+        yield [
+            {
+                "title": _title(rng),
+                "language": languages[i],
+                "summary": _summary(rng),
+                "trailer_url": None,
+                "genre": None if rng.random() < NULL_GENRE_SHARE else genres[i].value,
+                "imdb_rating": _rating(rng, 6.4, 1.1, 1.0, 9.8),
+                "date_added": EPOCH + timedelta(seconds=produced + i * 37),
+            }
+            for i in range(size)
+        ]
+        produced += size
+
+
+def book_rows(count: int, seed: int = 1) -> Iterator[List[dict]]:
+    rng = random.Random(seed + 1)
+    # Zipf-like author popularity: a few prolific authors, a long tail of one-offs.
+    authors = _authors(rng, max(10, count // 20))
+    author_weights = [1 / (rank + 1) for rank in range(len(authors))]
+    produced = 0
+    while produced < count:
+        size = min(CHUNK_ROWS, count - produced)
+        genres = _weighted(rng, BOOK_GENRE_WEIGHTS)
+        languages = _weighted(rng, LANGUAGE_WEIGHTS)
+        chosen_authors = rng.choices(authors, weights=author_weights, k=size)
+        yield [
+            {
+                "title": _title(rng),
+                "author": chosen_authors[i],
+                "language": languages[i],
+                "summary": _summary(rng),
+                "genre": None if rng.random() < NULL_GENRE_SHARE else genres[i].value,
+                "rating": _rating(rng, 3.9, 0.5, 1.0, 5.0),
+                "publication_year": min(2024, int(2024 - rng.expovariate(1 / 25))),
+                "date_added": EPOCH + timedelta(seconds=produced + i * 41),
+            }
+            for i in range(size)
+        ]
+        produced += size
+
+
+def popular_author(seed: int = 1) -> str:
+    """The most frequent author in ``book_rows`` for the same seed."""
+    rng = random.Random(seed + 1)
+    return _authors(rng, 1)[0]
+
+
+def load(engine: Engine, movies: int, books: int, seed: int = 1):
+    """Bulk-insert the synthetic catalogs in executemany chunks."""
+    with engine.begin() as conn:
+        for chunk in movie_rows(movies, seed):
+            conn.execute(insert(Movie), chunk)
+        for chunk in book_rows(books, seed):
+            conn.execute(insert(Book), chunk)
+        conn.execute(insert(User), [{"id": WATCHLIST_USER_ID, "username": "benchmark", "watchlist_version": 0}])
+        saved_at = datetime(2024, 1, 1)
+        for start in range(1, movies + 1, 2 * CHUNK_ROWS):
+            conn.execute(insert(WatchlistItem), [
+                {"user_id": WATCHLIST_USER_ID, "catalog": "movies", "item_id": item_id, "saved_at": saved_at}
+                for item_id in range(start, min(start + 2 * CHUNK_ROWS, movies + 1), 2)
+            ])
@@ -0,0 +1,355 @@
+"""
+Latency and throughput benchmarks for the API.
+
+Runs every endpoint scenario against a synthetic catalog, either in-process
+through the ASGI transport or under concurrent load against a local uvicorn,
+and writes machine-readable results that can be compared with a baseline::
+
+    python -m tests.benchmarks.run --sizes 10000 100000 --mode inprocess --output bench.json
+    python -m tests.benchmarks.run --sizes 10000 --mode both --concurrency 32 \\
+        --workers 4 --baseline bench_baseline.json
+
+The exit status is 1 when any scenario's p95 regressed beyond ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SIZES = (10_000,)
+DEFAULT_REQUESTS = 50
+DEFAULT_WARMUP = 3
+# Unpaginated listings return the whole table; above this size they are skipped.
+DEFAULT_MAX_FULL_LIST_ROWS = 100_000
+PAGE_SIZE = 50
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    params: Dict[str, str] = field(default_factory=dict)
+    body: Optional[dict] = None
+    full_list: bool = False
+
+
+def scenarios(author: str) -> List[Scenario]:
+    from app.schemas.book import BookSort
+    from app.schemas.movie import MovieSort
+    from tests.benchmarks.datagen import WATCHLIST_USER_ID
+
+    items = [
+        Scenario("view", "GET", "/view", full_list=True),
+        Scenario("view_genre", "GET", "/view", {"genre": "drama"}, full_list=True),
+        Scenario("view_page", "GET", "/view", {"limit": str(PAGE_SIZE)}),
+        Scenario("view_genre_page", "GET", "/view", {"genre": "drama", "limit": str(PAGE_SIZE)}),
+        Scenario("view_page_watchlist", "GET", "/view", {"limit": str(PAGE_SIZE), "user_id": str(WATCHLIST_USER_ID)}),
+        Scenario("search", "GET", "/search", {"q": "shadow riv"}),
+        Scenario("facets", "GET", "/facets", {"genre": "scifi", "min_rating": "6"}),
+        Scenario("suggest", "GET", "/suggest", {"q": "shadow r"}),
+        Scenario("suggest_typo", "GET", "/suggest", {"q": "shadw rive"}),
+        Scenario("add", "POST", "/add", body={"title": "Benchmark Movie", "genre": "drama", "imdb_rating": 7.1}),
+        Scenario("books_view", "GET", "/books/view", full_list=True),
+        Scenario("books_view_author", "GET", "/books/view", {"author": author.split()[-1]}, full_list=True),
+        Scenario("books_view_page", "GET", "/books/view", {"limit": str(PAGE_SIZE)}),
+        Scenario("books_search", "GET", "/books/search", {"q": "golden"}),
+        Scenario("books_facets", "GET", "/books/facets", {"genre": "fiction", "min_rating": "4"}),
+        Scenario("books_add", "POST", "/books/add",
+                 body={"title": "Benchmark Book", "author": author, "genre": "fiction", "rating": 4.2}),
+    ]
+    for sort in MovieSort:
+        items += [
+            Scenario(f"sort_{sort.value}", "GET", "/sort", {"sort_by": sort.value}, full_list=True),
+            Scenario(f"sort_{sort.value}_genre_page", "GET", "/sort",
+                     {"sort_by": sort.value, "genre": "comedy", "limit": str(PAGE_SIZE)}),
+            Scenario(f"sort_{sort.value}_page", "GET", "/sort", {"sort_by": sort.value, "limit": str(PAGE_SIZE)}),
+        ]
+    for sort in BookSort:
+        items += [
+            Scenario(f"books_sort_{sort.value}", "GET", "/books/sort", {"sort_by": sort.value}, full_list=True),
+            Scenario(f"books_sort_{sort.value}_author", "GET", "/books/sort",
+                     {"sort_by": sort.value, "author": author.split()[-1]}, full_list=True),
+            Scenario(f"books_sort_{sort.value}_page", "GET", "/books/sort",
+                     {"sort_by": sort.value, "limit": str(PAGE_SIZE)}),
+        ]
+    return items
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def percentile(share: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(0.50), 3),
+        "p95_ms": round(percentile(0.95), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def measure(client: httpx.AsyncClient, scenario: Scenario, requests: int, warmup: int,
+                  concurrency: int) -> Dict[str, float]:
+    async def one() -> Optional[float]:
+        started = time.perf_counter()
+        response = await client.request(scenario.method, scenario.path, params=scenario.params, json=scenario.body)
+        await response.aread()
+        return time.perf_counter() - started if response.status_code < 400 else None
+
+    for _ in range(warmup):
+        await one()
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            latency = await one()
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_scenarios(client: httpx.AsyncClient, rows: int, args) -> Dict[str, Dict]:
+    from tests.benchmarks.datagen import popular_author
+
+    results = {}
+    for scenario in scenarios(popular_author(args.seed)):
+        if args.only and scenario.name not in args.only:
+            continue
+        if scenario.full_list and rows > args.max_full_list_rows:
+            results[scenario.name] = {"skipped": f"full listing above {args.max_full_list_rows} rows"}
+            continue
+        results[scenario.name] = await measure(client, scenario, args.requests, args.warmup, args.concurrency)
+        if not args.quiet:
+            print(f"  {scenario.name:<36} {json.dumps(results[scenario.name])}", flush=True)
+    return results
+
+
+def prepare_database(path: str, rows: int, seed: int):
+    """
+    Create and fill the benchmark database unless an identical one exists.
+
+    A database kept from an older schema revision is rebuilt: the app no
+    longer migrates on startup, and its data would predate the new tables.
+    """
+    from sqlalchemy import create_engine, event
+
+    from app.database import create_tables, set_sqlite_pragmas
+    from app.migrations import current_version, latest_version
+    from tests.benchmarks.datagen import load
+
+    if os.path.exists(path):
+        existing = create_engine(f"sqlite:///{path}")
+        version = current_version(existing)
+        existing.dispose()
+        if version == latest_version():
+            return
+        print(f"Rebuilding {path}: schema revision {version}, expected {latest_version()}", flush=True)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    create_tables(engine)
+    started = time.perf_counter()
+    load(engine, movies=rows, books=rows, seed=seed)
+    engine.dispose()
+    print(f"Loaded {rows} movies and {rows} books in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+async def run_inprocess(rows: int, args) -> Dict[str, Dict]:
+    """Drive the app through the ASGI transport; no sockets, so this isolates app and DB time."""
+    from app.main import app
+    from app.services import cache_service
+
+    if not args.cache:
+        cache_service.response_cache.max_bytes = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await run_scenarios(client, rows, args)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(rows: int, database: str, args) -> Dict[str, Dict]:
+    """Drive a real uvicorn server over HTTP with ``--concurrency`` clients."""
+    port = _free_port()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}"}
+    env.pop("ASYNC_DATABASE_URL", None)
+    if not args.cache:
+        env["RESPONSE_CACHE_MAX_BYTES"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.2)
+            return await run_scenarios(client, rows, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, metric: str = "p95_ms") -> List[str]:
+    """Scenarios whose ``metric`` exceeds the baseline by more than ``tolerance``."""
+    regressions = []
+    for run, measured in results["runs"].items():
+        for name, current in measured.items():
+            previous = baseline.get("runs", {}).get(run, {}).get(name)
+            if not previous or metric not in previous or metric not in current:
+                continue
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{run}/{name}: {metric} {current[metric]:.2f} > {previous[metric]:.2f} (+{tolerance:.0%})"
+                )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="catalog sizes (rows per table) to benchmark, e.g. 10000 100000 1000000")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn", "both"), default="inprocess")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent clients per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers in uvicorn mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(BACKEND_DIR, ".benchmarks"),
+                        help="where generated databases are kept and reused")
+    parser.add_argument("--max-full-list-rows", type=int, default=DEFAULT_MAX_FULL_LIST_ROWS)
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--only", nargs="*", help="run only these scenario names")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown vs baseline")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--child", nargs=2, metavar=("DATABASE", "ROWS"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _child_args(args, database: str, rows: int) -> List[str]:
+    argv = ["--child", database, str(rows), "--requests", str(args.requests), "--warmup", str(args.warmup),
+            "--concurrency", str(args.concurrency), "--seed", str(args.seed),
+            "--max-full-list-rows", str(args.max_full_list_rows)]
+    if args.cache:
+        argv.append("--cache")
+    if args.quiet:
+        argv.append("--quiet")
+    if args.only:
+        argv += ["--only", *args.only]
+    return argv
+
+
+def run_inprocess_child(args, database: str, rows: int) -> Dict:
+    """
+    In-process runs happen in a fresh interpreter per size, because the app
+    binds its engines to ``DATABASE_URL`` at import time.
+    """
+    command = [sys.executable, "-m", "tests.benchmarks.run", *_child_args(args, database, rows)]
+    output = subprocess.run(command, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE, text=True).stdout
+    *progress, results = output.splitlines()
+    if progress:
+        print("\n".join(progress), flush=True)
+    return json.loads(results)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sys.path.insert(0, BACKEND_DIR)
+
+    if args.child:
+        database, rows = args.child[0], int(args.child[1])
+        os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        results = asyncio.run(run_inprocess(rows, args))
+        print(json.dumps(results))
+        return 0
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    modes = ("inprocess", "uvicorn") if args.mode == "both" else (args.mode,)
+    results = {
+        "meta": {
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "requests": args.requests,
+            "cache": args.cache,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "runs": {},
+    }
+    for rows in args.sizes:
+        database = os.path.join(args.data_dir, f"bench_{rows}_{args.seed}.db")
+        prepare_database(database, rows, args.seed)
+        for mode in modes:
+            print(f"{rows} rows, {mode}", flush=True)
+            if mode == "inprocess":
+                run = run_inprocess_child(args, database, rows)
+            else:
+                run = asyncio.run(run_uvicorn(rows, database, args))
+            results["runs"][f"{mode}/{rows}"] = run
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
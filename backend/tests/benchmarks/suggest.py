@@ -0,0 +1,108 @@
+"""
+Memory and latency of the in-memory suggestion index.
+
+Builds the index straight from ``datagen`` rows, without a database, and
+times lookups for prefixes, misspellings and misses::
+
+    python -m tests.benchmarks.suggest --titles 1000000
+
+``--titles`` is split evenly between movies and books.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+from tests.benchmarks import datagen
+from tests.benchmarks.run import summarize
+
+DEFAULT_TITLES = 1_000_000
+DEFAULT_LOOKUPS = 2000
+ADDED_ROWS = 1000
+
+
+def _with_ids(chunks, start: int = 1):
+    item_id = start
+    for chunk in chunks:
+        for row in chunk:
+            yield {**row, "id": item_id}
+            item_id += 1
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(1, len(word))
+    return word[:position] + word[position + 1:]
+
+
+def queries(rng: random.Random, count: int) -> Dict[str, List[str]]:
+    """Lookups per kind: prefixes of real words, words with a letter dropped, and text found nowhere."""
+    words = [word for word in datagen.WORDS if len(word) > 3]
+    return {
+        "prefix": [rng.choice(words)[:rng.randint(1, 6)] for _ in range(count)],
+        "two_words": [f"{rng.choice(words)} {rng.choice(words)[:3]}" for _ in range(count)],
+        "author": [rng.choice(datagen.LAST_NAMES)[:4].lower() for _ in range(count)],
+        "typo": [f"{_typo(rng, rng.choice(words))} {rng.choice(words)[:2]}" for _ in range(count)],
+        "miss": [f"qz{rng.randrange(10 ** 6)}" for _ in range(count)],
+    }
+
+
+def measure(index, texts: List[str], limit: int) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for text in texts:
+        begin = time.perf_counter()
+        index.suggest(text, limit)
+        latencies.append(time.perf_counter() - begin)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def run(titles: int, lookups: int, seed: int = 1, limit: int = 8) -> Dict:
+    from app.services.suggest_service import SuggestIndex
+
+    movies, books = titles // 2, titles - titles // 2
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = SuggestIndex.build(
+        _with_ids(datagen.movie_rows(movies, seed)), _with_ids(datagen.book_rows(books, seed)),
+    )
+    build_seconds = time.perf_counter() - started
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = random.Random(seed)
+    results = {
+        "titles": titles,
+        "entries": len(index),
+        "vocabulary": len(index.vocabulary),
+        "build_s": round(build_seconds, 1),
+        "memory_mb": round(memory / 2 ** 20, 1),
+        "build_peak_mb": round(peak / 2 ** 20, 1),
+        "arrays_mb": round(index.snapshot.entries.nbytes() / 2 ** 20, 1),
+        "lookups": {},
+    }
+    for name, texts in queries(rng, lookups).items():
+        measure(index, texts[:50], limit)
+        results["lookups"][name] = measure(index, texts, limit)
+
+    # Inserts go to the delta first; time lookups once it holds rows too.
+    for chunk in datagen.movie_rows(ADDED_ROWS, seed + 1):
+        index.add("movies", list(_with_ids([chunk], start=movies + 1)))
+    results["lookups"]["prefix_with_delta"] = measure(index, queries(rng, lookups)["prefix"], limit)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--titles", type=int, default=DEFAULT_TITLES, help="movies plus books to index")
+    parser.add_argument("--lookups", type=int, default=DEFAULT_LOOKUPS, help="measured lookups per query kind")
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.titles, args.lookups, args.seed, args.limit), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
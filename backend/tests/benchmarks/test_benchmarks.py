@@ -0,0 +1,69 @@
+"""
+Smoke test for the benchmark harness: a tiny catalog, a few requests per
+scenario, in-process. Real runs go through ``python -m tests.benchmarks.run``.
+"""
+import asyncio
+import sqlite3
+from argparse import Namespace
+
+from app.migrations import latest_version
+
+from tests.benchmarks import datagen, run, suggest
+
+ROWS = 200
+
+
+def test_datagen_is_reproducible():
+    first = next(datagen.book_rows(50, seed=7))
+    assert first == next(datagen.book_rows(50, seed=7))
+    assert first != next(datagen.book_rows(50, seed=8))
+    authors = [row["author"] for chunk in datagen.book_rows(2000, seed=7) for row in chunk]
+    assert max(set(authors), key=authors.count) == datagen.popular_author(7)
+
+
+def test_every_scenario_runs_without_errors(database):
+    datagen.load(database, movies=ROWS, books=ROWS, seed=1)
+    args = Namespace(seed=1, only=None, max_full_list_rows=ROWS * 10, requests=3, warmup=1,
+                     concurrency=2, cache=False, quiet=True)
+
+    results = asyncio.run(run.run_inprocess(ROWS, args))
+
+    assert set(results) == {scenario.name for scenario in run.scenarios("Ada Adams")}
+    for name, measured in results.items():
+        assert measured["errors"] == 0, name
+        assert measured["requests"] == 3
+        assert 0 < measured["p50_ms"] <= measured["p95_ms"] <= measured["p99_ms"]
+
+
+def test_prepared_database_has_the_full_schema_and_is_rebuilt_when_outdated(tmp_path):
+    path = str(tmp_path / "bench.db")
+    run.prepare_database(path, 20, seed=1)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE alembic_version SET version_num = '0001'")
+    conn.close()
+
+    run.prepare_database(path, 20, seed=1)
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT version_num FROM alembic_version").fetchone() == (latest_version(),)
+        assert conn.execute("SELECT SUM(count) FROM movies_facets").fetchone() == (20,)
+        assert conn.execute("SELECT COUNT(*) FROM movies").fetchone() == (20,)
+    conn.close()
+
+
+def test_compare_flags_only_slower_p95():
+    baseline = {"runs": {"inprocess/10": {"view": {"p95_ms": 10.0}, "add": {"p95_ms": 5.0}}}}
+    results = {"runs": {"inprocess/10": {"view": {"p95_ms": 13.0}, "add": {"p95_ms": 5.5}, "new": {"p95_ms": 1}}}}
+
+    assert run.compare(results, baseline, tolerance=0.2) == [
+        "inprocess/10/view: p95_ms 13.00 > 10.00 (+20%)"
+    ]
+
+
+def test_suggest_benchmark_runs():
+    results = suggest.run(titles=ROWS, lookups=5)
+
+    assert results["entries"] >= ROWS
+    assert results["memory_mb"] > 0
+    for name, measured in results["lookups"].items():
+        assert 0 < measured["p50_ms"] <= measured["p99_ms"], name
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import tempfile
+
+# The app binds its engines when first imported, so point it at a scratch database first.
+_scratch = tempfile.mkdtemp(prefix="catalog-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+os.environ.setdefault("RECOMMENDATION_INDEX_DIR", os.path.join(_scratch, "recommendations"))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.database import create_tables, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    create_tables()
+    return engine
+
+
+@pytest.fixture
+def api(database):
+    """
+    Run ``session(client)`` against the app through the ASGI transport and
+    return its result, e.g. ``api(lambda client: client.get("/view"))``.
+    """
+    from app.main import app
+
+    def run(session):
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await session(client)
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.bulk_service import ParseError, _csv_records, _json_array_records, _ndjson_records
+
+
+def bulk(api, path: str, body: str, content_type: str, mode: str = "insert"):
+    response = api(lambda client: client.post(path, params={"mode": mode}, content=body.encode(),
+                                              headers={"content-type": content_type}))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def books_titled(api, title: str):
+    response = api(lambda client: client.get("/books/search", params={"q": title, "limit": 50}))
+    return [book for book in response.json() if book["title"] == title]
+
+
+def records(parser, body: bytes, chunk_size: int):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def collect():
+        return [(row, record) async for row, record in parser(chunks())]
+
+    return asyncio.run(collect())
+
+
+def test_update_keeps_fields_the_upload_omits(api):
+    rows = [{"title": "Bulk Keeps Fields", "author": "Ada Adams", "summary": "Kept.", "rating": 4.5}]
+    assert bulk(api, "/books/bulk", json.dumps(rows), "application/json")["inserted"] == 1
+
+    result = bulk(api, "/books/bulk", "title,author\nBulk Keeps Fields,Ben Brooks\n", "text/csv", mode="update")
+
+    assert result == {"inserted": 0, "updated": 1, "skipped": 0, "failed": 0, "errors": []}
+    [book] = books_titled(api, "Bulk Keeps Fields")
+    assert (book["author"], book["summary"], book["rating"]) == ("Ben Brooks", "Kept.", 4.5)
+
+
+@pytest.mark.parametrize("mode", ["update", "skip"])
+def test_duplicates_within_a_batch_are_counted_as_skipped(api, mode):
+    body = "\n".join(json.dumps({"title": f"Bulk Duplicate {mode}", "author": name}) for name in ("A", "B"))
+
+    result = bulk(api, "/books/bulk", body, "application/x-ndjson", mode=mode)
+
+    assert (result["inserted"], result["updated"], result["skipped"]) == (1, 0, 1)
+    [book] = books_titled(api, f"Bulk Duplicate {mode}")
+    # Later rows win in update mode, earlier rows in skip mode.
+    assert book["author"] == ("B" if mode == "update" else "A")
+
+
+def test_update_changes_only_the_earliest_row_with_a_title(api):
+    rows = [{"title": "Bulk Shared Title", "author": author} for author in ("First", "Second")]
+    assert bulk(api, "/books/bulk", json.dumps(rows), "application/json")["inserted"] == 2
+
+    result = bulk(api, "/books/bulk", json.dumps([{"title": "Bulk Shared Title", "author": "Updated"}]),
+                  "application/json", mode="update")
+
+    assert (result["inserted"], result["updated"]) == (0, 1)
+    assert [book["author"] for book in sorted(books_titled(api, "Bulk Shared Title"), key=lambda book: book["id"])] == [
+        "Updated", "Second",
+    ]
+
+
+def test_invalid_rows_are_reported_without_aborting(api):
+    body = json.dumps([
+        {"title": "Bulk Valid Row", "author": "Ada Adams"},
+        {"author": "No Title"},
+        {"title": "Bulk Bad Rating", "author": "Ada Adams", "rating": "high"},
+        "MALFORMED",
+        {"title": "Bulk After Malformed", "author": "Ada Adams"},
+    ]).replace('"MALFORMED"', '{"title": "Bulk Malformed",}')
+
+    result = bulk(api, "/books/bulk", body, "application/json")
+
+    assert (result["inserted"], result["failed"]) == (2, 3)
+    assert [error["row"] for error in result["errors"]] == [2, 3, 4]
+    assert result["errors"][2]["error"].startswith("Invalid JSON")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_json_array_parser_across_chunk_boundaries(chunk_size):
+    body = '﻿[ {"title": "Ünïcode", "n": 12345}, 67890 ,\n{"nested": [1, {"a": "]"}]} ]'.encode("utf-8")
+
+    parsed = records(_json_array_records, body, chunk_size)
+
+    assert parsed == [(1, {"title": "Ünïcode", "n": 12345}), (2, 67890), (3, {"nested": [1, {"a": "]"}]})]
+
+
+def test_json_array_parser_errors():
+    [(row, error)] = records(_json_array_records, b'[{"title": "a"', 4)
+    assert row == 1 and isinstance(error, ParseError)
+    parsed = records(_json_array_records, b'[{"title": "a"}', 4)
+    assert parsed[0] == (1, {"title": "a"}) and isinstance(parsed[1][1], ParseError)
+    with pytest.raises(HTTPException):
+        records(_json_array_records, b'{"title": "a"}', 4)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_json_array_parser_skips_malformed_elements(chunk_size):
+    body = b'[{"title": "a"}, {"title": "b", }, tru, {"title": "c,\n "d": [1}, {"title": "e"}, {"title": oops]'
+
+    parsed = records(_json_array_records, body, chunk_size)
+
+    assert [row for row, _ in parsed] == [1, 2, 3, 4, 5, 6]
+    assert [record for _, record in parsed if not isinstance(record, ParseError)] == [{"title": "a"}, {"title": "e"}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 4096])
+def test_ndjson_parser_skips_blank_lines_and_reports_bad_ones(chunk_size):
+    body = b'{"title": "one"}\r\n\n{not json}\n{"title": "tw\xc3\xb6"}'
+
+    parsed = records(_ndjson_records, body, chunk_size)
+
+    assert parsed[0] == (1, {"title": "one"})
+    assert parsed[1][0] == 2 and isinstance(parsed[1][1], ParseError)
+    assert parsed[2] == (3, {"title": "twö"})
+
+
+@pytest.mark.parametrize("chunk_size", [1, 6, 4096])
+def test_csv_parser_handles_quoted_newlines_and_empty_cells(chunk_size):
+    body = b'title,summary,rating\n"Quoted, title","line one\nline ""two""",4.5\nNo summary,,3\nshort\n'
+
+    parsed = records(_csv_records, body, chunk_size)
+
+    assert parsed[0] == (1, {"title": "Quoted, title", "summary": 'line one\nline "two"', "rating": "4.5"})
+    assert parsed[1] == (2, {"title": "No summary", "rating": "3"})
+    assert parsed[2][0] == 3 and isinstance(parsed[2][1], ParseError)
+    [(row, error)] = records(_csv_records, b'title\n"never closed\n', chunk_size)
+    assert row == 1 and isinstance(error, ParseError)
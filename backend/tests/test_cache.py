@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import threading
+
+from app.services.cache_service import CachedResponse, ResponseCache, SharedStore, cache_key
+
+
+def get_all(api, requests):
+    """Run ``(path, params, headers)`` requests against the app in order."""
+    async def session(client):
+        return [await client.get(path, params=params, headers=headers) for path, params, headers in requests]
+
+    return api(session)
+
+
+def test_revalidation_answers_304_until_a_write(api, database):
+    params = {"language": "Cache-ese", "limit": 5}
+    first, repeat = get_all(api, [("/books/view", params, {}), ("/books/view", params, {})])
+    etag = first.headers["etag"]
+    assert repeat.headers["etag"] == etag and repeat.content == first.content
+
+    [not_modified] = get_all(api, [("/books/view", params, {"If-None-Match": etag})])
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    # Written by another process: only the triggers in the catalog database see it.
+    with sqlite3.connect(database.url.database) as conn:
+        conn.execute("INSERT INTO books (title, author, language) VALUES ('Cached Out', 'Ada Adams', 'Cache-ese')")
+    [changed] = get_all(api, [("/books/view", params, {"If-None-Match": etag})])
+
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [book["title"] for book in changed.json()] == ["Cached Out"]
+
+
+def test_streams_and_per_user_listings_are_not_cached(api):
+    responses = get_all(api, [
+        ("/view", {"stream": "true"}, {}),
+        ("/view", {"limit": 1, "user_id": 1}, {}),
+    ])
+
+    assert all("etag" not in response.headers for response in responses)
+
+
+def test_lru_is_bounded_by_body_bytes():
+    cache = ResponseCache(max_bytes=100, max_entry_bytes=60)
+    for name in ("a", "b"):
+        cache.put(name, CachedResponse(200, [], b"x" * 40))
+    cache.get("a")
+    cache.put("c", CachedResponse(200, [], b"x" * 40))
+    cache.put("huge", CachedResponse(200, [], b"x" * 61))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.get("huge") is None
+    assert cache._size == 80
+
+
+def test_shared_store_evicts_oldest_and_keeps_its_size_across_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    SharedStore(path, max_bytes=1000).put("first", CachedResponse(200, [(b"a", b"b")], b"x" * 100))
+
+    def worker(name):
+        # One store per thread, as in separate worker processes.
+        store = SharedStore(path, max_bytes=1000)
+        for n in range(50):
+            store.put(f"{name}-{n % 20}", CachedResponse(200, [], b"x" * (30 + n)))
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with sqlite3.connect(path) as conn:
+        [(total, counted)] = conn.execute("SELECT total, (SELECT SUM(size) FROM responses) FROM response_bytes")
+    conn.close()
+    store = SharedStore(path, max_bytes=1000)
+    assert total == counted and 0 < total <= 1000
+    assert store.get("first") is None
+    store.put("big", CachedResponse(200, [], b"x" * 990))
+    assert store.get("big").body == b"x" * 990
+    assert [store.get(f"{name}-19") for name in "abcd"] == [None] * 4
+
+
+def test_async_access_reaches_the_shared_store(tmp_path):
+    path = str(tmp_path / "shared.db")
+    response = CachedResponse(200, [(b"content-type", b"application/json")], b"[]")
+    asyncio.run(ResponseCache(shared=SharedStore(path)).aput("etag", response))
+
+    # Another worker: nothing in memory, found in the shared file.
+    assert asyncio.run(ResponseCache(shared=SharedStore(path)).aget("etag")) == response
+
+
+def test_etags_follow_table_versions():
+    cache = ResponseCache()
+    before = cache.etag("/view?", ("movies",))
+    assert cache.etag("/view?", ("movies",)) == before
+    cache.bump("books")
+    assert cache.etag("/view?", ("movies",)) == before
+    cache.bump("movies")
+    assert cache.etag("/view?", ("movies",)) != before
+    assert cache.etag("/view?", ("movies",), {"movies": 7}) != cache.etag("/view?", ("movies",), {"movies": 8})
+
+
+def test_cache_key_ignores_parameter_order_but_not_repeats():
+    assert cache_key("/sort", b"genre=drama&sort_by=title") == cache_key("/sort", b"sort_by=title&genre=drama")
+    assert cache_key("/sort", b"sort_by=title&sort_by=imdb_rating") != \
+        cache_key("/sort", b"sort_by=imdb_rating&sort_by=title")
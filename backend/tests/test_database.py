@@ -0,0 +1,174 @@
+"""
+Read/write routing over several local SQLite WAL files, and the startup schema check.
+
+Replicas here are copies of the test database taken with SQLite's backup
+API, each with one extra movie that tells which file a listing came from.
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.config import PoolSettings, Settings, SqliteSettings, settings as app_settings
+from app.database import ReadRouter, SchemaOutOfDate, ensure_schema
+from app.migrations import current_version, latest_version
+from app.services.cache_service import response_cache
+
+
+def make_replica(primary_path: str, path: str, marker: str):
+    source, target = sqlite3.connect(primary_path), sqlite3.connect(path)
+    try:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=WAL")
+        target.execute("INSERT INTO movies (title, date_added) VALUES (?, '2099-01-01 00:00:00')", (marker,))
+        target.commit()
+    finally:
+        source.close()
+        target.close()
+
+
+def titles(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT title FROM movies")}
+    finally:
+        conn.close()
+
+
+def test_reads_rotate_over_replicas_and_writes_go_to_the_primary(api, database, tmp_path, monkeypatch):
+    primary = database.url.database
+    replicas = [str(tmp_path / f"replica-{n}.db") for n in range(2)]
+    for n, path in enumerate(replicas):
+        make_replica(primary, path, f"Replica {n}")
+    router = ReadRouter.from_urls([f"sqlite:///{path}" for path in replicas], PoolSettings(size=2, max_overflow=0))
+    monkeypatch.setattr("app.database.read_router", router)
+    # Every listing must reach a database rather than the response cache.
+    monkeypatch.setattr(response_cache, "max_bytes", 0)
+
+    async def session(client):
+        newest = [(await client.get("/view", params={"limit": 1})).json()[0]["title"] for _ in range(4)]
+        added = await client.post("/add", json={"title": "Routed Write"})
+        async with router.session() as db:
+            with pytest.raises(OperationalError, match="readonly"):
+                await db.execute(text("DELETE FROM movies"))
+        await router.dispose()
+        return newest, added
+
+    newest, added = api(session)
+
+    assert newest == ["Replica 0", "Replica 1", "Replica 0", "Replica 1"]
+    assert added.status_code == 200
+    assert "Routed Write" in titles(primary)
+    assert all("Routed Write" not in titles(path) for path in replicas)
+
+
+def test_cached_listings_carry_the_versions_of_the_replica_that_served_them(api, database, tmp_path, monkeypatch):
+    replica = str(tmp_path / "lagging.db")
+    make_replica(database.url.database, replica, "Lagging Replica")
+    router = ReadRouter.from_urls([f"sqlite:///{replica}"])
+    monkeypatch.setattr("app.database.read_router", router)
+    params = {"limit": 1}
+
+    async def session(client):
+        first = await client.get("/view", params=params)
+        await client.post("/add", json={"title": "Not Replicated Yet"})
+        lagging = await client.get("/view", params=params, headers={"If-None-Match": first.headers["etag"]})
+        with sqlite3.connect(replica) as conn:
+            conn.execute("INSERT INTO movies (title, date_added) VALUES ('Replicated', '2099-01-02 00:00:00')")
+        caught_up = await client.get("/view", params=params, headers={"If-None-Match": first.headers["etag"]})
+        await router.dispose()
+        return first, lagging, caught_up
+
+    first, lagging, caught_up = api(session)
+
+    # The primary's write does not change what the replica serves, nor its ETag.
+    assert first.json()[0]["title"] == "Lagging Replica"
+    assert lagging.status_code == 304
+    assert caught_up.status_code == 200 and caught_up.headers["etag"] != first.headers["etag"]
+    assert caught_up.json()[0]["title"] == "Replicated"
+
+
+def test_watchlist_flags_are_read_from_the_primary(api, database, tmp_path, monkeypatch):
+    with sqlite3.connect(database.url.database) as conn:
+        saved = conn.execute(
+            "INSERT INTO movies (title, date_added) VALUES ('Saved Before Copy', '2098-01-01 00:00:00')"
+        ).lastrowid
+    replica = str(tmp_path / "watchlist.db")
+    make_replica(database.url.database, replica, "Watchlist Replica")
+    router = ReadRouter.from_urls([f"sqlite:///{replica}"])
+    monkeypatch.setattr("app.database.read_router", router)
+
+    async def session(client):
+        # Neither the user nor the save has reached the replica.
+        user = (await client.post("/users", json={"username": "primary-reader"})).json()
+        await client.put(f"/users/{user['id']}/watchlist/movies/{saved}")
+        listing = await client.get("/view", params={"limit": 2, "user_id": user["id"]})
+        await router.dispose()
+        return listing
+
+    listing = api(session)
+
+    assert listing.status_code == 200
+    assert [(movie["id"] == saved, movie["in_watchlist"]) for movie in listing.json()] == [(False, False), (True, True)]
+
+
+def test_schema_check_creates_the_schema_once(tmp_path, monkeypatch):
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    monkeypatch.setattr("app.database.engine", fresh)
+
+    with pytest.raises(SchemaOutOfDate, match="Database is empty.*python -m app.migrations"):
+        ensure_schema(auto_migrate=False)
+    ensure_schema(auto_migrate=True)
+    assert current_version(fresh) == latest_version()
+
+    # A current schema is a single version lookup.
+    monkeypatch.setattr("app.database.create_tables", lambda: pytest.fail("schema created again"))
+    ensure_schema(auto_migrate=True)
+    fresh.dispose()
+
+
+def test_schema_check_refuses_an_outdated_schema(tmp_path, monkeypatch):
+    outdated = create_engine(f"sqlite:///{tmp_path / 'outdated.db'}")
+    monkeypatch.setattr("app.database.engine", outdated)
+    ensure_schema(auto_migrate=True)
+    with outdated.begin() as conn:
+        conn.exec_driver_sql("UPDATE alembic_version SET version_num = '0001'")
+
+    with pytest.raises(SchemaOutOfDate, match="at revision 0001.*python -m app.migrations"):
+        ensure_schema(auto_migrate=False)
+    outdated.dispose()
+
+
+def test_settings_from_env():
+    settings = Settings.from_env({
+        "DATABASE_URL": "sqlite:///primary.db",
+        "DATABASE_READ_URLS": "sqlite:///a.db, sqlite:///b.db,",
+        "DB_POOL_SIZE": "4",
+        "DB_READ_POOL_RECYCLE": "60",
+        "DB_AUTO_MIGRATE": "false",
+        "SQLITE_CACHE_SIZE": "-2048",
+        "SQLITE_BUSY_TIMEOUT": "250",
+    })
+
+    assert settings.read_database_urls == ("sqlite:///a.db", "sqlite:///b.db")
+    assert settings.pool == PoolSettings(size=4)
+    # Read pools fall back to the primary's settings.
+    assert settings.read_pool == PoolSettings(size=4, recycle=60)
+    assert not settings.auto_migrate
+    assert not Settings.from_env({}).auto_migrate
+    assert settings.sqlite == SqliteSettings(cache_size=-2048, busy_timeout=250)
+
+
+def test_connections_use_the_configured_pragmas(database):
+    with database.connect() as conn:
+        pragmas = {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("foreign_keys", "cache_size", "busy_timeout")
+        }
+
+    assert pragmas == {
+        "foreign_keys": 1,
+        "cache_size": app_settings.sqlite.cache_size,
+        "busy_timeout": app_settings.sqlite.busy_timeout,
+    }
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from app.services.facet_service import BOOKS, KEY_NAMES, MOVIES
+
+
+def cells(conn, spec):
+    """The summary table, and the same cells counted from the catalog table."""
+    summary = set(conn.execute(
+        f"SELECT {', '.join(KEY_NAMES)}, count FROM {spec.summary_table} WHERE count > 0"
+    ))
+    counted = set(conn.execute(
+        f"SELECT {', '.join(spec.key_sql(spec.table))}, COUNT(*) FROM {spec.table} GROUP BY 1, 2, 3, 4"
+    ))
+    return summary, counted
+
+
+def test_summary_tables_track_inserts_updates_and_deletes(database):
+    with sqlite3.connect(database.url.database) as conn:
+        movies = [
+            conn.execute(
+                "INSERT INTO movies (title, genre, language, imdb_rating) VALUES (?, ?, 'Facetish', ?)",
+                (f"Faceted {n}", genre, rating),
+            ).lastrowid
+            for n, (genre, rating) in enumerate([("drama", 7.2), ("drama", 7.5), ("comedy", None), (None, 9.9)])
+        ]
+        books = [
+            conn.execute(
+                "INSERT INTO books (title, author, genre, language, rating, publication_year) "
+                "VALUES (?, 'Ada Adams', 'fiction', 'Facetish', ?, ?)",
+                (f"Faceted {n}", rating, year),
+            ).lastrowid
+            for n, (rating, year) in enumerate([(4.5, 1994), (3.0, None), (None, 2001)])
+        ]
+        conn.execute("UPDATE movies SET genre = 'horror' WHERE id = ?", (movies[0],))
+        conn.execute("UPDATE movies SET imdb_rating = 6.9 WHERE id = ?", (movies[1],))
+        conn.execute("UPDATE movies SET imdb_rating = 8.0, language = NULL WHERE id = ?", (movies[2],))
+        conn.execute("UPDATE movies SET summary = 'Not a facet' WHERE id = ?", (movies[3],))
+        conn.execute("DELETE FROM movies WHERE id = ?", (movies[3],))
+        conn.execute("UPDATE books SET publication_year = 1989, rating = 2.5 WHERE id = ?", (books[0],))
+        conn.execute("UPDATE books SET genre = NULL WHERE id = ?", (books[1],))
+        conn.execute("DELETE FROM books WHERE id = ?", (books[2],))
+
+        for spec in (MOVIES, BOOKS):
+            summary, counted = cells(conn, spec)
+            assert summary == counted
+    conn.close()
+
+
+def test_counts_apply_every_filter_but_their_own(api, database):
+    with sqlite3.connect(database.url.database) as conn:
+        conn.executemany("INSERT INTO books (title, author, genre, language, rating, publication_year) "
+                         "VALUES (?, 'Ada Adams', ?, 'Facetese', ?, ?)", [
+                             ("Counted 1", "fiction", 4.5, 1994),
+                             ("Counted 2", "fiction", 4.0, 1999),
+                             ("Counted 3", "mystery", 4.5, 1971),
+                             ("Counted 4", "mystery", 2.0, None),
+                         ])
+    conn.close()
+
+    facets = api(lambda client: client.get("/books/facets", params={
+        "language": "Facetese", "genre": "fiction", "min_rating": 4.0,
+    })).json()
+
+    assert facets["total"] == 2
+    assert facets["genre"] == [{"value": "fiction", "count": 2}, {"value": "mystery", "count": 1}]
+    assert facets["rating"] == [{"value": 4.0, "count": 1}, {"value": 4.5, "count": 1}]
+    assert facets["decade"] == [{"value": 1990, "count": 2}]
+    assert {"value": "Facetese", "count": 2} in facets["language"]
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/facets", {"min_rating": 7.3}),
+    ("/facets", {"max_rating": 8.25}),
+    ("/books/facets", {"min_rating": 0.1}),
+    ("/books/facets", {"decade": 1995}),
+])
+def test_filters_off_the_bucket_grid_are_rejected(api, path, params):
+    response = api(lambda client: client.get(path, params=params))
+
+    assert response.status_code == 422
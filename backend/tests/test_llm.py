@@ -0,0 +1,160 @@
+import asyncio
+import sqlite3
+
+from app.database import async_engine
+import pytest
+
+from app.services.llm_service import (
+    FakeLLMBackend, LLMService, LLMServiceClosed, PromptCache, generate_missing_summaries, parse_generated,
+)
+
+
+class GatedBackend(FakeLLMBackend):
+    """Holds every call until ``gate`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def generate(self, prompts):
+        self.batches.append(len(prompts))
+        await self.gate.wait()
+        return [self._complete(prompt) for prompt in prompts]
+
+
+def test_prompts_are_micro_batched():
+    backend = FakeLLMBackend()
+
+    async def run():
+        service = LLMService(backend, max_batch_size=4, max_wait=0.05)
+        try:
+            return await asyncio.gather(*(service.generate(f'"Prompt {n}"') for n in range(10)))
+        finally:
+            await service.aclose()
+
+    completions = asyncio.run(run())
+
+    assert backend.batches == [4, 4, 2]
+    assert completions == [FakeLLMBackend._complete(f'"Prompt {n}"') for n in range(10)]
+
+
+def test_cached_prompts_skip_the_backend(tmp_path):
+    cache = PromptCache(str(tmp_path / "llm.db"))
+
+    async def run(backend):
+        service = LLMService(backend, cache=cache, max_wait=0.01)
+        try:
+            return [await service.generate(f'"Cached {n}"') for n in range(3)]
+        finally:
+            await service.aclose()
+
+    first, again = FakeLLMBackend(), FakeLLMBackend()
+    assert asyncio.run(run(first)) == asyncio.run(run(again))
+    assert first.batches == [1, 1, 1]
+    assert again.batches == []
+
+
+def test_identical_prompts_in_flight_share_one_generation():
+    backend = FakeLLMBackend(delay=0.05)
+
+    async def run():
+        service = LLMService(backend, max_wait=0.01)
+        try:
+            first = await asyncio.gather(*(service.generate('"Same"') for _ in range(5)))
+            # Once finished, the prompt is generated again: only the cache remembers results.
+            return first, await service.generate('"Same"')
+        finally:
+            await service.aclose()
+
+    first, later = asyncio.run(run())
+
+    assert len(set(first)) == 1 and later == first[0]
+    assert backend.batches == [1, 1]
+
+
+def test_saturated_backend_pushes_back_on_producers():
+    backend = GatedBackend()
+
+    async def run():
+        service = LLMService(backend, max_batch_size=1, max_wait=0, max_concurrency=1, max_queue=2)
+        try:
+            callers = [asyncio.ensure_future(service.generate(f'"Busy {n}"')) for n in range(8)]
+            await asyncio.sleep(0.05)
+            # One call runs, the collector holds the next prompt waiting for a slot,
+            # the queue is full and every other caller is still waiting to enqueue.
+            saturated = (list(backend.batches), service._queue.qsize(), sum(caller.done() for caller in callers))
+            backend.gate.set()
+            await asyncio.gather(*callers)
+            return saturated
+        finally:
+            await service.aclose()
+
+    assert asyncio.run(run()) == ([1], 2, 0)
+    assert backend.batches == [1] * 8
+
+
+def test_closing_fails_prompts_that_never_reached_the_backend():
+    backend = FakeLLMBackend(delay=0.05)
+
+    async def run():
+        service = LLMService(backend, max_batch_size=1, max_wait=0, max_concurrency=1, max_queue=2)
+        callers = [asyncio.ensure_future(service.generate(f'"Closing {n}"')) for n in range(6)]
+        await asyncio.sleep(0.01)
+        await service.aclose()
+        results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+        with pytest.raises(LLMServiceClosed):
+            await service.generate('"Too late"')
+        return results
+
+    results = asyncio.run(run())
+
+    assert results[0] == FakeLLMBackend._complete('"Closing 0"')
+    assert all(isinstance(result, LLMServiceClosed) for result in results[1:])
+    assert backend.batches == [1]
+
+
+def test_tags_are_parsed_for_comma_separated_storage():
+    generated = parse_generated('Sure! {"summary": " Two friends. ", "tags": ["Heist", "crime, drama", " "]}')
+
+    assert generated.summary == "Two friends."
+    assert generated.tags == ["heist", "crime drama"]
+
+
+def test_missing_summaries_are_filled_without_holding_a_session(database):
+    with sqlite3.connect(database.url.database) as conn:
+        movie = conn.execute("INSERT INTO movies (title) VALUES ('Summary Wanted')").lastrowid
+        edited = conn.execute("INSERT INTO movies (title) VALUES ('Summary Edited')").lastrowid
+        book = conn.execute("INSERT INTO books (title, author) VALUES ('Summary Book', 'Ada Adams')").lastrowid
+    conn.close()
+    checked_out = []
+
+    class ObservingBackend(FakeLLMBackend):
+        async def generate(self, prompts):
+            checked_out.append(async_engine.sync_engine.pool.checkedout())
+            if any("Summary Edited" in prompt for prompt in prompts):
+                with sqlite3.connect(database.url.database) as edit:
+                    edit.execute("UPDATE movies SET summary = 'Written by hand.' WHERE id = ?", (edited,))
+                edit.close()
+            return await super().generate(prompts)
+
+    async def run():
+        service = LLMService(ObservingBackend(), max_wait=0.01)
+        try:
+            return await generate_missing_summaries(service, batch_size=2)
+        finally:
+            await service.aclose()
+
+    result = asyncio.run(run())
+
+    with sqlite3.connect(database.url.database) as conn:
+        summaries, tags = zip(*(
+            conn.execute(f"SELECT summary, tags FROM {table} WHERE id = ?", (row_id,)).fetchone()
+            for table, row_id in (("movies", movie), ("movies", edited), ("books", book))
+        ))
+    conn.close()
+    assert summaries[0].startswith("A story called Summary Wanted.")
+    assert summaries[1] == "Written by hand."
+    assert summaries[2].startswith("A story called Summary Book.")
+    assert tags == ("summary,wanted", None, "book,summary")
+    assert result.failed == 0 and result.scanned >= 3
+    assert set(checked_out) == {0}
@@ -0,0 +1,27 @@
+import re
+
+from app.services import metrics_service
+
+
+def test_requests_are_labelled_by_route_template(api):
+    async def session(client):
+        user = (await client.post("/users", json={"username": "metered"})).json()["id"]
+        metrics_service.reset()
+        for _ in range(2):
+            await client.get(f"/users/{user}")
+        await client.get("/sort", params={"sort_by": "title", "genre": "drama", "limit": 1})
+        await client.get("/sort", params={"sort_by": "'; DROP TABLE", "limit": 1})
+        await client.get(f"/no/such/path/{user}")
+        return user, (await client.get("/metrics")).text
+
+    user, text = api(session)
+
+    user_labels = 'method="GET",route="/users/{user_id}",status="2xx",sort_by="",genre=""'
+    assert f"http_request_duration_seconds_count{{{user_labels}}} 2" in text
+    assert f'http_request_duration_seconds_bucket{{{user_labels},le="+Inf"}} 2' in text
+    assert re.search(rf'http_request_db_queries_sum\{{{re.escape(user_labels)}\}} [1-9]', text)
+    assert 'route="/sort",status="2xx",sort_by="title",genre="drama"' in text
+    assert 'route="/sort",status="4xx",sort_by="other",genre=""' in text
+    assert 'route="unmatched",status="4xx"' in text
+    assert f"/users/{user}" not in text and "/no/such/path" not in text
+    assert re.search(r'db_query_duration_seconds_count\{statement="select"\} [1-9]', text)
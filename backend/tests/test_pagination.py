@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, Table, create_engine, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.utils import pagination
+from app.utils.pagination import InvalidCursor, SortKey, decode_cursor, encode_cursor, paginate, seek
+
+metadata = MetaData()
+items = Table(
+    "items", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("score", Float, nullable=True),
+    Column("seen", DateTime, nullable=True),
+)
+SCORES = [3.0, None, 1.0, None, 2.0, 3.0, None, 1.0]
+
+
+def test_cursor_round_trip():
+    keys = [SortKey(items.c.seen, descending=True), SortKey(items.c.score), SortKey(items.c.id)]
+    row = SimpleNamespace(seen=datetime(2024, 5, 6, 7, 8, 9, 123456), score=None, id=42)
+
+    cursor = encode_cursor("seen", keys, row)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "seen", keys) == [row.seen, None, 42]
+
+
+@pytest.mark.parametrize("cursor, sort_name", [
+    (encode_cursor("score", [SortKey(items.c.id)], SimpleNamespace(id=1)), "seen"),
+    (encode_cursor("score", [SortKey(items.c.id)], SimpleNamespace(id=1)), "score"),
+    ("not a cursor", "score"),
+    ("e30", "score"),
+])
+def test_cursors_for_another_sort_or_malformed_are_rejected(cursor, sort_name):
+    keys = [SortKey(items.c.score), SortKey(items.c.id)]
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, sort_name, keys)
+
+
+@pytest.mark.parametrize("descending, nulls_last", list(itertools.product([False, True], repeat=2)))
+def test_keyset_pages_match_the_full_ordering_around_nulls(tmp_path, descending, nulls_last):
+    sync_engine = create_engine(f"sqlite:///{tmp_path / 'items.db'}")
+    metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(items.insert(), [{"id": n, "score": score} for n, score in enumerate(SCORES, 1)])
+    sync_engine.dispose()
+    keys = [SortKey(items.c.score, descending=descending, nulls_last=nulls_last), SortKey(items.c.id)]
+
+    async def walk(limit):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'items.db'}")
+        pages, cursor = [], None
+        try:
+            async with engine.connect() as db:
+                while True:
+                    rows, cursor = await paginate(db, select(items.c.id, items.c.score), "score", keys, limit, cursor)
+                    pages.append([row.id for row in rows])
+                    if cursor is None:
+                        return pages
+        finally:
+            await engine.dispose()
+
+    [everything] = asyncio.run(walk(None))
+    pages = asyncio.run(walk(3))
+
+    present = sorted((n for n, score in enumerate(SCORES, 1) if score is not None),
+                     key=lambda n: (-SCORES[n - 1] if descending else SCORES[n - 1], n))
+    missing = [n for n, score in enumerate(SCORES, 1) if score is None]
+    assert everything == (present + missing if nulls_last else missing + present)
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert sum(pages, []) == everything
+
+
+@pytest.mark.parametrize("dialect, expected", [
+    (sqlite.dialect(), "items.score DESC, items.id DESC"),
+    (postgresql.dialect(), "items.score DESC NULLS LAST, items.id DESC"),
+])
+def test_null_placement_does_not_depend_on_the_database(dialect, expected):
+    keys = [SortKey(items.c.score, descending=True), SortKey(items.c.id, descending=True)]
+
+    sql = str(seek(select(items.c.id), "score", keys, None).compile(dialect=dialect))
+
+    assert sql.endswith(f"ORDER BY {expected}")
+
+
+def sort(api, params):
+    return api(lambda client: client.get("/sort", params=params))
+
+
+def test_sort_pages_through_missing_ratings(api, database):
+    with database.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO movies (title, language, imdb_rating) VALUES "
+            "('Paged A', 'Pager', 7.0), ('Paged B', 'Pager', NULL), ('Paged C', 'Pager', 7.0), "
+            "('Paged D', 'Pager', NULL), ('Paged E', 'Pager', 9.5)"
+        )
+    params = {"sort_by": "imdb_rating", "language": "Pager", "fields": "id,title,imdb_rating"}
+    full = [movie["title"] for movie in sort(api, params).json()]
+
+    titles, cursor = [], None
+    while True:
+        response = sort(api, {**params, "limit": 2, **({"cursor": cursor} if cursor else {})})
+        titles += [movie["title"] for movie in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+
+    assert full == ["Paged E", "Paged C", "Paged A", "Paged D", "Paged B"]
+    assert titles == full
+    assert sort(api, {**params, "limit": 2, "cursor": "bogus"}).status_code == 400
+
+
+def test_ndjson_stream_matches_the_listing_across_chunks(api, database, monkeypatch):
+    with database.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO movies (title, language) VALUES "
+            + ", ".join(f"('Streamed {n}', 'Streamish')" for n in range(7))
+        )
+    monkeypatch.setattr(pagination, "STREAM_CHUNK_SIZE", 3)
+    params = {"sort_by": "title", "language": "Streamish", "fields": "id,title"}
+
+    listing = sort(api, params).json()
+    streamed = sort(api, {**params, "stream": "true"})
+    first_page = sort(api, {**params, "limit": 2})
+    rest = sort(api, {**params, "stream": "true", "cursor": first_page.headers["x-next-cursor"]})
+
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    assert streamed.text.endswith("\n")
+    assert [json.loads(line) for line in streamed.text.splitlines()] == listing
+    assert len(listing) == 7
+    assert first_page.json() + [json.loads(line) for line in rest.text.splitlines()] == listing
@@ -0,0 +1,144 @@
+"""
+Query plans for every supported listing filter and sort.
+
+No combination may scan a catalog table without an index, and every
+filtered listing must seek (SEARCH) to the matching rows instead of walking
+an index past the others. Listings with no filter or only the genre filter
+must also come out of an index in order, with no separate sort step, for
+the first page and for later cursor pages; other filters may need a sort.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.book import Book
+from app.services import query_service
+from app.utils.pagination import encode_cursor, seek
+
+CATALOGS = {
+    "movies": (query_service.MOVIES, "action"),
+    "books": (query_service.BOOKS, "fiction"),
+}
+
+# A cursor position with a value for every sort column.
+CURSOR_ROW = SimpleNamespace(
+    id=50, title="M", author="K", genre="drama", language="English", imdb_rating=5.0, rating=3.0,
+    publication_year=1999, date_added=datetime(2020, 1, 1),
+)
+
+
+def filter_options(catalog: query_service.CatalogQuery, genre: str):
+    """``(filters, in_order)`` pairs covering every filter alone and combined with genre."""
+    options = [
+        (query_service.ListFilters(), True),
+        (query_service.ListFilters(genre=genre), True),
+        (query_service.ListFilters(language="English"), False),
+        (query_service.ListFilters(genre=genre, language="English"), False),
+        (query_service.ListFilters(min_rating=3.0), False),
+        (query_service.ListFilters(genre=genre, min_rating=3.0), False),
+    ]
+    if catalog.year_column:
+        options += [
+            (query_service.ListFilters(year_from=1990, year_to=2000), False),
+            (query_service.ListFilters(genre=genre, year_from=1990), False),
+        ]
+    if hasattr(catalog.model, "author"):
+        options += [
+            (query_service.ListFilters(author="adams"), False),
+            (query_service.ListFilters(genre=genre, author="ada adams"), False),
+        ]
+    return options
+
+
+def combinations():
+    for table, (catalog, genre) in CATALOGS.items():
+        sorts = [(name,) for name in catalog.sorts] + list(query_service.INDEXED_SORTS[table])
+        for sort_by in sorts:
+            for filters, in_order in filter_options(catalog, genre):
+                for paged in (False, True):
+                    yield pytest.param(
+                        table, list(sort_by), filters, in_order, paged,
+                        id=f"{table}-{'+'.join(sort_by)}-{filter_id(filters)}{'-cursor' if paged else ''}",
+                    )
+
+
+def filter_id(filters: query_service.ListFilters) -> str:
+    return "+".join(name for name, value in vars(filters).items() if value is not None) or "unfiltered"
+
+
+def query_plan(engine, query):
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+@pytest.mark.parametrize("table, sort_by, filters, in_order, paged", combinations())
+def test_listing_uses_an_index(database, table, sort_by, filters, in_order, paged):
+    catalog, _ = CATALOGS[table]
+    sort_name, keys = catalog.sort_keys(sort_by, filters)
+    cursor = encode_cursor(sort_name, keys, CURSOR_ROW) if paged else None
+    query = seek(catalog.filter(select(catalog.model), filters), sort_name, keys, cursor).limit(21)
+
+    plan = query_plan(database, query)
+
+    scans = [step for step in plan if step.startswith(f"SCAN {table} ")]
+    if filter_id(filters) == "unfiltered":
+        assert not [step for step in scans if "INDEX" not in step], plan
+    else:
+        assert not scans and [step for step in plan if step.startswith(f"SEARCH {table} ")], plan
+    if in_order:
+        assert not [step for step in plan if "TEMP B-TREE" in step], plan
+
+
+def test_multi_key_sort_pages_match_full_listing(api, database):
+    rows = [
+        {"title": f"Plans {n}", "author": f"Author {n % 3}", "language": "Plan-ese",
+         "rating": None if n % 4 == 0 else n % 5, "publication_year": None if n % 5 == 0 else 1990 + n % 4}
+        for n in range(40)
+    ]
+    with database.begin() as conn:
+        conn.execute(insert(Book), rows)
+
+    params = [("sort_by", "publication_year"), ("sort_by", "rating"), ("language", "Plan-ese")]
+
+    async def fetch_all(client):
+        full = (await client.get("/books/sort", params=params)).json()
+        pages, cursor = [], None
+        while True:
+            response = await client.get("/books/sort", params=params + [("limit", 7)] +
+                                        ([("cursor", cursor)] if cursor else []))
+            pages += response.json()
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return full, pages
+
+    full, pages = api(fetch_all)
+
+    assert pages == full
+    assert len(full) == len(rows)
+    # Both keys descend, with missing values after every present one.
+    expected = sorted(
+        full,
+        key=lambda book: (book["publication_year"] is None, -(book["publication_year"] or 0),
+                          book["rating"] is None, -(book["rating"] or 0), -book["id"]),
+    )
+    assert full == expected
+
+
+def test_author_filter_matches_words_of_the_name_as_prefixes(api, database):
+    with database.begin() as conn:
+        conn.execute(insert(Book), [
+            {"title": "Prefix One", "author": "Wilhelmina Quaestor"},
+            {"title": "Prefix Two", "author": "Quaestorius Vane"},
+            {"title": "Prefix Three", "author": "Aquaestor Wilhelm"},
+        ])
+
+    def titles(author):
+        response = api(lambda client: client.get("/books/view", params={"author": author, "fields": "title"}))
+        return sorted(book["title"] for book in response.json())
+
+    assert titles("quaestor") == ["Prefix One", "Prefix Two"]
+    assert titles("WILHELM quaest") == ["Prefix One"]
+    assert titles("-") == []
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import numpy as np
+from sqlalchemy import insert, update
+
+from app.models.movie import Movie
+from app.services import recommendation_service
+from app.services.recommendation_service import MOVIES, Recommender, VectorIndex
+
+
+def add_movies(database, rows):
+    with database.begin() as conn:
+        return [conn.execute(insert(Movie).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+def test_changed_rows_are_reembedded_in_the_background(database, tmp_path, monkeypatch):
+    first, second, third = add_movies(database, [
+        {"title": "Quillwort Harbour", "summary": "quillwort harbour lighthouse keepers", "genre": "drama"},
+        {"title": "Quillwort Returns", "summary": "quillwort harbour lighthouse storms", "genre": "drama"},
+        {"title": "Vesper Canyon", "summary": "outlaws ride across the vesper canyon", "genre": "action"},
+    ])
+    recommender = Recommender(MOVIES, directory=str(tmp_path))
+    before = recommender.get().vector(third).copy()
+    assert recommender.similar(first, 1) == [second]
+
+    with database.begin() as conn:
+        conn.execute(update(Movie).where(Movie.id == third).values(
+            title="Quillwort Harbour", summary="quillwort harbour lighthouse keepers", genre="drama",
+        ))
+    recommender.rows_changed()
+    monkeypatch.setattr(recommendation_service, "REBUILD_DELAY", 0)
+    building, release = threading.Event(), threading.Event()
+    build = VectorIndex.build
+
+    def gated_build(*args):
+        building.set()
+        release.wait(5)
+        return build(*args)
+
+    monkeypatch.setattr(VectorIndex, "build", gated_build)
+
+    # Queries keep answering from the old index while the rebuild runs.
+    assert recommender.similar(first, 1) == [second]
+    assert building.wait(5)
+    assert recommender.similar(first, 1) == [second]
+    release.set()
+    recommender._rebuild.join(5)
+
+    assert not np.allclose(recommender.get().vector(third), before)
+    assert recommender.similar(first, 1) == [third]
+    # The snapshot on disk was replaced too, so a fresh worker loads the new vectors.
+    assert recommender.similar(first, 1) == Recommender(MOVIES, directory=str(tmp_path)).similar(first, 1)
+
+
+def test_similar_is_consistent_while_rows_are_added(database, tmp_path):
+    [seed] = add_movies(database, [{"title": "Marigold Ferry", "summary": "a ferry of marigold", "genre": "drama"}])
+    recommender = Recommender(MOVIES, directory=str(tmp_path))
+    recommender.get()
+    errors = []
+
+    def query():
+        try:
+            for _ in range(200):
+                recommender.similar(seed, 5)
+        except Exception as exc:  # noqa: BLE001 - collected for the assertion below
+            errors.append(exc)
+
+    reader = threading.Thread(target=query)
+    reader.start()
+    for offset in range(200):
+        recommender.rows_added([{"id": 10_000_000 + offset, "title": f"Marigold {offset}", "summary": "marigold"}])
+        recommender.get()
+    reader.join()
+
+    assert errors == []
+    assert len(recommender.get()) >= 200
+
+
+def test_concurrent_snapshots_never_mix(database, tmp_path):
+    add_movies(database, [{"title": f"Snapshot {n}", "summary": "snapshots"} for n in range(5)])
+    built = [Recommender(MOVIES, directory=str(tmp_path)).rebuild() for _ in range(2)]
+    built[1].add([{"id": 20_000_000, "title": "Snapshot extra", "summary": "snapshots"}])
+    directory = str(tmp_path / "movies")
+    errors, loaded = [], []
+
+    def save(index):
+        try:
+            for _ in range(20):
+                index.save(directory)
+        except Exception as exc:  # noqa: BLE001 - collected for the assertion below
+            errors.append(exc)
+
+    def load():
+        try:
+            for _ in range(100):
+                index = VectorIndex.load(MOVIES, directory)
+                loaded.append((len(index.ids), len(index.vectors), index.doc_count))
+        except Exception as exc:  # noqa: BLE001 - collected for the assertion below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=save, args=(index,)) for index in built] + [threading.Thread(target=load)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(ids == vectors == doc_count for ids, vectors, doc_count in loaded)
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
@@ -0,0 +1,57 @@
+import sqlite3
+
+
+def search(api, path, q):
+    return [item["title"] for item in api(lambda client: client.get(path, params={"q": q})).json()]
+
+
+def test_index_follows_inserts_updates_and_deletes(api, database):
+    with sqlite3.connect(database.url.database) as conn:
+        in_summary = conn.execute(
+            "INSERT INTO movies (title, summary) VALUES ('Harbour Lights', 'A quokkaville ferryman retires')"
+        ).lastrowid
+        in_title = conn.execute(
+            "INSERT INTO movies (title, summary) VALUES ('Quokkaville', 'A small town')"
+        ).lastrowid
+        renamed = conn.execute("INSERT INTO movies (title) VALUES ('Quokkaville Nights')").lastrowid
+        deleted = conn.execute("INSERT INTO movies (title) VALUES ('Quokkaville Forever')").lastrowid
+    conn.close()
+
+    # Title matches outrank summary matches.
+    assert search(api, "/search", "quokkaville")[-1] == "Harbour Lights"
+    assert set(search(api, "/search", "quokka")) == {
+        "Harbour Lights", "Quokkaville", "Quokkaville Nights", "Quokkaville Forever",
+    }
+
+    with sqlite3.connect(database.url.database) as conn:
+        conn.execute("UPDATE movies SET title = 'Wombatburg Nights' WHERE id = ?", (renamed,))
+        conn.execute("UPDATE movies SET summary = 'Nothing happens' WHERE id = ?", (in_summary,))
+        conn.execute("UPDATE movies SET imdb_rating = 8.0 WHERE id = ?", (in_title,))
+        conn.execute("DELETE FROM movies WHERE id = ?", (deleted,))
+    conn.close()
+
+    assert search(api, "/search", "quokkaville") == ["Quokkaville"]
+    assert search(api, "/search", "wombatburg nig") == ["Wombatburg Nights"]
+    assert search(api, "/search", "ferryman") == []
+    with sqlite3.connect(database.url.database) as conn:
+        # Raises if the external-content index disagrees with the movies table.
+        conn.execute("INSERT INTO movies_fts(movies_fts) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_book_titles_outrank_authors_and_authors_outrank_summaries(api, database):
+    with sqlite3.connect(database.url.database) as conn:
+        conn.executemany("INSERT INTO books (title, author, summary) VALUES (?, ?, ?)", [
+            ("Letters Home", "Ada Adams", "Written to Pemberwick from the front"),
+            ("The Long Walk", "Jon Pemberwick", "A walk"),
+            ("Pemberwick", "Ada Adams", "A house"),
+        ])
+    conn.close()
+    assert search(api, "/books/search", "pemberwick") == ["Pemberwick", "The Long Walk", "Letters Home"]
+
+    with sqlite3.connect(database.url.database) as conn:
+        conn.execute("UPDATE books SET author = 'Jon Quennevault' WHERE title = 'The Long Walk'")
+    conn.close()
+
+    assert search(api, "/books/search", "pemberwick") == ["Pemberwick", "Letters Home"]
+    assert search(api, "/books/search", "quennevault") == ["The Long Walk"]
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas.book import BookResponse
+from app.schemas.movie import MovieResponse
+from app.utils import serialization
+from app.utils.serialization import encode_rows
+
+RATINGS = [7.3, 0.1, 10.0, 1e16, 1.2345678901234568e17, 2.5e-5, 1e-7, 0.0001, -0.0, None]
+TITLES = ["Amélie", "東京物語", "Emoji 🎬 night", "Line\u2028break", "Bell\x07", "</script>", "1e16, the sequel", ""]
+DATES = [
+    datetime(2024, 5, 6, 7, 8, 9),
+    datetime(2024, 5, 6, 7, 8, 9, 123456),
+    datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc),
+]
+
+
+def movie_rows():
+    return [
+        {
+            "title": TITLES[n % len(TITLES)], "language": "Français", "summary": None if n % 2 else "Résumé",
+            "trailer_url": None, "genre": "drama" if n % 3 else None, "imdb_rating": rating,
+            "id": n + 1, "date_added": DATES[n % len(DATES)], "tmdb_rating": RATINGS[-n - 1],
+            "tags": "drame,romance" if n % 2 else None,
+        }
+        for n, rating in enumerate(RATINGS)
+    ]
+
+
+def book_rows():
+    return [
+        {
+            "title": TITLES[n % len(TITLES)], "author": "Gabriel García Márquez", "language": "Español",
+            "summary": None, "genre": "fiction", "rating": rating, "publication_year": 1967 if n % 2 else None,
+            "id": n + 1, "date_added": DATES[n % len(DATES)], "tags": None if n % 2 else "realismo mágico",
+        }
+        for n, rating in enumerate(RATINGS)
+    ]
+
+
+def through_schema(schema, rows) -> bytes:
+    """What FastAPI sends for ``rows`` returned from a route with ``response_model=List[schema]``."""
+    return JSONResponse(TypeAdapter(List[schema]).dump_python(
+        [schema(**row) for row in rows], mode="json"
+    )).body
+
+
+@pytest.mark.parametrize("fast", [True, False], ids=["orjson", "json"])
+@pytest.mark.parametrize("schema, rows", [(MovieResponse, movie_rows()), (BookResponse, book_rows())])
+def test_rows_encode_like_the_response_schema(monkeypatch, fast, schema, rows):
+    if not fast:
+        monkeypatch.setattr(serialization, "orjson", None)
+    names = list(schema.model_fields)
+
+    encoded = encode_rows(names, [tuple(row[name] for name in names) for row in rows])
+
+    assert encoded == through_schema(schema, rows)
+    # One row at a time too, so no payload is saved by a look-alike elsewhere in it.
+    for row in rows:
+        assert encode_rows(names, [tuple(row[name] for name in names)]) == through_schema(schema, [row])
+
+
+def test_listings_document_the_watchlist_flag(api):
+    schema = api(lambda client: client.get("/openapi.json")).json()
+
+    for path, item in (("/view", "MovieListItem"), ("/books/search", "BookListItem")):
+        response = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert response["items"]["$ref"] == f"#/components/schemas/{item}"
+        assert "in_watchlist" in schema["components"]["schemas"][item]["properties"]
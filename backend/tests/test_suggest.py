@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+from app.services import suggest_service
+from app.services.suggest_service import SuggestIndex, Suggester, Vocabulary
+
+MOVIES = [
+    {"id": 1, "title": "The Lord of the Rings", "imdb_rating": 8.9},
+    {"id": 2, "title": "Lord of War", "imdb_rating": 6.2},
+    {"id": 3, "title": "Amélie", "imdb_rating": 8.3},
+    {"id": 4, "title": "Lorenzo's Oil", "imdb_rating": None},
+]
+BOOKS = [
+    {"id": 1, "title": "The Hobbit", "author": "J.R.R. Tolkien", "rating": 4.7},
+    {"id": 2, "title": "Lord of the Flies", "author": "William Golding", "rating": 3.7},
+]
+
+
+def texts(index: SuggestIndex, query: str):
+    return [suggestion["text"] for suggestion in index.suggest(query)]
+
+
+def test_prefixes_rank_by_rating_across_catalogs():
+    index = SuggestIndex.build(MOVIES, BOOKS)
+
+    # 8.9/10 beats 3.7/5, which beats 6.2/10; unrated titles come last.
+    assert texts(index, "lor") == ["The Lord of the Rings", "Lord of the Flies", "Lord of War", "Lorenzo's Oil"]
+    assert texts(index, "amel") == ["Amélie"]
+    assert index.suggest("hobbit") == [{"type": "book", "id": 1, "text": "The Hobbit", "rating": 4.7}]
+    assert index.suggest("tolk") == [{"type": "author", "id": None, "text": "J.R.R. Tolkien", "rating": 4.7}]
+    assert texts(index, "xyz") == []
+
+
+def test_misspelled_words_are_corrected():
+    index = SuggestIndex.build(MOVIES, BOOKS)
+
+    assert texts(index, "hobit") == ["The Hobbit"]
+    assert texts(index, "lrod of wa") == ["Lord of War"]
+    assert texts(index, "lord of teh ri") == ["The Lord of the Rings"]
+
+
+def test_added_rows_are_found_before_and_after_merging(monkeypatch):
+    monkeypatch.setattr(suggest_service, "DELTA_MAX", 4)
+    index = SuggestIndex.build(MOVIES, BOOKS)
+
+    index.add("movies", [{"id": 5, "title": "Lords of Dogtown", "imdb_rating": 7.1}])
+    assert texts(index, "lords") == ["Lords of Dogtown"]
+    index.add("books", [{"id": 3, "title": "The Silmarillion", "author": "J.R.R. Tolkien", "rating": 4.9}])
+    assert len(index.snapshot.delta) == 3
+    # Already indexed rows are skipped; the rest overflow the delta into the arrays.
+    index.add("movies", [
+        {"id": 5, "title": "Lords of Dogtown", "imdb_rating": 7.1},
+        {"id": 6, "title": "Lord Jim", "imdb_rating": 6.5},
+        {"id": 7, "title": "Silent Running", "imdb_rating": 6.6},
+    ])
+
+    assert len(index.snapshot.delta) == 0
+    assert texts(index, "silm") == ["The Silmarillion"]
+    assert index.suggest("tolkien")[0]["rating"] == 4.9
+    assert texts(index, "lord") == [
+        "The Lord of the Rings", "Lord of the Flies", "Lords of Dogtown", "Lord Jim", "Lord of War",
+    ]
+
+
+def test_corrections_are_safe_while_the_vocabulary_grows():
+    vocabulary = Vocabulary()
+    vocabulary.add(["harbour", "harbinger"])
+    errors = []
+
+    def grow():
+        try:
+            vocabulary.add(f"ha{n}" for n in range(20000))
+        except Exception as exc:  # noqa: BLE001 - collected for the assertion below
+            errors.append(exc)
+
+    writer = threading.Thread(target=grow)
+    writer.start()
+    while writer.is_alive():
+        vocabulary._arrays.clear()
+        vocabulary.correct("harbuor", partial=False)
+    writer.join()
+
+    assert errors == []
+    assert vocabulary.correct("harbuor", partial=False) == "harbour"
+
+
+def test_updates_rebuild_at_most_once_per_interval(monkeypatch):
+    monkeypatch.setattr(suggest_service, "CATCH_UP_INTERVAL", 60)
+    builds = []
+    suggester = Suggester()
+    monkeypatch.setattr(suggester, "_build", lambda: builds.append(1) or SuggestIndex.build(MOVIES, BOOKS))
+    monkeypatch.setattr(suggester, "_catch_up", lambda: None)
+    suggester.get()
+
+    suggester.rows_changed()
+    suggester.current()
+    assert not suggester._refreshing and builds == [1]
+
+    # Once the interval has passed since the last rebuild, the update is picked up.
+    suggester._built_at -= 61
+    suggester._refreshed_at -= 61
+    suggester.current()
+    while suggester._refreshing:
+        threading.Event().wait(0.01)
+    assert builds == [1, 1] and not suggester._stale
+
+
+def test_suggest_endpoint_sees_new_titles(api):
+    async def session(client):
+        await client.post("/add", json={"title": "Zephyrine Quartet", "imdb_rating": 7.5})
+        await asyncio.to_thread(suggest_service.suggester.get)
+        await client.post("/books/add", json={"title": "Zephyrine Letters", "author": "Ada Zephyr", "rating": 4.5})
+        return (await client.get("/suggest", params={"q": "zephyrne", "limit": 5})).json()
+
+    suggestions = api(session)
+
+    assert [(item["type"], item["text"]) for item in suggestions] == [
+        ("book", "Zephyrine Letters"), ("movie", "Zephyrine Quartet"),
+    ]
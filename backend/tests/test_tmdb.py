@@ -0,0 +1,200 @@
+"""
+The TMDB client and enrichment job against a stub of the TMDB API, served
+through ``httpx.MockTransport``.
+"""
+import asyncio
+import sqlite3
+import time
+
+import httpx
+import pytest
+
+from app.database import async_engine
+from app.services import tmdb_service
+from app.services.tmdb_service import DiskCache, TMDBClient, TMDBError
+
+
+class StubTMDB:
+    """Answers ``/search/movie`` and ``/movie/{id}`` for ``movies`` (title -> (id, rating, trailer key))."""
+
+    def __init__(self, movies=None, delay: float = 0.0):
+        self.movies = movies or {}
+        self.delay = delay
+        self.calls = []
+        self.responses = {}
+        self.on_request = None
+
+    def fail(self, path: str, *responses: httpx.Response):
+        """Answer the next requests for ``path`` with ``responses`` before the real body."""
+        self.responses.setdefault(path, []).extend(responses)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        if self.on_request:
+            self.on_request(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        queued = self.responses.get(request.url.path)
+        if queued:
+            return queued.pop(0)
+        if request.url.path == "/search/movie":
+            match = self.movies.get(request.url.params["query"])
+            return httpx.Response(200, json={"results": [{"id": match[0]}] if match else []})
+        tmdb_id = int(request.url.path.rsplit("/", 1)[1])
+        for movie_id, rating, trailer in self.movies.values():
+            if movie_id == tmdb_id:
+                videos = [{"site": "YouTube", "type": "Trailer", "key": trailer}] if trailer else []
+                return httpx.Response(200, json={"vote_average": rating, "videos": {"results": videos}})
+        return httpx.Response(404)
+
+
+def client_for(stub: StubTMDB, **options) -> TMDBClient:
+    return TMDBClient(api_key=None, base_url="http://tmdb.test", transport=httpx.MockTransport(stub), **options)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(tmdb_service, "RETRY_BASE_DELAY", 0.001)
+
+
+def test_retries_transient_errors_honouring_retry_after():
+    stub = StubTMDB({"Dune": (438631, 7.8, "abc")})
+    stub.fail("/search/movie", httpx.Response(429, headers={"Retry-After": "1"}), httpx.Response(503))
+
+    async def run():
+        client = client_for(stub)
+        try:
+            started = time.monotonic()
+            return await client.search_movie("Dune"), time.monotonic() - started
+        finally:
+            await client.aclose()
+
+    match, elapsed = asyncio.run(run())
+
+    assert match == {"id": 438631}
+    assert stub.calls == ["/search/movie"] * 3
+    assert elapsed >= 1
+
+
+def test_gives_up_on_client_errors_and_after_max_retries():
+    stub = StubTMDB()
+    stub.fail("/movie/1", httpx.Response(401))
+    stub.fail("/movie/2", *[httpx.Response(500)] * 3)
+
+    async def run():
+        client = client_for(stub, max_retries=2)
+        try:
+            errors = []
+            for path in ("/movie/1", "/movie/2"):
+                with pytest.raises(TMDBError) as raised:
+                    await client.get(path)
+                errors.append(raised.value.status_code)
+            return errors
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [401, 500]
+    assert stub.calls == ["/movie/1"] + ["/movie/2"] * 3
+
+
+def test_concurrent_identical_lookups_share_one_upstream_call():
+    stub = StubTMDB({"Arrival": (329865, 7.6, None)}, delay=0.05)
+
+    async def run():
+        client = client_for(stub)
+        try:
+            return await asyncio.gather(*(client.search_movie("Arrival") for _ in range(10)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+
+    assert results == [{"id": 329865}] * 10
+    assert stub.calls == ["/search/movie"]
+
+
+def test_responses_are_cached_on_disk_until_they_expire(tmp_path):
+    stub = StubTMDB({"Alien": (348, 8.1, None)})
+
+    async def search(cache: DiskCache):
+        client = client_for(stub, cache=cache)
+        try:
+            return await client.search_movie("Alien")
+        finally:
+            await client.aclose()
+
+    fresh = DiskCache(str(tmp_path / "tmdb.db"), ttl=60)
+    asyncio.run(search(fresh))
+    # A new client, as in another worker, reads the same file.
+    assert asyncio.run(search(DiskCache(str(tmp_path / "tmdb.db"), ttl=60))) == {"id": 348}
+    assert stub.calls == ["/search/movie"]
+
+    expired = DiskCache(str(tmp_path / "expired.db"), ttl=-1)
+    asyncio.run(search(expired))
+    asyncio.run(search(expired))
+    assert stub.calls == ["/search/movie"] * 3
+
+
+def test_enrichment_fills_missing_values_without_holding_a_session(database, monkeypatch):
+    titles = ["Enrich Found", "Enrich Rated", "Enrich Unknown", "Enrich Failing", "Enrich Edited"]
+    with sqlite3.connect(database.url.database) as conn:
+        ids = {}
+        for title in titles:
+            rating = 6.5 if title == "Enrich Rated" else None
+            ids[title] = conn.execute(
+                "INSERT INTO movies (title, imdb_rating, tmdb_rating) VALUES (?, 4.0, ?)", (title, rating)
+            ).lastrowid
+    conn.close()
+    changed = []
+    monkeypatch.setattr(tmdb_service.catalog_events, "rows_changed", changed.append)
+    stub = StubTMDB({
+        "Enrich Found": (1, 7.2, "found"),
+        "Enrich Rated": (2, 9.0, "rated"),
+        "Enrich Failing": (3, 5.0, None),
+        "Enrich Edited": (4, 8.0, "edited"),
+    })
+    stub.fail("/movie/3", httpx.Response(500))
+    checked_out = []
+
+    def on_request(request):
+        checked_out.append(async_engine.sync_engine.pool.checkedout())
+        if request.url.path == "/movie/4":
+            # An edit that lands while the movie is being looked up is kept.
+            with sqlite3.connect(database.url.database) as edit:
+                edit.execute("UPDATE movies SET tmdb_rating = 1.5 WHERE id = ?", (ids["Enrich Edited"],))
+            edit.close()
+
+    stub.on_request = on_request
+
+    async def run():
+        client = client_for(stub, max_retries=0)
+        try:
+            return await tmdb_service.enrich_movies(client, batch_size=2)
+        finally:
+            await client.aclose()
+
+    result = asyncio.run(run())
+
+    with sqlite3.connect(database.url.database) as conn:
+        rows = {
+            title: (rating, trailer) for title, rating, trailer in conn.execute(
+                f"SELECT title, tmdb_rating, trailer_url FROM movies WHERE id IN ({', '.join('?' * len(ids))})",
+                list(ids.values()),
+            )
+        }
+        imdb_ratings = {rating for (rating,) in conn.execute(
+            f"SELECT imdb_rating FROM movies WHERE id IN ({', '.join('?' * len(ids))})", list(ids.values()),
+        )}
+    conn.close()
+    assert rows == {
+        "Enrich Found": (7.2, "https://www.youtube.com/watch?v=found"),
+        "Enrich Rated": (6.5, "https://www.youtube.com/watch?v=rated"),
+        "Enrich Unknown": (None, None),
+        "Enrich Failing": (None, None),
+        "Enrich Edited": (1.5, "https://www.youtube.com/watch?v=edited"),
+    }
+    assert imdb_ratings == {4.0}
+    assert result.failed == 1 and result.updated >= 3 and result.not_found >= 1
+    # Several batches, one notification.
+    assert changed == ["movies"]
+    assert set(checked_out) == {0}
@@ -0,0 +1,74 @@
+import sqlite3
+
+from app.services.watchlist_service import watchlist_cache
+
+
+async def listing_flags(client, user_id, language):
+    response = await client.get("/view", params={"language": language, "user_id": user_id, "fields": "id,title"})
+    return {movie["title"]: movie["in_watchlist"] for movie in response.json()}
+
+
+def test_saving_and_removing_items(api):
+    async def session(client):
+        user = (await client.post("/users", json={"username": "watcher-one"})).json()["id"]
+        ids = [
+            (await client.post("/add", json={"title": f"Watched {n}", "language": "Watchese"})).json()["id"]
+            for n in range(3)
+        ]
+        base = f"/users/{user}/watchlist/movies"
+        saves = [(await client.put(f"{base}/{item}")).json()["changed"] for item in (ids[0], ids[1], ids[0])]
+        missing = (await client.put(f"{base}/999999999")).status_code
+        saved = [movie["title"] for movie in (await client.get(base)).json()]
+        flagged = await listing_flags(client, user, "Watchese")
+        removes = [(await client.delete(f"{base}/{ids[0]}")).json()["changed"] for _ in range(2)]
+        after = [movie["title"] for movie in (await client.get(base)).json()]
+        unknown = (await client.get("/view", params={"user_id": 999999999})).status_code
+        return saves, missing, saved, flagged, removes, after, await listing_flags(client, user, "Watchese"), unknown
+
+    saves, missing, saved, flagged, removes, after, unflagged, unknown = api(session)
+
+    assert saves == [True, True, False]
+    assert missing == 404
+    assert saved == ["Watched 1", "Watched 0"]
+    assert flagged == {"Watched 0": True, "Watched 1": True, "Watched 2": False}
+    assert removes == [True, False]
+    assert after == ["Watched 1"]
+    assert unflagged == {"Watched 0": False, "Watched 1": True, "Watched 2": False}
+    assert unknown == 404
+
+
+def test_flags_follow_changes_made_by_another_process(api, database):
+    async def create(client):
+        user = (await client.post("/users", json={"username": "watcher-two"})).json()["id"]
+        item = (await client.post("/add", json={"title": "Elsewhere Saved", "language": "Elsewhere"})).json()["id"]
+        return user, item, await listing_flags(client, user, "Elsewhere")
+
+    user, item, before = api(create)
+    assert watchlist_cache.get(user, "movies", 0) == set()
+
+    with sqlite3.connect(database.url.database) as conn:
+        conn.execute(
+            "INSERT INTO watchlist_items (user_id, catalog, item_id, saved_at) VALUES (?, 'movies', ?, '2024-01-01')",
+            (user, item),
+        )
+        conn.execute("UPDATE users SET watchlist_version = watchlist_version + 1 WHERE id = ?", (user,))
+    conn.close()
+
+    assert before == {"Elsewhere Saved": False}
+    assert api(lambda client: listing_flags(client, user, "Elsewhere")) == {"Elsewhere Saved": True}
+    assert watchlist_cache.get(user, "movies", 1) == {item}
+
+
+def test_deleting_a_user_deletes_their_watchlist(api, database):
+    async def create(client):
+        user = (await client.post("/users", json={"username": "watcher-three"})).json()["id"]
+        item = (await client.post("/books/add", json={"title": "Kept Briefly", "author": "Ada Adams"})).json()["id"]
+        await client.put(f"/users/{user}/watchlist/books/{item}")
+        return user
+
+    user = api(create)
+    with database.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM users WHERE id = ?", (user,))
+        remaining = conn.exec_driver_sql("SELECT COUNT(*) FROM watchlist_items WHERE user_id = ?", (user,)).scalar()
+
+    assert remaining == 0